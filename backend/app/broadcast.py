@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Any, Callable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(data: bytes | str, event: Optional[str] = None, id: Optional[int | str] = None) -> bytes:
+    """Encode one Server-Sent Events frame."""
+    if isinstance(data, str):
+        data = data.encode()
+    head = b''
+    if id is not None:
+        head += f'id: {id}\n'.encode()
+    if event is not None:
+        head += f'event: {event}\n'.encode()
+    return head + b'data: ' + data + b'\n\n'
+
+
+class Broadcaster:
+    """Single producer that encodes one frame per tick and fans it out to subscribers.
+
+    Each subscriber gets a small bounded queue holding references to the same bytes
+    object. When a slow consumer's queue is full the oldest frame is dropped, so it
+    coalesces to the latest state instead of growing memory. A producer may return
+    None to skip a tick when nothing changed.
+    """
+
+    def __init__(self, produce: Callable[[], Any], interval: float = 1.0, queue_size: int = 2):
+        self._produce = produce
+        self.interval = interval
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        self.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self.stop()
+
+    def publish(self, frame: Any):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.frames_dropped += 1
+            queue.put_nowait(frame)
+        self.frames_sent += 1
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._subscribers:
+                continue
+            try:
+                frame = self._produce()
+            except Exception:
+                logger.exception('broadcast producer failed')
+                continue
+            if frame is not None:
+                self.publish(frame)
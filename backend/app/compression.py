@@ -0,0 +1,114 @@
+import os
+import zlib
+from typing import AsyncIterator, Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+from .http_cache import accepted_encodings, encoded_etag
+
+# zlib level for per-connection stream compression (1 fastest .. 9 smallest)
+STREAM_COMPRESSION_LEVEL = int(os.getenv('STREAM_COMPRESSION_LEVEL', '6'))
+# Smallest response body (bytes) the gzip middleware compresses
+GZIP_MIN_SIZE = int(os.getenv('GZIP_MIN_SIZE', '1024'))
+
+# content-coding -> zlib wbits (31: gzip container, 15: zlib container as HTTP `deflate` means)
+_WBITS = {'gzip': 31, 'deflate': 15}
+_COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'application/x-ndjson',
+                 'image/svg+xml', 'application/xml', 'application/manifest+json', 'application/wasm')
+
+
+def compressible(content_type: str) -> bool:
+    return content_type.startswith(_COMPRESSIBLE)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The stream encoding to use for an `Accept-Encoding` header, or None for identity."""
+    accepted = accepted_encodings(accept_encoding)
+    for coding in _WBITS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+class StreamCompressor:
+    """One zlib stream for the life of a connection.
+
+    Each frame is flushed with `Z_SYNC_FLUSH`, so the client can decode it as soon
+    as it arrives, while the compression window keeps the earlier frames: the
+    repeated keys and unchanged cells of the next tick compress to back-references.
+    """
+
+    def __init__(self, encoding: str = 'gzip', level: int = STREAM_COMPRESSION_LEVEL):
+        self.encoding = encoding
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, _WBITS[encoding])
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def compress(self, frame: bytes) -> bytes:
+        out = self._zlib.compress(frame) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+        self.bytes_in += len(frame)
+        self.bytes_out += len(out)
+        return out
+
+    def finish(self) -> bytes:
+        return self._zlib.flush()
+
+
+async def compress_stream(frames: AsyncIterator[bytes], compressor: StreamCompressor) -> AsyncIterator[bytes]:
+    try:
+        async for frame in frames:
+            yield compressor.compress(frame)
+    finally:
+        await frames.aclose()
+    yield compressor.finish()
+
+
+def stream_headers(encoding: Optional[str]) -> Dict[str, str]:
+    headers = {'Vary': 'Accept-Encoding'}
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return headers
+
+
+class _Responder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message['type'] == 'http.response.start':
+            content_type = Headers(raw=message['headers']).get('content-type', '')
+            if content_type.startswith('text/event-stream') or not compressible(content_type):
+                # Event streams compress themselves per connection (or not at all); the
+                # stock responder would hold frames in its gzip buffer
+                self.content_encoding_set = True
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """`GZipMiddleware` for text and JSON that leaves Server-Sent Events streams and binary bodies alone.
+
+    A response it gzips gets the gzip variant's ETag (`"<tag>-gzip"`, see `encoded_etag`), and
+    so does a 304 answering a request that revalidated that variant.
+    """
+
+    def __init__(self, app, minimum_size: int = GZIP_MIN_SIZE, compresslevel: int = STREAM_COMPRESSION_LEVEL):
+        super().__init__(app, minimum_size, compresslevel)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request = Headers(scope=scope)
+        if 'gzip' not in request.get('Accept-Encoding', ''):
+            await self.app(scope, receive, send)
+            return
+        revalidating = '-gzip"' in request.get('If-None-Match', '')
+
+        async def send_tagged(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=message['headers'])
+                etag = headers.get('etag')
+                if etag and (headers.get('content-encoding') == 'gzip' or (message['status'] == 304 and revalidating)):
+                    headers['etag'] = encoded_etag(etag, 'gzip')
+            await send(message)
+
+        await _Responder(self.app, self.minimum_size, self.compresslevel)(scope, receive, send_tagged)
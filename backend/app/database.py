@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Enum
+from sqlalchemy import create_engine, inspect, text, BigInteger, Column, Integer, LargeBinary, String, DateTime, Enum, Index
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from datetime import datetime
+from .engine import DIFFICULTY_PRESETS
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./minesweeper.db")
 
@@ -12,6 +15,22 @@ is_sqlite = str(DATABASE_URL).lower().startswith("sqlite")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if is_sqlite else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def to_async_url(url: str) -> str:
+    """Same database through its asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL."""
+    scheme, sep, rest = str(url).partition("://")
+    dialect = scheme.split("+")[0].lower()
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+# The API uses the async engine so queries never block the event loop; the sync
+# `engine` / `SessionLocal` above stay for table creation and scripts.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 class User(Base):
@@ -23,6 +42,20 @@ class User(Base):
     password = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Backs the newest-first keyset pages and the streamed export of /users
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
+class UserSession(Base):
+    __tablename__ = "sessions"
+
+    # SHA-256 of the bearer token; the token itself is never stored
+    token_hash = Column(String, primary_key=True)
+    user_id = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+
 class LeaderboardEntry(Base):
     __tablename__ = "leaderboard_entries"
 
@@ -30,14 +63,103 @@ class LeaderboardEntry(Base):
     username = Column(String, index=True)
     time = Column(Integer)
     date = Column(DateTime, default=datetime.utcnow)
-    difficulty = Column(Enum("easy", "medium", "hard", name="difficulty_enum"))
+    difficulty = Column(Enum(*DIFFICULTY_PRESETS, name="difficulty_enum"))
+    # 'played' for games played on the server, 'verified' when it replayed a client's game
+    # and measured the time, else 'pending' (see `schemas.LeaderboardEntry`)
+    status = Column(String, default="pending", server_default="pending")
+
+    __table_args__ = (
+        # Backs per-difficulty leaderboard pages: an index range scan for any keyset page
+        Index("ix_leaderboard_difficulty_time_date", "difficulty", "time", "date"),
+    )
+
+class GameReplay(Base):
+    """Move log of one game (see `replay.ReplayWriter`), keyed by the game's leaderboard entry id."""
+    __tablename__ = "game_replays"
+
+    id = Column(String, primary_key=True)
+    rows = Column(Integer)
+    cols = Column(Integer)
+    board = Column(LargeBinary)      # packed cells before the first move; NULL for seeded boards
+    # A seeded board is regenerated from (seed, rows, cols, mines, first reveal)
+    seed = Column(BigInteger)
+    mines = Column(Integer)
+    moves = Column(Integer)
+    duration_ms = Column(Integer)
+    log = Column(LargeBinary)        # varint (cell << 2 | action, delta ms) pairs
+    keyframes = Column(LargeBinary)  # periodic (moves, t, offset, cells changed since the last) for seeking
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class Game(Base):
+    """A game played through the API (see `games.GameSession`), written behind its moves."""
+    __tablename__ = "games"
+
+    id = Column(String, primary_key=True)
+    username = Column(String, index=True)
+    difficulty = Column(Enum(*DIFFICULTY_PRESETS, name="difficulty_enum"))
+    status = Column(String)
+    rows = Column(Integer)
+    cols = Column(Integer)
+    started_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    seed = Column(BigInteger)        # the board's seed, see `GameReplay`
+    initial = Column(LargeBinary)    # packed cells before the first move; NULL for seeded boards
+    moves = Column(Integer)
+    duration_ms = Column(Integer)
+    # Bumped by every write; a worker only writes the revision it last saw (see `games.GameSession`)
+    revision = Column(Integer, default=1, server_default='1')
+    version = Column(Integer, default=0, server_default='0')  # `PlayerState.version` as of the last write
+    owner = Column(String)           # the worker holding the game (`GameStore.worker_id`)...
+    lease_until = Column(DateTime)   # ...until then
+    # Only appended to after the insert; the board is rebuilt from them (see `replay.board_at`)
+    log = Column(LargeBinary)        # see `GameReplay`
+    keyframes = Column(LargeBinary)
+
+def add_columns(bind=engine):
+    """Add columns added to existing tables, and on PostgreSQL values added to existing enum
+    types; `create_all` only creates new tables and types. Existing rows get the column's
+    server default."""
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(bind=bind)}'))
+    if bind.dialect.name != 'postgresql':
+        return
+    types = {column.type.name: column.type.enums for table in Base.metadata.sorted_tables
+             for column in table.columns if isinstance(column.type, Enum) and column.type.name}
+    # ADD VALUE can't run in a transaction block before PostgreSQL 12
+    with bind.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for name, values in types.items():
+            existing = set(conn.execute(text(
+                'SELECT e.enumlabel FROM pg_enum e JOIN pg_type t ON t.oid = e.enumtypid WHERE t.typname = :name'
+            ), {'name': name}).scalars())
+            for value in values:
+                if existing and value not in existing:
+                    conn.execute(text(f"ALTER TYPE {name} ADD VALUE IF NOT EXISTS '{value}'"))
+
+def create_indexes(bind=engine):
+    """Create indexes added to existing tables; `create_all` only does so for new tables."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+add_columns()
+create_indexes()
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
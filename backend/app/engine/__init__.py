@@ -0,0 +1,13 @@
+"""Compact game engine: packed boards, board generation and in-memory player state."""
+from .board import Board, MINE, REVEALED, FLAGGED, COUNT_SHIFT
+from .generate import (
+    DIFFICULTY_PRESETS, MAX_COLS, MAX_ROWS, Preset, board_from_mines, generate_board, generate_boards,
+    generate_preset, neighbor_counts, seeded_board, seeded_mines,
+)
+from .player import MAX_PAYLOAD_CELLS, PlayerState
+
+__all__ = [
+    'Board', 'PlayerState', 'MAX_PAYLOAD_CELLS', 'MINE', 'REVEALED', 'FLAGGED', 'COUNT_SHIFT',
+    'DIFFICULTY_PRESETS', 'MAX_ROWS', 'MAX_COLS', 'Preset', 'board_from_mines', 'generate_board', 'generate_boards',
+    'generate_preset', 'neighbor_counts', 'seeded_board', 'seeded_mines',
+]
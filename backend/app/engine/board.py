@@ -0,0 +1,198 @@
+from typing import Dict, List
+
+# Each cell is packed into a single byte:
+#   bit 0 - mine, bit 1 - revealed, bit 2 - flagged, bits 4-7 - neighbor mine count (0-8)
+MINE = 0x01
+REVEALED = 0x02
+FLAGGED = 0x04
+COUNT_SHIFT = 4
+STATE_MASK = MINE | REVEALED | FLAGGED
+
+# Lookup table from packed byte to the API `Cell` shape, so conversion at the edge
+# never has to decode bits per cell.
+_CELL_DICTS = [
+    {
+        'isMine': bool(b & MINE),
+        'isRevealed': bool(b & REVEALED),
+        'isFlagged': bool(b & FLAGGED),
+        'neighborMines': b >> COUNT_SHIFT,
+    }
+    for b in range(256)
+]
+
+
+class Board:
+    """Minesweeper board backed by one packed byte per cell.
+
+    A 9x9 board costs ~140 bytes instead of 81 pydantic `Cell` models. Convert to the
+    JSON shape with `to_cells()` only when a response is built.
+    """
+
+    __slots__ = ('rows', 'cols', 'cells')
+
+    def __init__(self, rows: int, cols: int, cells: bytearray | None = None):
+        if cells is None:
+            cells = bytearray(rows * cols)
+        elif len(cells) != rows * cols:
+            raise ValueError('cells length does not match board size')
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return self.rows == other.rows and self.cols == other.cols and self.cells == other.cells
+
+    def index(self, row: int, col: int) -> int:
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            raise IndexError(f'cell ({row}, {col}) is outside a {self.rows}x{self.cols} board')
+        return row * self.cols + col
+
+    def set_cell(self, row: int, col: int, *, mine: bool = False, revealed: bool = False,
+                 flagged: bool = False, neighbor_mines: int = 0):
+        self.cells[self.index(row, col)] = (
+            (MINE if mine else 0)
+            | (REVEALED if revealed else 0)
+            | (FLAGGED if flagged else 0)
+            | (neighbor_mines << COUNT_SHIFT)
+        )
+
+    def is_mine(self, row: int, col: int) -> bool:
+        return bool(self.cells[self.index(row, col)] & MINE)
+
+    def is_revealed(self, row: int, col: int) -> bool:
+        return bool(self.cells[self.index(row, col)] & REVEALED)
+
+    def is_flagged(self, row: int, col: int) -> bool:
+        return bool(self.cells[self.index(row, col)] & FLAGGED)
+
+    def neighbor_mines(self, row: int, col: int) -> int:
+        return self.cells[self.index(row, col)] >> COUNT_SHIFT
+
+    @property
+    def mines_count(self) -> int:
+        return sum(1 for b in self.cells if b & MINE)
+
+    @property
+    def flags_count(self) -> int:
+        return sum(1 for b in self.cells if b & FLAGGED)
+
+    def reveal(self, row: int, col: int) -> List[int]:
+        """Reveal a cell, flood-filling through zero-count cells.
+
+        The fill is iterative (no recursion limit on huge boards) and only visits the
+        cells it opens plus their neighbors. Returns the indices that were opened.
+        """
+        cells = self.cells
+        start = self.index(row, col)
+        b = cells[start]
+        if b & (REVEALED | FLAGGED):
+            return []
+        cells[start] = b | REVEALED
+        opened = [start]
+        if b & MINE or b >> COUNT_SHIFT:
+            return opened
+        rows, cols = self.rows, self.cols
+        interior = (-cols - 1, -cols, -cols + 1, -1, 1, cols - 1, cols, cols + 1)
+        last_row, last_col = rows - 1, cols - 1
+        stack = [start]
+        push = stack.append
+        while stack:
+            i = stack.pop()
+            r, c = divmod(i, cols)
+            if 0 < r < last_row and 0 < c < last_col:
+                neighbors = [i + d for d in interior]
+            else:
+                neighbors = [
+                    rr * cols + cc
+                    for rr in range(max(r - 1, 0), min(r + 2, rows))
+                    for cc in range(max(c - 1, 0), min(c + 2, cols))
+                    if rr != r or cc != c
+                ]
+            for j in neighbors:
+                nb = cells[j]
+                if nb & STATE_MASK:
+                    continue
+                cells[j] = nb | REVEALED
+                opened.append(j)
+                if not nb >> COUNT_SHIFT:
+                    push(j)
+        return opened
+
+    def neighbors(self, index: int) -> List[int]:
+        """Flat indices of the up to 8 cells around `index`."""
+        r, c = divmod(index, self.cols)
+        cols = self.cols
+        return [
+            rr * cols + cc
+            for rr in range(max(r - 1, 0), min(r + 2, self.rows))
+            for cc in range(max(c - 1, 0), min(c + 2, cols))
+            if rr != r or cc != c
+        ]
+
+    def chord(self, row: int, col: int) -> List[int]:
+        """On a revealed number with as many flags around it, reveal its other neighbors.
+
+        Returns the indices that were opened (none if the flag count does not match).
+        """
+        cells = self.cells
+        i = self.index(row, col)
+        b = cells[i]
+        count = b >> COUNT_SHIFT
+        if not b & REVEALED or not count:
+            return []
+        around = self.neighbors(i)
+        if sum(1 for j in around if cells[j] & FLAGGED) != count:
+            return []
+        opened = []
+        for j in around:
+            if not cells[j] & (REVEALED | FLAGGED):
+                opened += self.reveal(*divmod(j, self.cols))
+        return opened
+
+    def toggle_flag(self, row: int, col: int) -> bool:
+        """Toggle the flag on an unrevealed cell and return whether it is now flagged."""
+        i = self.index(row, col)
+        b = self.cells[i]
+        if b & REVEALED:
+            return False
+        self.cells[i] = b ^ FLAGGED
+        return not b & FLAGGED
+
+    def cell(self, index: int) -> Dict:
+        """Return one cell, addressed by flat index, in the API `Cell` shape."""
+        return _CELL_DICTS[self.cells[index]].copy()
+
+    def to_cells(self, first_row: int = 0, last_row: int | None = None) -> List[List[Dict]]:
+        """Return the board (or rows `first_row` up to `last_row`) in the `List[List[Cell]]` JSON shape used by the API."""
+        cells = self.cells
+        cols = self.cols
+        table = _CELL_DICTS
+        end = len(cells) if last_row is None else min(last_row, self.rows) * cols
+        return [
+            [table[b].copy() for b in cells[start:start + cols]]
+            for start in range(first_row * cols, end, cols)
+        ]
+
+    @classmethod
+    def from_cells(cls, board: List[List]) -> 'Board':
+        """Build a board from the `List[List[Cell]]` shape (dicts or `Cell` models)."""
+        rows = len(board)
+        cols = len(board[0]) if rows else 0
+        packed = cls(rows, cols)
+        for r, row in enumerate(board):
+            for c, cell in enumerate(row):
+                if not isinstance(cell, dict):
+                    cell = cell.dict()
+                packed.set_cell(
+                    r, c,
+                    mine=cell['isMine'],
+                    revealed=cell['isRevealed'],
+                    flagged=cell['isFlagged'],
+                    neighbor_mines=cell['neighborMines'],
+                )
+        return packed
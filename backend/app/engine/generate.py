@@ -0,0 +1,168 @@
+import os
+import random
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from .board import Board, MINE, COUNT_SHIFT
+
+MAX_ROWS = 1000
+MAX_COLS = 1000
+# Bytes of seeded boards kept packed for regeneration by seed (rows * cols bytes each, so the
+# default holds some 34000 hard boards or 16 marathon ones)
+SEEDED_BOARD_CACHE_BYTES = int(os.getenv('SEEDED_BOARD_CACHE_BYTES', str(16 * 1024 * 1024)))
+
+
+class Preset(NamedTuple):
+    rows: int
+    cols: int
+    mines: int
+
+
+# Insertion order is the order difficulties are listed in the API and the DB enum.
+DIFFICULTY_PRESETS = {
+    'easy': Preset(9, 9, 10),
+    'medium': Preset(16, 16, 40),
+    'hard': Preset(16, 30, 99),
+    'extreme': Preset(50, 50, 500),
+    'marathon': Preset(1000, 1000, 150000),
+}
+
+
+def validate_size(rows: int, cols: int, mines: int):
+    if not (1 <= rows <= MAX_ROWS and 1 <= cols <= MAX_COLS):
+        raise ValueError(f'board size must be between 1x1 and {MAX_ROWS}x{MAX_COLS}')
+    if not (0 <= mines < rows * cols):
+        raise ValueError('mines must leave at least one safe cell')
+
+
+def neighbor_counts(mines: np.ndarray) -> np.ndarray:
+    """Count mines in each cell's 8-neighborhood with a vectorized 3x3 convolution.
+
+    The last two axes are rows and columns; any leading axes are a batch of boards.
+    """
+    padded = np.pad(mines.astype(np.uint8), [(0, 0)] * (mines.ndim - 2) + [(1, 1), (1, 1)])
+    rows, cols = mines.shape[-2:]
+    counts = np.zeros(mines.shape, dtype=np.uint8)
+    for dr in range(3):
+        for dc in range(3):
+            counts += padded[..., dr:dr + rows, dc:dc + cols]
+    return counts - mines.astype(np.uint8)
+
+
+def generate_board(rows: int, cols: int, mines: int, first_click: Tuple[int, int] | None = None,
+                   seed: int | None = None) -> Board:
+    """Place `mines` mines uniformly at random and fill in the neighbor counts.
+
+    When `first_click` is given that cell is guaranteed to be safe. With a `seed` the
+    board is `seeded_board`'s, so the same arguments always give the same board.
+    """
+    if seed is not None:
+        return seeded_board(seed, rows, cols, mines, first_click)
+    validate_size(rows, cols, mines)
+    size = rows * cols
+    rng = np.random.default_rng()
+    if first_click is None:
+        positions = rng.choice(size, size=mines, replace=False)
+    else:
+        safe = _cell(rows, cols, first_click)
+        # Draw from the cells other than `safe` and shift indices past it
+        positions = rng.choice(size - 1, size=mines, replace=False)
+        positions[positions >= safe] += 1
+    return board_from_mines(rows, cols, positions)
+
+
+def _cell(rows: int, cols: int, first_click: Tuple[int, int]) -> int:
+    r, c = first_click
+    if not (0 <= r < rows and 0 <= c < cols):
+        raise ValueError('first click is outside the board')
+    return r * cols + c
+
+
+def seeded_mines(seed: int, rows: int, cols: int, mines: int,
+                 first_click: Tuple[int, int] | None = None) -> List[int]:
+    """Mine positions of the board of `seed`: a single `random.Random(seed).sample` over the
+    cell indices, so the layout depends on the seed and board size alone. A first click on a
+    mine moves that mine to the first mine-free cell in reading order, so boards of one seed
+    differ by at most that mine whatever the first click."""
+    validate_size(rows, cols, mines)
+    size = rows * cols
+    positions = random.Random(seed).sample(range(size), mines)
+    if first_click is not None:
+        safe = _cell(rows, cols, first_click)
+        taken = set(positions)
+        if safe in taken:
+            positions[positions.index(safe)] = next(i for i in range(size) if i not in taken)
+    return positions
+
+
+_seeded: 'OrderedDict[Tuple[int, int, int, int], bytes]' = OrderedDict()
+_seeded_bytes = 0
+_seeded_lock = threading.Lock()
+
+
+def _seeded_cells(seed: int, rows: int, cols: int, mines: int) -> bytes:
+    """Packed cells of a seed's board, from an LRU cache bounded by SEEDED_BOARD_CACHE_BYTES."""
+    global _seeded_bytes
+    key = (seed, rows, cols, mines)
+    with _seeded_lock:
+        cells = _seeded.get(key)
+        if cells is not None:
+            _seeded.move_to_end(key)
+            return cells
+    cells = bytes(board_from_mines(rows, cols, seeded_mines(seed, rows, cols, mines)).cells)
+    if len(cells) > SEEDED_BOARD_CACHE_BYTES:
+        return cells
+    with _seeded_lock:
+        if key not in _seeded:
+            _seeded[key] = cells
+            _seeded_bytes += len(cells)
+            while _seeded_bytes > SEEDED_BOARD_CACHE_BYTES:
+                _seeded_bytes -= len(_seeded.popitem(last=False)[1])
+    return cells
+
+
+def seeded_board(seed: int, rows: int, cols: int, mines: int, first_click: Tuple[int, int] | None = None) -> Board:
+    """The board of a seed (see `seeded_mines`), so a board can be stored or sent as a few
+    integers. Recently used boards come from an LRU cache; each call gets its own copy."""
+    cells = _seeded_cells(seed, rows, cols, mines)
+    if first_click is not None and cells[_cell(rows, cols, first_click)] & MINE:
+        return board_from_mines(rows, cols, seeded_mines(seed, rows, cols, mines, first_click))
+    return Board(rows, cols, bytearray(cells))
+
+
+def board_from_mines(rows: int, cols: int, positions) -> Board:
+    """Board with mines at the given flat indices (`row * cols + col`) and counts filled in."""
+    grid = np.zeros(rows * cols, dtype=bool)
+    grid[np.asarray(positions, dtype=np.int64)] = True
+    grid = grid.reshape(rows, cols)
+    packed = (neighbor_counts(grid) << COUNT_SHIFT) | (grid.astype(np.uint8) * MINE)
+    return Board(rows, cols, bytearray(packed.tobytes()))
+
+
+def generate_boards(count: int, rows: int, cols: int, mines: int, seed: int | None = None,
+                    chunk: int = 10000) -> List[Board]:
+    """`count` independent random boards, drawn and counted in batches rather than one by one."""
+    validate_size(rows, cols, mines)
+    size = rows * cols
+    rng = np.random.default_rng(seed)
+    boards: List[Board] = []
+    for start in range(0, count, chunk):
+        n = min(chunk, count - start)
+        grid = np.zeros((n, size), dtype=bool)
+        if mines:
+            # The `mines` smallest of `size` uniform keys are a uniform sample without replacement
+            positions = np.argpartition(rng.random((n, size)), mines - 1, axis=1)[:, :mines]
+            np.put_along_axis(grid, positions, True, axis=1)
+        grid = grid.reshape(n, rows, cols)
+        packed = ((neighbor_counts(grid) << COUNT_SHIFT) | (grid.astype(np.uint8) * MINE)).reshape(n, size)
+        boards += [Board(rows, cols, bytearray(cells.tobytes())) for cells in packed]
+    return boards
+
+
+def generate_preset(difficulty: str, first_click: Tuple[int, int] | None = None,
+                    seed: int | None = None) -> Board:
+    preset = DIFFICULTY_PRESETS[difficulty]
+    return generate_board(preset.rows, preset.cols, preset.mines, first_click, seed)
@@ -0,0 +1,53 @@
+import os
+from datetime import datetime
+from typing import Dict
+
+from .board import Board
+
+# Boards with more cells than this are left out of spectator payloads (`board` is null) and sent
+# to their player a window of rows at a time: a 1000x1000 board is some 80 MB of JSON
+MAX_PAYLOAD_CELLS = int(os.getenv('MAX_PAYLOAD_CELLS', '2500'))
+
+
+class PlayerState:
+    """Mutable in-memory state of one active game.
+
+    Kept as a plain slotted object so the simulation can mutate it cheaply; use
+    `to_dict()` to get the `ActivePlayer` JSON shape at the API edge. Whoever mutates
+    a player calls `touch()` so observers can skip unchanged players by `version`.
+    """
+
+    __slots__ = ('id', 'username', 'board', 'status', 'timer', 'flags_count', 'mines_count', 'started_at',
+                 'version')
+
+    def __init__(self, id: str, username: str, board: Board, status: str = 'playing', timer: int = 0,
+                 flags_count: int = 0, mines_count: int = 0, started_at: datetime | None = None):
+        self.id = id
+        self.username = username
+        self.board = board
+        self.status = status
+        self.timer = timer
+        self.flags_count = flags_count
+        self.mines_count = mines_count
+        self.started_at = started_at or datetime.utcnow()
+        self.version = 0
+
+    def touch(self):
+        self.version += 1
+
+    def fields(self) -> Dict:
+        """Scalar `ActivePlayer` fields (everything except the board)."""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'status': self.status,
+            'timer': self.timer,
+            'flagsCount': self.flags_count,
+            'minesCount': self.mines_count,
+            'startedAt': self.started_at.isoformat(),
+        }
+
+    def to_dict(self) -> Dict:
+        data = self.fields()
+        data['board'] = self.board.to_cells() if len(self.board) <= MAX_PAYLOAD_CELLS else None
+        return data
@@ -0,0 +1,33 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Sequence
+
+USER_FIELDS = ('id', 'username', 'email', 'createdAt')
+
+
+def _user_values(row) -> tuple:
+    return row.id, row.username, row.email, row.created_at.isoformat()
+
+
+async def users_ndjson(batches: AsyncIterator[Sequence]) -> AsyncIterator[bytes]:
+    """One `User` JSON object per line; one chunk per batch of rows."""
+    async for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(USER_FIELDS, _user_values(r))), separators=(',', ':')) + '\n' for r in rows
+        ).encode()
+
+
+async def users_csv(batches: AsyncIterator[Sequence]) -> AsyncIterator[bytes]:
+    """CSV with a header row; one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(USER_FIELDS)
+    async for rows in batches:
+        writer.writerows(_user_values(r) for r in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Empty table: still send the header
+        yield buffer.getvalue().encode()
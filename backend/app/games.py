@@ -0,0 +1,291 @@
+import hashlib
+import os
+import secrets
+import time
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from .engine import DIFFICULTY_PRESETS, FLAGGED, MINE, REVEALED, Board, PlayerState, generate_preset, seeded_board
+from .replay import FLAG, REVEAL, ReplayWriter, board_at, first_reveal
+from .simulation import Page
+from .verification import score_time
+
+# Seconds without a move after which a game is dropped from memory (once written);
+# playing it again resumes it from the database
+GAME_IDLE_TIMEOUT = float(os.getenv('GAME_IDLE_TIMEOUT', '600'))
+# Seconds between write-behind flushes of the games played since the last one
+GAME_FLUSH_INTERVAL = float(os.getenv('GAME_FLUSH_INTERVAL', '2'))
+# Seconds a worker holds a game after taking it or writing it; only once the lease lapses may
+# another worker take the game over, so a game is only ever played on one worker at a time
+GAME_LEASE = float(os.getenv('GAME_LEASE', '30'))
+# Games a user may have in play at once (counting those with a move within GAME_IDLE_TIMEOUT)
+MAX_ACTIVE_GAMES = int(os.getenv('MAX_ACTIVE_GAMES', '3'))
+# Mixed into daily challenge seeds so the day's board can't be worked out in advance; give every
+# worker the same value. Without it there is no daily challenge
+DAILY_SEED_SECRET = os.getenv('DAILY_SEED_SECRET', '')
+
+
+class DailyDisabled(Exception):
+    """There is no daily challenge: DAILY_SEED_SECRET is not set."""
+
+    def __init__(self):
+        super().__init__('The daily challenge is disabled')
+
+
+def daily_seed(day: date | None = None) -> int:
+    """Board seed of the daily challenge: every daily game of a difficulty that day gets the
+    same mines, bar one moved out from under a first click that lands on it.
+    Raises `DailyDisabled` without a DAILY_SEED_SECRET."""
+    if not DAILY_SEED_SECRET:
+        raise DailyDisabled()
+    day = day or datetime.utcnow().date()
+    digest = hashlib.blake2b(day.isoformat().encode(), key=DAILY_SEED_SECRET.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') >> 1
+
+
+def is_todays_daily(seed: Optional[int]) -> bool:
+    """Whether `seed` is today's daily board, whose games and replays stay hidden until the day is over."""
+    return seed is not None and bool(DAILY_SEED_SECRET) and seed == daily_seed()
+
+
+class GameElsewhere(Exception):
+    """The game is leased to another worker."""
+
+    def __init__(self, retry_after: float):
+        super().__init__('Game is open on another worker')
+        self.retry_after = retry_after
+
+
+class DailyPlayed(Exception):
+    """The user has already played today's daily challenge."""
+
+    def __init__(self):
+        super().__init__("Today's daily challenge has already been played")
+
+
+class TooManyGames(Exception):
+    """The user already has MAX_ACTIVE_GAMES games in play."""
+
+    def __init__(self):
+        super().__init__(f'At most {MAX_ACTIVE_GAMES} games may be in play at once')
+
+
+def _masked(b: int) -> int:
+    """What a player may see of a cell: everything once revealed, otherwise only its flag."""
+    return b if b & REVEALED else b & FLAGGED
+
+
+class GameSession(PlayerState):
+    """A real player's game, played move by move through the API.
+
+    `board` is the player's (and spectators') view: unrevealed cells show only
+    their flag, so mine positions never leave the server. The full board is the
+    replay `writer`'s, generated from `seed` on the first reveal so that click is never a
+    mine; flags placed before it are held in `pending` and recorded once it exists.
+    Only the seed of the board is stored, never its cells.
+
+    The game's row is written only by the worker holding its lease: every write
+    checks and bumps the row's `revision`, so a worker whose copy has fallen behind
+    finds out instead of overwriting the row.
+    """
+
+    __slots__ = ('difficulty', 'seed', 'writer', 'pending', 'safe_left', 'seq', 'last_active', 'stored',
+                 'revision', 'lease_until', 'epoch')
+
+    def __init__(self, id: str, username: str, difficulty: str, started_at: Optional[datetime] = None,
+                 seed: Optional[int] = None):
+        preset = DIFFICULTY_PRESETS[difficulty]
+        super().__init__(id, username, Board(preset.rows, preset.cols), mines_count=preset.mines,
+                         started_at=started_at)
+        self.difficulty = difficulty
+        self.seed = secrets.randbits(63) if seed is None else seed
+        self.writer: Optional[ReplayWriter] = None
+        self.pending: List[Tuple[int, int]] = []
+        self.safe_left = preset.rows * preset.cols - preset.mines
+        self.seq = 0
+        self.last_active = time.monotonic()
+        # Bytes of the log and keyframe index in the database; None until the row is inserted
+        self.stored: Optional[Tuple[int, int]] = None
+        # The row's revision as of this worker's last write, and when its lease on the game lapses
+        self.revision = 0
+        self.lease_until = datetime.min
+        # The revision this copy of the game started from; spectator caches key on it with
+        # `version`, so a resumed copy never matches what was cached for an earlier one
+        self.epoch = 1
+
+    @classmethod
+    def restore(cls, row) -> 'GameSession':
+        """Session of a stored `games` row."""
+        session = cls(row.id, row.username, row.difficulty, row.started_at, row.seed)
+        session.stored = (len(row.log), len(row.keyframes))
+        session.revision = row.revision
+        # Taking the game over writes the next revision; resuming counts as a change to observers
+        session.epoch = row.revision + 1
+        session.version = row.version + 1
+        if not row.moves:
+            return session
+        initial = row.initial
+        if initial is None:
+            first = divmod(first_reveal(row.log), row.cols)
+            initial = seeded_board(row.seed, row.rows, row.cols, session.mines_count, first).cells
+        board, _, _ = board_at(row.rows, row.cols, initial, row.log, row.keyframes, row.duration_ms)
+        writer = ReplayWriter.restore(row.rows, row.cols, initial, board.cells, row.log, row.keyframes,
+                                      row.moves, row.duration_ms, seed=row.seed)
+        session.writer = writer
+        session.status = row.status
+        session.timer = row.duration_ms // 1000
+        cells = writer.board.cells
+        if not session.reveal():
+            session.board.cells[:] = bytes(_masked(b) for b in cells)
+        session.flags_count = writer.board.flags_count
+        session.safe_left = sum(1 for b in cells if not b & (MINE | REVEALED))
+        return session
+
+    @property
+    def time(self) -> int:
+        """Seconds taken, rounded up, as entered on the leaderboard."""
+        return score_time(self.writer.t) if self.writer else 0
+
+    def play(self, action: int, row: int, col: int) -> List[int]:
+        """Apply a move and return the cells of `board` it changed.
+
+        Raises ValueError once the game is over and IndexError for a cell off the board.
+        """
+        if self.status != 'playing':
+            raise ValueError(f'Game is already {self.status}')
+        cell = self.board.index(row, col)
+        t = max(int((datetime.utcnow() - self.started_at).total_seconds() * 1000), self.writer.t if self.writer else 0)
+        self.last_active = time.monotonic()
+        self.timer = t // 1000
+        if self.writer is None:
+            if action != REVEAL:
+                # Before the first reveal there is nothing to chord, and a flag only changes the view
+                if action != FLAG:
+                    return []
+                self.flags_count += 1 if self.board.toggle_flag(row, col) else -1
+                self.pending.append((cell, t))
+                self.touch()
+                return [cell]
+            self.writer = ReplayWriter(generate_preset(self.difficulty, (row, col), self.seed), seed=self.seed)
+            for flagged, pt in self.pending:
+                self.writer.append(flagged, FLAG, pt)
+            self.pending = []
+        changed = self.writer.append(cell, action, t)
+        cells, view = self.writer.board.cells, self.board.cells
+        if action == FLAG:
+            self.flags_count += bool(cells[cell] & FLAGGED) - bool(view[cell] & FLAGGED)
+            view[cell] = _masked(cells[cell])
+        else:
+            for i in changed:
+                b = cells[i]
+                view[i] = b
+                if b & MINE:
+                    self.status = 'lost'
+                else:
+                    self.safe_left -= 1
+            if self.status == 'playing' and not self.safe_left:
+                self.status = 'won'
+            if self.reveal():
+                changed = range(len(view))
+        self.touch()
+        return list(changed)
+
+    def reveal(self) -> bool:
+        """Show the whole board once the game is over, and return whether it was shown. A lost game of
+        today's daily challenge keeps its unrevealed mines hidden until the day is over."""
+        if self.status == 'playing' or self.status == 'lost' and is_todays_daily(self.seed):
+            return False
+        self.board.cells[:] = self.writer.board.cells
+        return True
+
+
+class GameStore:
+    """Games on this worker, by id in creation order.
+
+    Moves only change memory: a game with a new move is marked dirty and written
+    by the next flush (`mock_db.flush_games`). Games idle for `idle_timeout`
+    seconds are dropped once written. There is a store per worker, and its games
+    are leased to it in the database (see `GAME_LEASE`).
+    """
+
+    def __init__(self, idle_timeout: float = GAME_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        # The owner of this store's games in their rows' leases
+        self.worker_id = uuid.uuid4().hex
+        self.sessions: Dict[str, GameSession] = {}
+        self.dirty: Set[str] = set()
+        # Like the simulation's epoch: page tokens from an earlier store never match
+        self.epoch = uuid.uuid4().bytes
+        self.evicted = 0
+        self.flush_failures = 0
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, session: GameSession) -> GameSession:
+        self._seq += 1
+        session.seq = self._seq
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, game_id: str) -> Optional[GameSession]:
+        return self.sessions.get(game_id)
+
+    def drop(self, game_id: str):
+        self.sessions.pop(game_id, None)
+        self.dirty.discard(game_id)
+
+    def visible(self) -> List[GameSession]:
+        """The games spectators may watch: all but today's daily ones, which would give the day's board away."""
+        hidden = daily_seed() if DAILY_SEED_SECRET else None
+        return [s for s in self.sessions.values() if s.seed != hidden]
+
+    def mark_dirty(self, session: GameSession):
+        if session.writer is not None:
+            self.dirty.add(session.id)
+
+    def take_dirty(self) -> List[GameSession]:
+        """The games to write, clearing the dirty set; a failed write marks them again."""
+        sessions = [self.sessions[i] for i in self.dirty if i in self.sessions]
+        self.dirty.clear()
+        return sessions
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop written games with no move for `idle_timeout` seconds; returns how many."""
+        deadline = (time.monotonic() if now is None else now) - self.idle_timeout
+        idle = [i for i, s in self.sessions.items() if s.last_active < deadline and i not in self.dirty]
+        for i in idle:
+            del self.sessions[i]
+        self.evicted += len(idle)
+        return len(idle)
+
+    def select(self, status: Optional[str] = None, username: Optional[str] = None, after: Optional[int] = None,
+               limit: Optional[int] = None) -> Page:
+        """Visible games in creation order, optionally filtered, starting after sequence number `after`."""
+        players = [
+            s for s in self.visible()
+            if (after is None or s.seq > after) and (status is None or s.status == status)
+            and (username is None or s.username == username)
+        ]
+        next_after = None
+        if limit is not None and len(players) > limit:
+            players = players[:limit]
+            next_after = players[-1].seq
+        digest = hashlib.blake2b(self.epoch, digest_size=16)
+        for s in players:
+            digest.update(s.seq.to_bytes(8, 'little') + s.version.to_bytes(8, 'little'))
+        return Page(players, next_after, digest.digest())
+
+    def stats(self) -> Dict:
+        return {
+            'games': len(self.sessions),
+            'playing': sum(1 for s in self.sessions.values() if s.status == 'playing'),
+            'dirty': len(self.dirty),
+            'evicted': self.evicted,
+            'flush_failures': self.flush_failures,
+        }
+
+
+game_store = GameStore()
@@ -0,0 +1,106 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from fastapi import Response
+
+# Encoded response bodies kept per cache (player payloads, player lists, leaderboard pages)
+PAYLOAD_CACHE_SIZE = int(os.getenv('PAYLOAD_CACHE_SIZE', '10000'))
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag: a hash of the exact bytes sent."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+# Suffixes of the ETags of encoded variants (see `encoded_etag`)
+_ENCODING_SUFFIXES = ('-gzip"', '-br"')
+
+
+def encoded_etag(etag: str, coding: Optional[str]) -> str:
+    """ETag of a content-coded variant, `"<tag>-gzip"`: each coding's bytes get their own
+    strong ETag, so caches never serve one coding's bytes for another."""
+    if not coding or coding == 'identity' or etag.endswith(_ENCODING_SUFFIXES):
+        return etag
+    return etag[:-1] + f'-{coding}"'
+
+
+def _base_tag(tag: str) -> str:
+    tag = tag[2:] if tag.startswith('W/') else tag
+    for suffix in _ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """`If-None-Match` check; it uses the weak comparison, so `W/` prefixes are ignored, and
+    the variants of one representation (see `encoded_etag`) match each other."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    base = _base_tag(etag)
+    return any(_base_tag(tag.strip()) == base for tag in if_none_match.split(','))
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    """Content-codings from `Accept-Encoding` with their q-values."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def json_response(body: bytes, etag: str, if_none_match: Optional[str],
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """Already-encoded JSON with its ETag, or an empty 304 when the client has it."""
+    # no-cache: clients may store the body but must revalidate, which is a cheap 304 here
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', **(headers or {})}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+class PayloadCache:
+    """LRU of encoded bodies (and their ETags), each valid for one version of its source."""
+
+    def __init__(self, size: int = PAYLOAD_CACHE_SIZE):
+        self.size = size
+        self._entries: OrderedDict[Hashable, Tuple[Hashable, bytes, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Tuple[bytes, str]]:
+        item = self._entries.get(key)
+        if item is None or item[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1], item[2]
+
+    def put(self, key: Hashable, version: Hashable, body: bytes) -> Tuple[bytes, str]:
+        etag = make_etag(body)
+        self._entries[key] = (version, body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return body, etag
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'size': self.size}
@@ -0,0 +1,129 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import LeaderboardEntry as DBEntry
+from .engine import DIFFICULTY_PRESETS
+from .http_cache import PayloadCache
+from .schemas import LeaderboardEntry
+
+LEADERBOARD_CACHE_SIZE = int(os.getenv('LEADERBOARD_CACHE_SIZE', '100'))
+# Seconds before the cache is reloaded from the database, so entries written by
+# other workers show up within one TTL.
+LEADERBOARD_CACHE_TTL = float(os.getenv('LEADERBOARD_CACHE_TTL', '30'))
+
+logger = logging.getLogger(__name__)
+
+
+def sort_key(entry) -> Tuple:
+    """Leaderboard order: fastest time first, then oldest, then id as a tie-breaker."""
+    return entry.time, entry.date, entry.id
+
+
+def to_schema(e: DBEntry) -> LeaderboardEntry:
+    return LeaderboardEntry(id=e.id, username=e.username, time=e.time, date=e.date, difficulty=e.difficulty,
+                            status=e.status or 'pending')
+
+
+class LeaderboardCache:
+    """Write-through cache of the top-K entries of every difficulty.
+
+    Once stale it keeps answering with its entries until `refresh` has reloaded them.
+    """
+
+    def __init__(self, size: int = LEADERBOARD_CACHE_SIZE, ttl: float = LEADERBOARD_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._keys: Dict[str, List[Tuple]] = {}
+        self._entries: Dict[str, List[LeaderboardEntry]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh: Optional[asyncio.Task] = None
+        # Bumped whenever the cached entries change; keys the encoded first pages in `payloads`
+        self.version = 0
+        self.payloads = PayloadCache(256)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def refresh(self, session_factory: Callable[[], AsyncSession]) -> asyncio.Task:
+        """Reload in the background with a session of its own; while a reload runs, its task
+        is returned instead of starting another."""
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.get_running_loop().create_task(self._reload(session_factory))
+        return self._refresh
+
+    async def _reload(self, session_factory: Callable[[], AsyncSession]):
+        try:
+            async with session_factory() as db:
+                await self.warm(db)
+        except Exception:
+            logger.exception('leaderboard cache reload failed')
+
+    async def warm(self, db: AsyncSession):
+        async with self._lock:
+            await self._warm(db)
+
+    async def _warm(self, db: AsyncSession):
+        keys, entries = {}, {}
+        for difficulty in DIFFICULTY_PRESETS:
+            rows = (await db.scalars(
+                select(DBEntry)
+                .where(DBEntry.difficulty == difficulty)
+                .order_by(DBEntry.time, DBEntry.date, DBEntry.id)
+                .limit(self.size)
+            )).all()
+            entries[difficulty] = [to_schema(e) for e in rows]
+            keys[difficulty] = [sort_key(e) for e in entries[difficulty]]
+        self._keys, self._entries = keys, entries
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def get(self, limit: int, difficulty: Optional[str] = None) -> Optional[List[LeaderboardEntry]]:
+        """Top `limit` entries, or None on a miss (nothing loaded yet or `limit` beyond K)."""
+        if not self.loaded or limit > self.size:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if difficulty is not None:
+            return self._entries.get(difficulty, [])[:limit]
+        # Each difficulty holds its own top-K, so the overall top-`limit` (limit <= K) is in the merge
+        merged = heapq.merge(*self._entries.values(), key=sort_key)
+        return [e for _, e in zip(range(limit), merged)]
+
+    def add(self, entry: LeaderboardEntry):
+        if not self.loaded:
+            return
+        keys = self._keys.setdefault(entry.difficulty, [])
+        entries = self._entries.setdefault(entry.difficulty, [])
+        key = sort_key(entry)
+        if len(keys) >= self.size and key >= keys[-1]:
+            return
+        i = bisect.bisect(keys, key)
+        keys.insert(i, key)
+        entries.insert(i, entry)
+        del keys[self.size:], entries[self.size:]
+        self.version += 1
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'fresh': self.fresh, 'loaded': self.loaded, 'size': self.size}
+
+
+leaderboard_cache = LeaderboardCache()
@@ -1,10 +1,14 @@
 from fastapi import FastAPI
 from .routes import router
-from . import mock_db
+from . import mock_db, spectator
+from .passwords import password_hasher
+from .verification import score_verifier
+from .compression import CompressionMiddleware
+from .static_files import FRONTEND_DIST, StaticSite
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
-from .database import engine, Base, DATABASE_URL
+from typing import Optional
+from .database import engine, async_engine, Base, DATABASE_URL, add_columns, create_indexes
 
 app = FastAPI(
     title='Minesweeper Mock API',
@@ -18,24 +22,21 @@ app.include_router(router, prefix="/api")
 
 # Serve built frontend files using a catch-all route registered after the API router.
 # This avoids StaticFiles mounted at root taking precedence over API routes.
-frontend_path = '/app/frontend_dist'
+# The dist directory is indexed once here (see app/static_files.py).
+frontend_path = FRONTEND_DIST
 if os.path.isdir(frontend_path):
-    from fastapi.responses import FileResponse
-    from fastapi import Request
+    from fastapi import Header
+
+    site = StaticSite(frontend_path)
 
     @app.get('/{full_path:path}')
-    async def serve_spa(full_path: str, request: Request):
-        # Serve static file if it exists in the dist, otherwise return index.html
-        requested = full_path.lstrip('/')
-        candidate = os.path.join(frontend_path, requested)
-        if requested and os.path.isfile(candidate):
-            return FileResponse(candidate)
-        index_file = os.path.join(frontend_path, 'index.html')
-        return FileResponse(index_file)
+    async def serve_spa(full_path: str, accept_encoding: Optional[str] = Header(None),
+                        if_none_match: Optional[str] = Header(None)):
+        # Serve the file if it is in the dist, otherwise index.html
+        return site.serve(full_path, accept_encoding, if_none_match)
 
-    @app.get('/')
-    async def serve_index():
-        return FileResponse(os.path.join(frontend_path, 'index.html'))
+# Gzip JSON/text responses over GZIP_MIN_SIZE; SSE streams compress per connection in the routes
+app.add_middleware(CompressionMiddleware)
 
 # CORS - allow Vite dev server (and others) to call the API during development
 origins = [
@@ -48,12 +49,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],
 )
 
 @app.on_event('startup')
 async def startup_event():
     # Create database tables
     Base.metadata.create_all(bind=engine)
+    add_columns()
+    create_indexes()
+    await mock_db.warm_leaderboard()
     # start background simulation
     loop = None
     try:
@@ -62,7 +67,16 @@ async def startup_event():
     except Exception:
         loop = None
     mock_db.start_simulation(loop)
+    mock_db.start_game_flusher(loop)
 
 @app.on_event('shutdown')
 async def shutdown_event():
+    spectator.broadcaster.stop()
     mock_db.stop_simulation()
+    mock_db.stop_game_flusher()
+    # Write the moves made since the last write-behind flush
+    await mock_db.flush_games()
+    mock_db.close_store()
+    password_hasher.shutdown()
+    score_verifier.shutdown()
+    await async_engine.dispose()
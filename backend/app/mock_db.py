@@ -1,65 +1,115 @@
 import asyncio
+import hashlib
+import logging
 import random
+import secrets
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List
-from sqlalchemy.orm import Session
-from .database import SessionLocal, User as DBUser, LeaderboardEntry as DBEntry
-from .schemas import LeaderboardEntry, ActivePlayer, Cell
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+from sqlalchemy import LargeBinary, bindparam, cast, delete, func, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import (
+    AsyncSessionLocal, Game as DBGame, GameReplay as DBReplay, User as DBUser, UserSession as DBSession, LeaderboardEntry as DBEntry,
+)
+from .leaderboard_cache import leaderboard_cache, to_schema
+from .schemas import LeaderboardEntry, User
+from .session_cache import SESSION_TTL, session_cache, token_hash
+from .rank_index import rank_index
+from .passwords import HasherBusy, is_hashed, password_hasher
+from .engine import PlayerState, generate_board, generate_boards, seeded_board
+from .games import (
+    GAME_FLUSH_INTERVAL, GAME_IDLE_TIMEOUT, GAME_LEASE, MAX_ACTIVE_GAMES, DailyPlayed, GameElsewhere, GameSession,
+    TooManyGames, daily_seed, game_store, is_todays_daily,
+)
+from .replay import ACTIONS, ReplayWriter, first_reveal
+from .simulation import SIM_POPULATION, SIM_TICK, Page, Simulation
+from .spectator_store import SPECTATOR_POLL, open_store
 
-# In-memory for active players (simulation)
-_active_players: List[ActivePlayer] = []
+logger = logging.getLogger(__name__)
+
+# In-memory for active players (simulation), stored as arrays in `_simulation`. `_store`
+# decides where those arrays live and which worker runs the simulation (see spectator_store)
+_store = open_store()
+_simulation: Simulation
 _sim_task = None
+# Writes the games played through the API every GAME_FLUSH_INTERVAL (see `flush_games`)
+_flush_task = None
+# Called with the players that changed after every simulation tick (see `add_listener`)
+_listeners: List[Callable[[Sequence[PlayerState]], None]] = []
+# Called with the simulation and the slots that changed after every tick (see `add_tick_listener`)
+_tick_listeners: List[Callable[[Simulation, np.ndarray], None]] = []
+
+def add_listener(fn: Callable[[Sequence[PlayerState]], None]):
+    """Register a callback invoked synchronously with each batch of changed players."""
+    _listeners.append(fn)
+
+def _notify(players: Sequence[PlayerState]):
+    for fn in _listeners:
+        fn(players)
 
-def create_mock_board(rows=9, cols=9):
-    board = []
-    for i in range(rows):
-        row = []
-        for j in range(cols):
-            isRevealed = random.random() > 0.6
-            isMine = (not isRevealed) and (random.random() > 0.9)
-            cell = Cell(isMine=isMine, isRevealed=isRevealed, isFlagged=(not isRevealed and random.random()>0.8), neighborMines=(random.randint(0,3) if isRevealed else 0))
-            row.append(cell)
-        board.append(row)
+def add_tick_listener(fn: Callable[[Simulation, np.ndarray], None]):
+    """Register a callback invoked after every simulation tick with the slots it changed."""
+    _tick_listeners.append(fn)
+
+def _play_random_moves(board, rng=random):
+    # Play a few random clicks and flags so spectators see a game in progress
+    for _ in range(rng.randint(1, 4)):
+        r, c = rng.randrange(board.rows), rng.randrange(board.cols)
+        if board.is_mine(r, c):
+            board.toggle_flag(r, c)
+        else:
+            board.reveal(r, c)
     return board
 
-def init_active_players():
-    global _active_players
+def create_mock_board(rows=9, cols=9, mines=10, seed=None):
+    """A board with a few moves played; with a `seed` both the board and the moves are reproducible."""
+    return _play_random_moves(generate_board(rows, cols, mines, seed=seed), random if seed is None else random.Random(seed))
+
+def create_mock_boards(count, rows=9, cols=9, mines=10):
+    return [_play_random_moves(b) for b in generate_boards(count, rows, cols, mines)]
+
+def _mock_players(population: int) -> List[Dict]:
     names = ['SweeperPro','MineHunter','FlagQueen','BombSquad']
-    _active_players = []
-    for n in names:
-        player = ActivePlayer(
+    now = datetime.utcnow()
+    return [
+        dict(
             id=str(uuid.uuid4()),
-            username=n,
-            board=create_mock_board(),
+            username=names[i % len(names)] + (str(i // len(names)) if i >= len(names) else ''),
+            board=board,
             status='playing',
             timer=random.randint(10,70),
-            flagsCount=random.randint(0,5),
-            minesCount=10,
-            startedAt=datetime.utcnow() - timedelta(seconds=random.randint(0,120))
+            flags_count=board.flags_count,
+            mines_count=board.mines_count,
+            started_at=now - timedelta(seconds=random.randint(0,120))
         )
-        _active_players.append(player)
+        for i, board in enumerate(create_mock_boards(population))
+    ]
+
+def init_active_players(population: int = SIM_POPULATION):
+    global _simulation
+    _simulation = _store.open(population, lambda: _mock_players(population))
+
+def simulation_stats():
+    return {**_simulation.stats(), 'store': _store.name, 'leader': _store.leader, 'games': game_store.stats()}
 
 async def _simulate():
     while True:
-        await asyncio.sleep(1.5)
-        new_players = []
-        for p in _active_players:
-            if p.status != 'playing':
-                if random.random() > 0.9:
-                    p.board = create_mock_board()
-                    p.status = 'playing'
-                    p.timer = 0
-                    p.flagsCount = 0
-                    p.startedAt = datetime.utcnow()
-            else:
-                p.timer += 1
-                if random.random() > 0.98:
-                    p.status = 'lost'
-                elif random.random() > 0.995:
-                    p.status = 'won'
-            new_players.append(p)
-        _active_players[:] = new_players
+        if _store.try_lead():
+            await asyncio.sleep(SIM_TICK)
+            sim = _simulation
+            changed = sim.step(create_mock_boards)
+        else:
+            # Another worker steps the shared games; fan out the changes it made
+            await asyncio.sleep(SPECTATOR_POLL)
+            sim = _simulation
+            changed = _store.poll(sim)
+        if len(changed):
+            for fn in _tick_listeners:
+                fn(sim, changed)
+            players = sim.players
+            _notify([players[i] for i in changed])
 
 def start_simulation(loop=None):
     global _sim_task
@@ -74,47 +124,92 @@ def stop_simulation():
         _sim_task.cancel()
         _sim_task = None
 
-# Auth helpers - now using DB
-def signup(username: str, email: str, password: str, db: Session | None = None):
+def close_store():
+    """Release this worker's hold on the spectator store (and leadership, if it had it)."""
+    _store.close()
+
+async def _flush_games():
+    while True:
+        await asyncio.sleep(GAME_FLUSH_INTERVAL)
+        try:
+            await flush_games()
+        except Exception:
+            logger.exception('game flush failed')
+        game_store.evict_idle()
+
+def start_game_flusher(loop=None):
+    global _flush_task
+    if _flush_task is None:
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        _flush_task = loop.create_task(_flush_games())
+
+def stop_game_flusher():
+    global _flush_task
+    if _flush_task:
+        _flush_task.cancel()
+        _flush_task = None
+
+# Auth helpers - now using DB (async sessions, so queries never block the event loop)
+def _duplicate_error(e: IntegrityError) -> str:
+    """Map a unique-constraint violation on `users` to the message the API has always returned."""
+    message = str(e.orig).lower()
+    if 'email' in message:
+        return 'Email already registered'
+    if 'username' in message:
+        return 'Username already taken'
+    return str(e)
+
+async def signup(username: str, email: str, password: str, db: AsyncSession | None = None):
     created_local = False
     if db is None:
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         created_local = True
     try:
-        # Check if exists
-        if db.query(DBUser).filter(DBUser.email == email).first():
-            return None, 'Email already registered'
-        if db.query(DBUser).filter(DBUser.username == username).first():
-            return None, 'Username already taken'
-        uid = str(uuid.uuid4())
-        user = DBUser(id=uid, username=username, email=email, password=password)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        # One INSERT; the unique indexes on email/username reject duplicates without a race window
+        user = {
+            'id': str(uuid.uuid4()),
+            'username': username,
+            'email': email,
+            'password': await password_hasher.hash(password),
+            'created_at': datetime.utcnow(),
+        }
+        await db.execute(insert(DBUser).values(user))
+        await db.commit()
         return {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'createdAt': user.created_at
+            'id': user['id'],
+            'username': username,
+            'email': email,
+            'createdAt': user['created_at']
         }, None
+    except HasherBusy:
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        return None, _duplicate_error(e)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return None, str(e)
     finally:
         if created_local:
-            db.close()
+            await db.close()
 
-def login(email: str, password: str, db: Session | None = None):
+async def login(email: str, password: str, db: AsyncSession | None = None):
     created_local = False
     if db is None:
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         created_local = True
     try:
-        user = db.query(DBUser).filter(DBUser.email == email).first()
+        user = await db.scalar(select(DBUser).where(DBUser.email == email))
         if not user:
             return None, 'User not found'
-        if user.password != password:
+        ok, new_hash = await password_hasher.verify(password, user.password)
+        if not ok:
             return None, 'Invalid password'
+        if new_hash:
+            # Legacy plaintext (or outdated parameters): store the current hash
+            user.password = new_hash
+            await db.commit()
         return {
             'id': user.id,
             'username': user.username,
@@ -123,57 +218,604 @@ def login(email: str, password: str, db: Session | None = None):
         }, None
     finally:
         if created_local:
-            db.close()
+            await db.close()
 
-# Leaderboard - using DB
-def get_leaderboard(limit: int = 10, db: Session | None = None):
+async def get_user(user_id: str, db: AsyncSession | None = None):
     created_local = False
     if db is None:
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         created_local = True
     try:
-        entries = db.query(DBEntry).order_by(DBEntry.time).limit(limit).all()
-        return [LeaderboardEntry(
-            id=e.id,
-            username=e.username,
-            time=e.time,
-            date=e.date,
-            difficulty=e.difficulty
-        ) for e in entries]
+        return await db.get(DBUser, user_id)
     finally:
         if created_local:
-            db.close()
+            await db.close()
 
-def submit_score(username: str, time: int, difficulty: str, db: Session | None = None):
+async def get_users(limit: int = 100, db: AsyncSession | None = None, after: Tuple | None = None):
+    """Newest users first, ordered by (created_at, id) descending.
+
+    `after` is the `(created_at, id)` keyset cursor of the last user of the previous page.
+    """
     created_local = False
     if db is None:
-        db = SessionLocal()
+        db = AsyncSessionLocal()
         created_local = True
     try:
-        entry = DBEntry(id=str(uuid.uuid4()), username=username, time=time, difficulty=difficulty)
-        db.add(entry)
-        db.commit()
-        db.refresh(entry)
-        return LeaderboardEntry(
-            id=entry.id,
-            username=entry.username,
-            time=entry.time,
-            date=entry.date,
-            difficulty=entry.difficulty
+        query = select(DBUser)
+        if after is not None:
+            query = query.where(tuple_(DBUser.created_at, DBUser.id) < tuple_(*after))
+        query = query.order_by(DBUser.created_at.desc(), DBUser.id.desc()).limit(limit)
+        return (await db.scalars(query)).all()
+    finally:
+        if created_local:
+            await db.close()
+
+async def stream_users(db: AsyncSession | None = None, batch_size: int = 1000):
+    """Yield all users, newest first, in lists of up to `batch_size` rows.
+
+    Rows are `(id, username, email, created_at)` read from a server-side cursor, so memory
+    stays flat however large the table is.
+    """
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        # Column rows rather than ORM objects, so nothing accumulates in the session
+        query = (
+            select(DBUser.id, DBUser.username, DBUser.email, DBUser.created_at)
+            .order_by(DBUser.created_at.desc(), DBUser.id.desc())
+            .execution_options(yield_per=batch_size)
         )
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        if created_local:
+            await db.close()
+
+def _dialect_insert(db: AsyncSession, table):
+    """`INSERT` with the session's dialect's `ON CONFLICT` clauses."""
+    if db.bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(table)
+
+def _insert_ignoring_duplicates(db: AsyncSession, table):
+    """`INSERT ... ON CONFLICT DO NOTHING` for the session's dialect."""
+    return _dialect_insert(db, table).on_conflict_do_nothing()
+
+async def import_users(rows: List, db: AsyncSession | None = None, chunk_size: int = 500):
+    """Bulk-insert users, skipping any whose id, email or username already exists.
+
+    `rows` are `UserImportRow`s; plaintext passwords are hashed on the password pool.
+    Returns `(imported, duplicates)` where `duplicates` are the indexes of skipped rows.
+    """
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        imported, duplicates = 0, []
+        now = datetime.utcnow()
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            plain = [i for i, r in enumerate(chunk) if not is_hashed(r.password)]
+            hashed = await password_hasher.hash_many([chunk[i].password for i in plain])
+            passwords = [r.password for r in chunk]
+            for i, h in zip(plain, hashed):
+                passwords[i] = h
+            values = [
+                {'id': r.id or str(uuid.uuid4()), 'username': r.username, 'email': r.email,
+                 'password': pw, 'created_at': r.createdAt or now}
+                for r, pw in zip(chunk, passwords)
+            ]
+            stmt = _insert_ignoring_duplicates(db, DBUser).returning(DBUser.id)
+            inserted = set((await db.scalars(stmt, values)).all())
+            imported += len(inserted)
+            for i, v in enumerate(values):
+                if v['id'] in inserted:
+                    inserted.discard(v['id'])  # a repeated id later in the chunk was skipped
+                else:
+                    duplicates.append(start + i)
+        await db.commit()
+        return imported, duplicates
+    except Exception as e:
+        await db.rollback()
+        raise e
+    finally:
+        if created_local:
+            await db.close()
+
+# Sessions - bearer tokens in the DB, fronted by an in-process LRU
+async def create_session(user_id: str, db: AsyncSession | None = None) -> str:
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        db.add(DBSession(token_hash=token_hash(token), user_id=user_id, created_at=now,
+                         expires_at=now + timedelta(seconds=SESSION_TTL)))
+        await db.commit()
+        return token
+    finally:
+        if created_local:
+            await db.close()
+
+async def resolve_session(token: str, db: AsyncSession | None = None) -> User | None:
+    """User owning `token`, or None if it is unknown, expired or logged out."""
+    key = token_hash(token)
+    user = session_cache.get(key)
+    if user is not None:
+        return user
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        now = datetime.utcnow()
+        row = (await db.execute(
+            select(DBUser, DBSession.expires_at)
+            .join(DBSession, DBSession.user_id == DBUser.id)
+            .where(DBSession.token_hash == key, DBSession.expires_at > now)
+        )).first()
+        if row is None:
+            return None
+        db_user, expires_at = row
+        user = User(id=db_user.id, username=db_user.username, email=db_user.email, createdAt=db_user.created_at)
+        session_cache.put(key, user, (expires_at - now).total_seconds())
+        return user
+    finally:
+        if created_local:
+            await db.close()
+
+async def end_session(token: str, db: AsyncSession | None = None):
+    key = token_hash(token)
+    session_cache.evict(key)
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        await db.execute(delete(DBSession).where(DBSession.token_hash == key))
+        await db.commit()
+    finally:
+        if created_local:
+            await db.close()
+
+# Leaderboard - using DB, fronted by an in-process top-K cache
+async def warm_leaderboard(db: AsyncSession | None = None):
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        await leaderboard_cache.warm(db)
+        await rank_index.load(db)
+    finally:
+        if created_local:
+            await db.close()
+
+async def get_leaderboard(limit: int = 10, db: AsyncSession | None = None, difficulty: str | None = None,
+                          after: Tuple | None = None, before: Tuple | None = None, verified: bool = False,
+                          played: bool = False):
+    """Entries in (time, date, id) order, optionally for one difficulty and only verified or
+    only `played` ones (see `LeaderboardEntry.status`).
+
+    `after` / `before` are keyset cursors `(time, date, id)`: the page starts right after
+    (or ends right before) that entry. First pages of all entries are served from the cache,
+    stale ones too while it reloads in the background.
+    """
+    cacheable = after is None and before is None and not verified and not played
+    if cacheable:
+        if not leaderboard_cache.fresh:
+            leaderboard_cache.refresh(AsyncSessionLocal)
+        cached = leaderboard_cache.get(limit, difficulty)
+        if cached is not None:
+            return cached
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        query = select(DBEntry)
+        if difficulty is not None:
+            query = query.where(DBEntry.difficulty == difficulty)
+        if played:
+            query = query.where(DBEntry.status == 'played')
+        elif verified:
+            query = query.where(DBEntry.status.in_(('verified', 'played')))
+        key = tuple_(DBEntry.time, DBEntry.date, DBEntry.id)
+        if after is not None:
+            query = query.where(key > tuple_(*after))
+        if before is not None:
+            query = query.where(key < tuple_(*before))
+            # Walk backwards from the cursor, then restore ascending order
+            query = query.order_by(DBEntry.time.desc(), DBEntry.date.desc(), DBEntry.id.desc())
+            entries = list((await db.scalars(query.limit(limit))).all())
+            entries.reverse()
+        else:
+            query = query.order_by(DBEntry.time, DBEntry.date, DBEntry.id)
+            entries = (await db.scalars(query.limit(limit))).all()
+        return [to_schema(e) for e in entries]
+    finally:
+        if created_local:
+            await db.close()
+
+def replay_row(game_id: str, writer: ReplayWriter) -> Dict:
+    """`game_replays` row for a finished game's move log; a seeded board is stored as its seed."""
+    board = writer.board
+    return {'id': game_id, 'rows': board.rows, 'cols': board.cols,
+            'board': writer.initial if writer.seed is None else None, 'seed': writer.seed,
+            'mines': board.mines_count, 'moves': writer.moves, 'duration_ms': writer.t, 'log': bytes(writer.log),
+            'keyframes': bytes(writer.keyframes)}
+
+async def submit_score(username: str, time: int, difficulty: str, db: AsyncSession | None = None,
+                       replay: ReplayWriter | None = None, entry_id: str | None = None):
+    """Add an entry. With a verified `replay` (see `verification`) the entry is 'verified' and
+    `time` is the server-measured one; otherwise it is 'pending' with the claimed `time`."""
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        entry = DBEntry(id=entry_id or str(uuid.uuid4()), username=username, time=time, difficulty=difficulty,
+                        status='pending' if replay is None else 'verified')
+        db.add(entry)
+        if replay is not None:
+            db.add(DBReplay(**replay_row(entry.id, replay)))
+        await db.commit()
+        await db.refresh(entry)
+        result = to_schema(entry)
+        leaderboard_cache.add(result)
+        rank_index.add(difficulty, time)
+        return result
+    except Exception as e:
+        await db.rollback()
+        raise e
+    finally:
+        if created_local:
+            await db.close()
+
+async def submit_scores(scores: Iterable, db: AsyncSession | None = None, chunk_size: int = 500,
+                        replays: Sequence[ReplayWriter | None] | None = None, status: str = 'verified'):
+    """Insert many scores with one multi-row INSERT per chunk in a single transaction.
+
+    `scores` are objects with `username`, `time` and `difficulty` (and optionally an `id` for
+    the entry); `replays`, if given, holds a verified replay (or None) per score, stored under
+    the new entry's id, as for `submit_score`. A score with a replay carries the
+    server-measured time and gets `status` ('played' for games played on the server). Returns the new ids.
+    """
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        now = datetime.utcnow()
+        scores = list(scores)
+        replays = list(replays) if replays is not None else [None] * len(scores)
+        rows = [
+            {'id': getattr(s, 'id', None) or str(uuid.uuid4()), 'username': s.username,
+             'time': s.time, 'difficulty': s.difficulty, 'date': now,
+             'status': 'pending' if writer is None else status}
+            for s, writer in zip(scores, replays)
+        ]
+        replay_rows = [replay_row(row['id'], writer) for row, writer in zip(rows, replays) if writer]
+        for start in range(0, len(rows), chunk_size):
+            await db.execute(insert(DBEntry), rows[start:start + chunk_size])
+        for start in range(0, len(replay_rows), chunk_size):
+            await db.execute(insert(DBReplay), replay_rows[start:start + chunk_size])
+        await db.commit()
+        for row in rows:
+            leaderboard_cache.add(LeaderboardEntry(**row))
+            rank_index.add(row['difficulty'], row['time'])
+        return [row['id'] for row in rows]
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise e
     finally:
         if created_local:
-            db.close()
+            await db.close()
+
+async def get_replay(game_id: str, db: AsyncSession | None = None):
+    """A stored replay, with the board of a seeded game regenerated into `board`."""
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        replay = await db.get(DBReplay, game_id)
+        if replay is not None and replay.board is None:
+            # Detached, so the regenerated board is never written back
+            db.expunge(replay)
+            first = divmod(first_reveal(replay.log), replay.cols)
+            replay.board = bytes(seeded_board(replay.seed, replay.rows, replay.cols, replay.mines, first).cells)
+        return replay
+    finally:
+        if created_local:
+            await db.close()
+
+async def get_rank(time: int, difficulty: str, db: AsyncSession | None = None):
+    """Place a time would take (1 = fastest; equal times share a place) and the board size."""
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        if not rank_index.fresh:
+            # Answered by the database below while the index reloads off the request path
+            rank_index.refresh(AsyncSessionLocal)
+        faster = rank_index.faster_than(difficulty, time)
+        total = rank_index.total(difficulty)
+        if faster is None:
+            # Outside the indexed range, or the index is stale: an index-backed count on (difficulty, time)
+            count = select(func.count()).select_from(DBEntry).where(DBEntry.difficulty == difficulty)
+            faster = await db.scalar(count.where(DBEntry.time < time))
+            total = await db.scalar(count)
+        return {'difficulty': difficulty, 'time': time, 'rank': faster + 1, 'total': total}
+    finally:
+        if created_local:
+            await db.close()
+
+async def get_user_rank(username: str, difficulty: str, db: AsyncSession | None = None):
+    """Rank of a user's best time in `difficulty`, or None if they have no entry there."""
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        best = await db.scalar(
+            select(func.min(DBEntry.time))
+            .where(DBEntry.username == username, DBEntry.difficulty == difficulty)
+        )
+        if best is None:
+            return None
+        result = await get_rank(best, difficulty, db)
+        result['username'] = username
+        return result
+    finally:
+        if created_local:
+            await db.close()
+
+# Games played through the API: moves are applied in memory (see games.GameStore)
+_games = DBGame.__table__
+
+def _lease() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=GAME_LEASE)
+
+async def create_game(username: str, difficulty: str, daily: bool = False,
+                      db: AsyncSession | None = None) -> GameSession:
+    """A new game on a random board, or on the day's board with `daily`. Its row is
+    inserted right away, leased to this worker, so other workers know where it is.
+    Raises `TooManyGames` when the user already has MAX_ACTIVE_GAMES in play, and
+    `DailyPlayed` for a second daily game the same day (`DailyDisabled` if there are none)."""
+    session = GameSession(str(uuid.uuid4()), username, difficulty, seed=daily_seed() if daily else None)
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        since = datetime.utcnow() - timedelta(seconds=GAME_IDLE_TIMEOUT)
+        playing = await db.scalar(select(func.count()).select_from(DBGame).where(
+            DBGame.username == username, DBGame.status == 'playing', DBGame.updated_at > since))
+        if playing >= MAX_ACTIVE_GAMES:
+            raise TooManyGames()
+        if daily and await db.scalar(select(DBGame.id).where(DBGame.username == username,
+                                                             DBGame.seed == session.seed).limit(1)):
+            raise DailyPlayed()
+        lease = _lease()
+        await db.execute(insert(DBGame), [{**game_row(session), 'revision': 1, 'owner': game_store.worker_id,
+                                           'lease_until': lease}])
+        await db.commit()
+    finally:
+        if created_local:
+            await db.close()
+    session.stored, session.revision, session.lease_until = (0, 0), 1, lease
+    return game_store.add(session)
+
+async def get_game(game_id: str, db: AsyncSession | None = None) -> GameSession | None:
+    """A game from memory while this worker's lease on it lasts.
+
+    Otherwise the lease is taken again, and the game resumed from its row if the
+    row has moved on from the copy in memory (or there is none). Raises
+    `GameElsewhere` while another worker holds the game.
+    """
+    session = game_store.get(game_id)
+    now = datetime.utcnow()
+    if session is not None and now < session.lease_until:
+        return session
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        row = await db.get(DBGame, game_id, populate_existing=True)
+        if row is None:
+            return None
+        if row.owner != game_store.worker_id and row.lease_until is not None and row.lease_until > now:
+            raise GameElsewhere((row.lease_until - now).total_seconds())
+        revision = row.revision
+        # A copy behind the row was written over by another worker: drop it
+        resumed = GameSession.restore(row) if session is None or session.revision != revision else None
+        lease = _lease()
+        result = await db.execute(
+            _games.update().where(_games.c.id == game_id, _games.c.revision == revision)
+            .values(revision=revision + 1, owner=game_store.worker_id, lease_until=lease))
+        await db.commit()
+    finally:
+        if created_local:
+            await db.close()
+    if result.rowcount != 1:
+        # Taken meanwhile: by another request here, or by another worker
+        session = game_store.get(game_id)
+        if session is not None and datetime.utcnow() < session.lease_until:
+            return session
+        raise GameElsewhere(GAME_LEASE)
+    if resumed is not None:
+        session = game_store.add(resumed)
+    session.revision, session.lease_until = revision + 1, lease
+    return session
+
+def play_move(session: GameSession, action: str, row: int, col: int) -> List[int]:
+    """Apply a move in memory; the game is written by the next `flush_games`."""
+    changed = session.play(ACTIONS.index(action), row, col)
+    game_store.mark_dirty(session)
+    _notify([session])
+    return changed
+
+def game_row(session: GameSession) -> Dict:
+    """The `games` row of a new game."""
+    return {
+        'id': session.id, 'username': session.username, 'difficulty': session.difficulty,
+        'status': session.status, 'rows': session.board.rows, 'cols': session.board.cols,
+        'started_at': session.started_at, 'updated_at': datetime.utcnow(), 'seed': session.seed,
+        'initial': None, 'moves': 0, 'duration_ms': 0, 'log': b'', 'keyframes': b'', 'version': session.version,
+    }
+
+def game_update(session: GameSession, lease: datetime) -> Dict:
+    """Parameters of `_GAME_APPEND` for a game: the log and keyframe bytes since its last write."""
+    writer = session.writer
+    log, keyframes = session.stored
+    return {
+        'game_id': session.id, 'seen': session.revision, 'worker': game_store.worker_id, 'lease': lease,
+        'new_status': session.status, 'new_version': session.version, 'now': datetime.utcnow(),
+        'new_moves': writer.moves, 'new_duration': writer.t, 'more_log': bytes(writer.log[log:]),
+        'more_keyframes': bytes(writer.keyframes[keyframes:]),
+    }
+
+# Bytes are appended in SQL, so a flush costs the moves since the last one, not the whole game.
+# Only the revision this worker last wrote is updated, which renews its lease
+_GAME_APPEND = _games.update().where(
+    _games.c.id == bindparam('game_id'), _games.c.revision == bindparam('seen'),
+).values(
+    revision=_games.c.revision + 1, owner=bindparam('worker'), lease_until=bindparam('lease'),
+    status=bindparam('new_status'), version=bindparam('new_version'), updated_at=bindparam('now'),
+    moves=bindparam('new_moves'),
+    duration_ms=bindparam('new_duration'),
+    log=cast(_games.c.log.concat(bindparam('more_log', type_=LargeBinary)), LargeBinary),
+    keyframes=cast(_games.c.keyframes.concat(bindparam('more_keyframes', type_=LargeBinary)), LargeBinary),
+)
+
+async def _flush_chunk(db: AsyncSession, sessions: List[GameSession]) -> int:
+    """Write `sessions` in one transaction; see `flush_games`."""
+    lease = _lease()
+    # Rows are copied before the first await, so moves made meanwhile wait for the next flush
+    updates = [game_update(s, lease) for s in sessions]
+    marks = [(len(s.writer.log), len(s.writer.keyframes)) for s in sessions]
+    kept = []
+    try:
+        for params in updates:
+            kept.append((await db.execute(_GAME_APPEND, params)).rowcount == 1)
+        won = [s for s, ok in zip(sessions, kept) if ok and s.status == 'won']
+        if won:
+            # Commits the game rows too
+            await submit_scores(won, db, replays=[s.writer for s in won], status='played')
+        else:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    for session, mark, ok in zip(sessions, marks, kept):
+        if ok:
+            session.stored, session.revision, session.lease_until = mark, session.revision + 1, lease
+        else:
+            # Another worker took the game over once this one's lease lapsed; this copy is stale
+            logger.warning('game %s was taken over by another worker; dropping its copy here', session.id)
+            game_store.drop(session.id)
+    return sum(kept)
+
+async def flush_games(db: AsyncSession | None = None, chunk_size: int = 500) -> int:
+    """Write every game with moves since the last flush, a transaction per chunk of games.
+
+    New games are inserted; stored ones only get the log bytes and keyframes since their
+    last write appended. Games just won are entered on the leaderboard with their replays
+    under the game's id. A chunk that fails is retried a game at a time, so one bad row
+    only holds up its own game: games that still fail are logged and marked dirty again.
+    Returns how many games were written.
+    """
+    sessions = game_store.take_dirty()
+    if not sessions:
+        return 0
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    written = 0
+    try:
+        for start in range(0, len(sessions), chunk_size):
+            chunk = sessions[start:start + chunk_size]
+            try:
+                written += await _flush_chunk(db, chunk)
+            except Exception:
+                written += await _flush_each(db, chunk)
+        return written
+    finally:
+        if created_local:
+            await db.close()
 
-# Spectator - still in memory
+async def _flush_each(db: AsyncSession, sessions: List[GameSession]) -> int:
+    """Write a failed chunk's games one by one, to find the ones that can't be written."""
+    written = 0
+    for session in sessions:
+        try:
+            written += await _flush_chunk(db, [session])
+        except Exception:
+            logger.exception('could not write game %s', session.id)
+            game_store.dirty.add(session.id)
+            game_store.flush_failures += 1
+    return written
+
+# Spectator - real games first, then the simulated ones (still in memory)
 def get_active_players():
-    return list(_active_players)
+    return game_store.visible() + list(_simulation.players)
+
+def get_simulation() -> Simulation:
+    return _simulation
+
+def query_players(status: str | None = None, username: str | None = None, after: Tuple[int, int] | None = None,
+                  limit: int | None = None) -> Page:
+    """A `Page` of real games (see `GameStore.select`) followed by simulated ones (see
+    `Simulation.select`); `after` and `next_after` are `(source, position)`, source 0 or 1."""
+    source, position = after or (0, None)
+    games = Page([], None, b'')
+    if source == 0:
+        games = game_store.select(status, username, position, limit)
+        if games.next_after is not None:
+            return Page(games.players, (0, games.next_after), games.token)
+        position = None
+        if limit is not None:
+            limit -= len(games.players)
+            if not limit:
+                more = _simulation.select(status, username, None, 1).players
+                return Page(games.players, (1, -1) if more else None, games.token)
+    sim = _simulation.select(status, username, position, limit)
+    token = hashlib.blake2b(games.token + sim.token, digest_size=16).digest()
+    return Page(games.players + sim.players, None if sim.next_after is None else (1, sim.next_after), token)
 
 def find_player(player_id: str):
-    return next((p for p in _active_players if p.id == player_id), None)
+    session = game_store.get(player_id)
+    if session is not None and not is_todays_daily(session.seed):
+        return session
+    return _simulation.get(player_id)
+
+async def find_stored_game(game_id: str, db: AsyncSession | None = None) -> GameSession | None:
+    """A game not in this worker's store, as of its row's last write (see `flush_games`): for
+    spectators of a game held by another worker. It is not added to the store."""
+    created_local = False
+    if db is None:
+        db = AsyncSessionLocal()
+        created_local = True
+    try:
+        row = await db.get(DBGame, game_id)
+        if row is None or is_todays_daily(row.seed):
+            return None
+        return GameSession.restore(row)
+    finally:
+        if created_local:
+            await db.close()
 
 # Initialize
 init_active_players()
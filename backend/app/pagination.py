@@ -0,0 +1,25 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*key) -> str:
+    """Opaque keyset cursor for a row's sort key (datetimes are kept as ISO strings)."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, *types) -> Tuple:
+    """Inverse of `encode_cursor`; `types` gives the expected type of each key part."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(datetime.fromisoformat(v) if t is datetime else t(v) for t, v in zip(types, values))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor('Invalid cursor') from e
@@ -0,0 +1,132 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# scrypt cost parameters; raising them makes existing hashes get upgraded on next login
+SCRYPT_N = int(os.getenv('SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.getenv('SCRYPT_R', '8'))
+SCRYPT_P = int(os.getenv('SCRYPT_P', '1'))
+# hashlib.scrypt releases the GIL, so threads give real parallelism for hashing
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Hash jobs allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '64'))
+
+_PREFIX = 'scrypt'
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_password(password: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> str:
+    """`scrypt$n$r$p$salt$hash`, with a fresh random salt. CPU-bound: run it in the pool."""
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=32)
+    return f'{_PREFIX}${n}${r}${p}${_b64(salt)}${_b64(digest)}'
+
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith(_PREFIX + '$')
+
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy plaintext rows and hashes made with other cost parameters."""
+    if not is_hashed(stored):
+        return True
+    return stored.split('$')[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def verify_password(password: str, stored: str) -> bool:
+    if not is_hashed(stored):
+        # Legacy plaintext row, written before passwords were hashed
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, n, r, p, salt, digest = stored.split('$')
+        n, r, p = int(n), int(r), int(p)
+        expected = _unb64(digest)
+        actual = hashlib.scrypt(password.encode(), salt=_unb64(salt), n=n, r=r, p=p,
+                                maxmem=256 * n * r + 2 ** 20, dklen=len(expected))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+class HasherBusy(Exception):
+    """More hash jobs are waiting than `PASSWORD_HASH_QUEUE` allows."""
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded thread pool, off the event loop.
+
+    At most `workers` hashes run at once and `max_queue` more may wait; beyond that
+    calls fail fast with `HasherBusy` so a login burst turns into 503s instead of
+    an ever-growing backlog.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs waiting for a free worker."""
+        return max(0, self.in_flight - self.workers)
+
+    async def _run(self, fn, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HasherBusy('Too many password checks in progress, try again shortly')
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self.in_flight += 1
+        try:
+            return await asyncio.get_event_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def hash_many(self, passwords: List[str], concurrency: Optional[int] = None) -> List[str]:
+        """Hash a batch (e.g. an import) on at most `concurrency` workers, by default half the
+        pool, so interactive logins keep the rest of it."""
+        limit = asyncio.Semaphore(concurrency or max(1, self.workers // 2))
+
+        async def one(password: str) -> str:
+            async with limit:
+                return await self._run(hash_password, password)
+
+        return list(await asyncio.gather(*(one(p) for p in passwords)))
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, Optional[str]]:
+        """Check `password`; on success also return a new hash when `stored` should be upgraded."""
+        if not await self._run(verify_password, password, stored):
+            return False, None
+        if needs_rehash(stored):
+            return True, await self._run(hash_password, password)
+        return True, None
+
+    def stats(self) -> Dict:
+        return {'workers': self.workers, 'in_flight': self.in_flight, 'queue_depth': self.queue_depth,
+                'completed': self.completed, 'rejected': self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
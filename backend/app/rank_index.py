@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import time as _time
+from array import array
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import LeaderboardEntry as DBEntry
+from .leaderboard_cache import LEADERBOARD_CACHE_TTL
+
+# Times (seconds) tracked by the in-memory index; slower times are ranked by the database.
+RANK_MAX_TIME = int(os.getenv('RANK_MAX_TIME', '100000'))
+
+logger = logging.getLogger(__name__)
+
+
+class FenwickTree:
+    """Binary indexed tree of counts over buckets 0..size-1."""
+
+    __slots__ = ('size', 'tree')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = array('q', bytes(8 * (size + 1)))
+
+    def add(self, i: int, delta: int = 1):
+        i += 1
+        tree, size = self.tree, self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Sum of buckets [0, i)."""
+        total = 0
+        tree = self.tree
+        i = min(i, self.size)
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+
+class RankIndex:
+    """Order statistics per difficulty: how many entries are faster than a given time.
+
+    One Fenwick tree per difficulty over whole-second buckets, loaded with a grouped
+    count and updated incrementally on every submitted score. Once stale it answers
+    nothing (callers count in the database) until `refresh` has reloaded it.
+    """
+
+    def __init__(self, max_time: int = RANK_MAX_TIME, ttl: float = LEADERBOARD_CACHE_TTL):
+        self.max_time = max_time
+        self.ttl = ttl
+        self._trees: Dict[str, FenwickTree] = {}
+        self._totals: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh: Optional[asyncio.Task] = None
+
+    @property
+    def fresh(self) -> bool:
+        return self._loaded_at is not None and _time.monotonic() - self._loaded_at < self.ttl
+
+    def refresh(self, session_factory: Callable[[], AsyncSession]) -> asyncio.Task:
+        """Reload in the background with a session of its own; while a reload runs, its task
+        is returned instead of starting another."""
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.get_running_loop().create_task(self._reload(session_factory))
+        return self._refresh
+
+    async def _reload(self, session_factory: Callable[[], AsyncSession]):
+        try:
+            async with session_factory() as db:
+                await self.load(db)
+        except Exception:
+            logger.exception('rank index reload failed')
+
+    async def load(self, db: AsyncSession):
+        async with self._lock:
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession):
+        rows = (await db.execute(
+            select(DBEntry.difficulty, DBEntry.time, func.count()).group_by(DBEntry.difficulty, DBEntry.time)
+        )).all()
+        # Rebuilt only once the rows are in, so lookups during the query see the old trees
+        self._trees, self._totals = {}, {}
+        for difficulty, time, count in rows:
+            self._add(difficulty, time, count)
+        self._loaded_at = _time.monotonic()
+
+    def _add(self, difficulty: str, time: int, count: int):
+        tree = self._trees.get(difficulty)
+        if tree is None:
+            tree = self._trees[difficulty] = FenwickTree(self.max_time + 1)
+        # Slower-than-tracked times all share the last bucket: they only matter for `total`
+        tree.add(min(max(time, 0), self.max_time), count)
+        self._totals[difficulty] = self._totals.get(difficulty, 0) + count
+
+    def add(self, difficulty: str, time: int):
+        if self._loaded_at is not None:
+            self._add(difficulty, time, 1)
+
+    def faster_than(self, difficulty: str, time: int) -> Optional[int]:
+        """Entries strictly faster than `time`, or None when the index can't answer."""
+        if not self.fresh or time > self.max_time:
+            return None
+        tree = self._trees.get(difficulty)
+        return tree.prefix(max(time, 0)) if tree else 0
+
+    def total(self, difficulty: str) -> Optional[int]:
+        return self._totals.get(difficulty, 0) if self.fresh else None
+
+
+rank_index = RankIndex()
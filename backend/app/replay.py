@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import json
+import os
+from typing import AsyncIterator, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .broadcast import sse_event
+from .engine import Board
+
+# A keyframe (the board after that many moves) is recorded every this many moves
+REPLAY_KEYFRAME_INTERVAL = int(os.getenv('REPLAY_KEYFRAME_INTERVAL', '64'))
+
+ACTIONS = ('reveal', 'flag', 'chord')
+REVEAL, FLAG, CHORD = range(len(ACTIONS))
+
+
+def write_varint(out: bytearray, value: int):
+    """Unsigned LEB128: 7 bits per byte, high bit set on all but the last byte."""
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos: int):
+    """Decode one varint at `pos`; returns (value, position after it)."""
+    value = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+def apply_move(board: Board, cell: int, action: int) -> List[int]:
+    row, col = divmod(cell, board.cols)
+    if action == REVEAL:
+        return board.reveal(row, col)
+    if action == FLAG:
+        board.toggle_flag(row, col)
+        return [cell]
+    return board.chord(row, col)
+
+
+class Move(NamedTuple):
+    number: int  # 1-based position in the game
+    t: int       # milliseconds since the game started
+    cell: int    # flat index, row * cols + col
+    action: int
+
+
+class Keyframe(NamedTuple):
+    moves: int   # moves applied to the board it stands for
+    t: int
+    offset: int  # position in the log of the next move
+    start: int   # position in the index of its changed cells
+    count: int   # cells changed since the previous keyframe
+
+
+class ReplayWriter:
+    """Append-only move log of one game.
+
+    Each move is two varints, `cell << 2 | action` and the milliseconds since the
+    previous move, so a typical click costs 2-4 bytes. Every `keyframe_interval`
+    moves the cells changed since the previous keyframe are recorded in a separate
+    index, which lets a replay start at any time without re-applying the whole
+    game; recording changes rather than the board keeps the index about the size of
+    the game's reveals, however large the board.
+    """
+
+    def __init__(self, board: Board, keyframe_interval: int = REPLAY_KEYFRAME_INTERVAL, seed: Optional[int] = None):
+        self.initial = bytes(board.cells)
+        # Set when `board` is `engine.seeded_board(seed, ..., first reveal)`: stored instead of it
+        self.seed = seed
+        self.board = Board(board.rows, board.cols, bytearray(board.cells))
+        self.keyframe_interval = keyframe_interval
+        self.log = bytearray()
+        self.keyframes = bytearray()
+        self.moves = 0
+        self.t = 0
+        # Cells changed since the last keyframe
+        self._changed: Set[int] = set()
+
+    @classmethod
+    def restore(cls, rows: int, cols: int, initial: bytes, board: bytes, log: bytes, keyframes: bytes,
+                moves: int, t: int, keyframe_interval: int = REPLAY_KEYFRAME_INTERVAL,
+                seed: Optional[int] = None) -> 'ReplayWriter':
+        """Writer of a stored game, to carry on appending its moves."""
+        writer = cls.__new__(cls)
+        writer.initial = bytes(initial)
+        writer.seed = seed
+        writer.board = Board(rows, cols, bytearray(board))
+        writer.keyframe_interval = keyframe_interval
+        writer.log = bytearray(log)
+        writer.keyframes = bytearray(keyframes)
+        writer.moves = moves
+        writer.t = t
+        base = keyframe_cells(initial, keyframes, read_keyframes(keyframes))
+        writer._changed = {i for i, (a, b) in enumerate(zip(base, board)) if a != b}
+        return writer
+
+    def append(self, cell: int, action: int, t: int) -> List[int]:
+        """Record a move and apply it to `board`; returns the cells it changed."""
+        if not 0 <= cell < len(self.board):
+            raise ValueError(f'move {self.moves}: cell {cell} is outside the board')
+        if not 0 <= action < len(ACTIONS):
+            raise ValueError(f'move {self.moves}: unknown action {action}')
+        if t < self.t:
+            raise ValueError(f'move {self.moves}: time goes backwards')
+        write_varint(self.log, cell << 2 | action)
+        write_varint(self.log, t - self.t)
+        changed = apply_move(self.board, cell, action)
+        self.moves += 1
+        self.t = t
+        self._changed.update(changed)
+        if self.moves % self.keyframe_interval == 0:
+            self._write_keyframe()
+        return changed
+
+    def _write_keyframe(self):
+        """Header varints, then a `(gap from the previous changed cell, packed cell)` pair per change."""
+        out, cells = self.keyframes, self.board.cells
+        for value in (self.moves, self.t, len(self.log), len(self._changed)):
+            write_varint(out, value)
+        previous = -1
+        for i in sorted(self._changed):
+            write_varint(out, i - previous - 1)
+            out.append(cells[i])
+            previous = i
+        self._changed.clear()
+
+
+def read_moves(log: bytes, start: Optional[Keyframe] = None) -> Iterator[Move]:
+    """Moves in the log, from the beginning or from after a keyframe."""
+    number, t, pos = (start.moves, start.t, start.offset) if start else (0, 0, 0)
+    end = len(log)
+    while pos < end:
+        packed, pos = read_varint(log, pos)
+        delta, pos = read_varint(log, pos)
+        number += 1
+        t += delta
+        yield Move(number, t, packed >> 2, packed & 3)
+
+
+def first_reveal(log: bytes) -> Optional[int]:
+    """Cell of the game's first reveal, the safe first click of a seeded board."""
+    return next((move.cell for move in read_moves(log) if move.action == REVEAL), None)
+
+
+def read_keyframes(index: bytes) -> List[Keyframe]:
+    """Parse a keyframe index, skipping over the changed cells."""
+    keyframes, pos = [], 0
+    while pos < len(index):
+        moves, pos = read_varint(index, pos)
+        t, pos = read_varint(index, pos)
+        offset, pos = read_varint(index, pos)
+        count, pos = read_varint(index, pos)
+        keyframes.append(Keyframe(moves, t, offset, pos, count))
+        for _ in range(count):
+            _, pos = read_varint(index, pos)
+            pos += 1
+    return keyframes
+
+
+def keyframe_cells(initial: bytes, index: bytes, keyframes: Sequence[Keyframe]) -> bytearray:
+    """The packed board at the last of `keyframes`: their changes applied in turn to `initial`."""
+    cells = bytearray(initial)
+    for kf in keyframes:
+        pos, cell = kf.start, -1
+        for _ in range(kf.count):
+            gap, pos = read_varint(index, pos)
+            cell += gap + 1
+            cells[cell] = index[pos]
+            pos += 1
+    return cells
+
+
+def board_at(rows: int, cols: int, initial: bytes, log: bytes, index: bytes,
+             t: int) -> Tuple[Board, Optional[Move], Iterator[Move]]:
+    """The board after every move made up to time `t`, the first move after it and an
+    iterator over the rest.
+
+    Starts from the last keyframe at or before `t` and applies only the moves since.
+    """
+    keyframes = read_keyframes(index)
+    k = bisect.bisect_right([kf.t for kf in keyframes], t) - 1
+    start = keyframes[k] if k >= 0 else None
+    board = Board(rows, cols, keyframe_cells(initial, index, keyframes[:k + 1]))
+    moves = read_moves(log, start)
+    for move in moves:
+        if move.t > t:
+            return board, move, moves
+        apply_move(board, move.cell, move.action)
+    return board, None, moves
+
+
+async def replay_stream(replay, speed: float = 1.0, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """SSE replay of a stored game: a `start` event with the board at `start` ms, then one
+    `move` event per move paced at `speed` times real time (0: no pacing), then `end`."""
+    board, move, moves = board_at(replay.rows, replay.cols, replay.board, replay.log, replay.keyframes, start)
+    yield sse_event(json.dumps({
+        'id': replay.id, 'rows': replay.rows, 'cols': replay.cols, 'moves': replay.moves,
+        'durationMs': replay.duration_ms, 't': start, 'board': board.to_cells(),
+    }, separators=(',', ':')), event='start')
+    t = start
+    while move is not None and (end is None or move.t <= end):
+        if speed > 0 and move.t > t:
+            await asyncio.sleep((move.t - t) / 1000 / speed)
+        t = move.t
+        yield sse_event(f'{{"n":{move.number},"t":{move.t},"cell":{move.cell},"action":"{ACTIONS[move.action]}"}}',
+                        event='move')
+        move = next(moves, None)
+    yield sse_event(json.dumps({'t': t}), event='end')
@@ -1,102 +1,460 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from typing import List
-from . import mock_db
-from .schemas import LoginCredentials, SignupCredentials, AuthResponse, User, LeaderboardEntry, SubmitScoreRequest, ActivePlayer
-from .database import get_db
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional, Union
+from pydantic import ValidationError
+from datetime import datetime
+from . import export, mock_db, spectator, spectator_ws
+from .schemas import LoginCredentials, SignupCredentials, AuthResponse, User, LeaderboardEntry, SubmitScoreRequest, ActivePlayer, ActivePlayerSummary, Difficulty, RankResponse, BatchScoreResponse, UserImportRow, UserImportDuplicate, UserImportResponse, NewGameRequest, MoveRequest, GameState, SeedRequest, SeedTicketResponse
+from .leaderboard_cache import sort_key
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .passwords import HasherBusy
+from .engine import DIFFICULTY_PRESETS, MAX_PAYLOAD_CELLS
+from .games import DailyDisabled, DailyPlayed, GameElsewhere, TooManyGames, is_todays_daily
+from .replay import replay_stream
+from .verification import VerifierBusy, issue_ticket, score_verifier
+from .compression import StreamCompressor, compress_stream, negotiate, stream_headers
+from .http_cache import json_response, make_etag
+from .database import get_async_db
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import csv
+import hmac
+import io
 import json
-import asyncio
+import math
+import os
+
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '10000'))
+# Shared secret for /admin routes; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
 router = APIRouter()
 
+def _encode(data) -> bytes:
+    """JSON bytes in the same shape FastAPI's response_model serialization produces."""
+    return json.dumps(jsonable_encoder(data), separators=(',', ':')).encode()
+
+def _bearer_token(request: Request) -> Optional[str]:
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer':
+        return None
+    return token.strip() or None
+
+async def current_user(request: Request, db: AsyncSession = Depends(get_async_db)) -> User:
+    """User of the `Authorization: Bearer <token>` session."""
+    token = _bearer_token(request)
+    if token:
+        user = await mock_db.resolve_session(token, db)
+        if user:
+            return user
+    raise HTTPException(status_code=401, detail='Not authenticated', headers={'WWW-Authenticate': 'Bearer'})
+
 @router.post('/auth/login', response_model=AuthResponse)
-async def login(creds: LoginCredentials, db: Session = Depends(get_db)):
-    user, err = mock_db.login(creds.email, creds.password, db)
+async def login(creds: LoginCredentials, db: AsyncSession = Depends(get_async_db)):
+    try:
+        user, err = await mock_db.login(creds.email, creds.password, db)
+    except HasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
     if err:
         return AuthResponse(success=False, error=err)
     user_obj = User(id=user['id'], username=user['username'], email=user['email'], createdAt=user['createdAt'])
-    return AuthResponse(success=True, user=user_obj)
+    return AuthResponse(success=True, user=user_obj, token=await mock_db.create_session(user['id'], db))
 
 @router.post('/auth/signup', response_model=AuthResponse)
-async def signup(creds: SignupCredentials, db: Session = Depends(get_db)):
-    user, err = mock_db.signup(creds.username, creds.email, creds.password, db)
+async def signup(creds: SignupCredentials, db: AsyncSession = Depends(get_async_db)):
+    try:
+        user, err = await mock_db.signup(creds.username, creds.email, creds.password, db)
+    except HasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
     if err:
         return AuthResponse(success=False, error=err)
     user_obj = User(id=user['id'], username=user['username'], email=user['email'], createdAt=user['createdAt'])
-    return AuthResponse(success=True, user=user_obj)
+    return AuthResponse(success=True, user=user_obj, token=await mock_db.create_session(user['id'], db))
 
-@router.post('/auth/logout')
-async def logout():
-    return JSONResponse(status_code=204, content=None)
+@router.post('/auth/logout', status_code=204)
+async def logout(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Revoke the bearer token; it stops working immediately on this worker."""
+    token = _bearer_token(request)
+    if token:
+        await mock_db.end_session(token, db)
+    return Response(status_code=204)
 
 @router.get('/auth/me', response_model=User)
-async def me(request: Request):
-    # Read header X-User-Id
-    uid = request.headers.get('x-user-id')
-    if not uid:
-        raise HTTPException(status_code=401, detail='Not authenticated')
-    
-    # Query database for user
-    from .database import SessionLocal, User as DBUser
-    db = SessionLocal()
-    try:
-        db_user = db.query(DBUser).filter(DBUser.id == uid).first()
-        if not db_user:
-            raise HTTPException(status_code=401, detail='Not authenticated')
-        return User(id=db_user.id, username=db_user.username, email=db_user.email, createdAt=db_user.created_at)
-    finally:
-        db.close()
+async def me(user: User = Depends(current_user)):
+    return user
 
 @router.get('/users', response_model=List[User])
-async def get_users(request: Request):
-    """Get all registered users (requires authentication)"""
+async def get_users(response: Response, limit: int = Query(100, ge=1, le=1000), after: Optional[str] = None,
+                    format: Literal['json', 'ndjson', 'csv'] = 'json',
+                    user: User = Depends(current_user), db: AsyncSession = Depends(get_async_db)):
+    """Registered users, newest first (requires authentication).
+
+    `format=json` returns one page; pass the `X-Next-Cursor` header back as `after` for the
+    next one. `format=ndjson` / `format=csv` stream every user (ignoring `limit`/`after`).
+    """
     # For now, require authentication (could be admin-only in production)
-    uid = request.headers.get('x-user-id')
-    if not uid:
-        raise HTTPException(status_code=401, detail='Not authenticated - provide X-User-Id header')
-    
-    # Verify the requesting user exists
-    from .database import SessionLocal, User as DBUser
-    db = SessionLocal()
+    if format == 'ndjson':
+        return StreamingResponse(export.users_ndjson(mock_db.stream_users(db)), media_type='application/x-ndjson')
+    if format == 'csv':
+        return StreamingResponse(export.users_csv(mock_db.stream_users(db)), media_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="users.csv"'})
     try:
-        db_user = db.query(DBUser).filter(DBUser.id == uid).first()
-        if not db_user:
-            raise HTTPException(status_code=401, detail='Not authenticated')
-        
-        # Get all users
-        all_users = db.query(DBUser).order_by(DBUser.created_at.desc()).all()
-        return [User(id=u.id, username=u.username, email=u.email, createdAt=u.created_at) for u in all_users]
-    finally:
-        db.close()
+        after_key = decode_cursor(after, datetime, str) if after else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    users = await mock_db.get_users(limit, db, after_key)
+    if len(users) == limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(users[-1].created_at, users[-1].id)
+    return [User(id=u.id, username=u.username, email=u.email, createdAt=u.created_at) for u in users]
 
 @router.get('/leaderboard', response_model=List[LeaderboardEntry])
-async def get_leaderboard(limit: int = 10, db: Session = Depends(get_db)):
-    return mock_db.get_leaderboard(limit, db)
+async def get_leaderboard(limit: int = Query(10, ge=1, le=1000),
+                          difficulty: Optional[Difficulty] = None, after: Optional[str] = None,
+                          before: Optional[str] = None, verified: bool = False, played: bool = False,
+                          if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    """Leaderboard ordered by time; `verified=true` keeps only scores with a server-measured time,
+    `played=true` only those of games played on the server (not from a seed ticket).
+    Page with the `X-Next-Cursor` / `X-Prev-Cursor` response headers passed back as
+    `after` / `before`. Responses carry an ETag and answer a matching `If-None-Match` with 304."""
+    if after and before:
+        raise HTTPException(status_code=400, detail='Use either after or before, not both')
+    try:
+        after_key = decode_cursor(after, int, datetime, str) if after else None
+        before_key = decode_cursor(before, int, datetime, str) if before else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    entries = await mock_db.get_leaderboard(limit, db, difficulty, after_key, before_key, verified, played)
+    headers = {}
+    if entries:
+        full = len(entries) == limit
+        if full or before_key:
+            headers['X-Next-Cursor'] = encode_cursor(*sort_key(entries[-1]))
+        if after_key or (full and before_key):
+            headers['X-Prev-Cursor'] = encode_cursor(*sort_key(entries[0]))
+    cache = mock_db.leaderboard_cache
+    if after_key is None and before_key is None and not verified and not played and cache.loaded and limit <= cache.size:
+        # A first page served by the top-K cache: encode it once per cache version
+        key = (limit, difficulty)
+        cached = cache.payloads.get(key, cache.version)
+        body, etag = cached or cache.payloads.put(key, cache.version, _encode(entries))
+    else:
+        body = _encode(entries)
+        etag = make_etag(body)
+    return json_response(body, etag, if_none_match, headers)
+
+@router.get('/leaderboard/rank', response_model=RankResponse)
+async def get_rank(time: int, difficulty: Difficulty, db: AsyncSession = Depends(get_async_db)):
+    """Place `time` would take on the `difficulty` leaderboard."""
+    return await mock_db.get_rank(time, difficulty, db)
+
+@router.get('/leaderboard/users/{username}/rank', response_model=RankResponse)
+async def get_user_rank(username: str, difficulty: Difficulty, db: AsyncSession = Depends(get_async_db)):
+    """Place of the user's best time on the `difficulty` leaderboard."""
+    result = await mock_db.get_user_rank(username, difficulty, db)
+    if result is None:
+        raise HTTPException(status_code=404, detail='No score for this user and difficulty')
+    return result
 
 @router.post('/leaderboard', response_model=LeaderboardEntry, status_code=201)
-async def post_score(req: SubmitScoreRequest, db: Session = Depends(get_db)):
-    return mock_db.submit_score(req.username, req.time, req.difficulty, db)
+async def post_score(req: SubmitScoreRequest, db: AsyncSession = Depends(get_async_db)):
+    """Add a score. With a `replay` on a seed from POST /games/seed the server replays the game
+    on its verification pool: the entry is `verified` with the time since the seed was issued,
+    or the request fails with 422 if the ticket or moves don't hold up (409 if the ticket was
+    used already). Without one the claimed `time` is entered as `pending`."""
+    if req.replay is None:
+        return await mock_db.submit_score(req.username, req.time, req.difficulty, db)
+    try:
+        score = await score_verifier.verify(req.username, req.difficulty, req.replay)
+    except VerifierBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f'Invalid replay: {e}')
+    try:
+        return await mock_db.submit_score(score.username, score.time, score.difficulty, db, score.writer, score.id)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail='This seed ticket was already used')
+
+_BATCH_BODY = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            'application/json': {'schema': {'type': 'array', 'items': {'$ref': '#/components/schemas/SubmitScoreRequest'}}},
+            'application/x-ndjson': {'schema': {'type': 'string', 'description': 'One SubmitScoreRequest JSON object per line'}},
+        },
+    },
+}
+
+async def _read_batch(request: Request, model, noun: str) -> List:
+    """Parse and validate a bulk body: a JSON array, NDJSON (`application/x-ndjson`) or CSV
+    with a header row (`text/csv`). Every row is validated before returning; any invalid row
+    fails the whole request with 422 listing the bad indexes."""
+    items, errors = [], []
+    def validate(index, item):
+        try:
+            items.append(model.parse_obj(item))
+        except ValidationError as e:
+            errors.append({'index': index, 'errors': e.errors()})
+        if len(items) + len(errors) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=413, detail=f'At most {MAX_BATCH_SIZE} {noun} per batch')
+    content_type = request.headers.get('content-type', '')
+    try:
+        if 'ndjson' in content_type:
+            index, buffer = 0, b''
+            async for chunk in request.stream():
+                *lines, buffer = (buffer + chunk).split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        validate(index, json.loads(line))
+                        index += 1
+            if buffer.strip():
+                validate(index, json.loads(buffer))
+        elif 'csv' in content_type:
+            reader = csv.DictReader(io.StringIO((await request.body()).decode('utf-8-sig')))
+            for index, row in enumerate(reader):
+                # Empty cells mean "not given", so optional fields fall back to their defaults
+                validate(index, {k: v for k, v in row.items() if v not in ('', None)})
+        else:
+            body = json.loads(await request.body())
+            if not isinstance(body, list):
+                raise HTTPException(status_code=422, detail=f'Expected a JSON array of {noun}')
+            for index, item in enumerate(body):
+                validate(index, item)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Malformed JSON' if 'csv' not in content_type else 'Malformed CSV')
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    return items
+
+@router.post('/leaderboard/batch', response_model=BatchScoreResponse, status_code=201, openapi_extra=_BATCH_BODY)
+async def post_scores(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Submit many scores at once as a JSON array, or as NDJSON (one score per line)
+    with `Content-Type: application/x-ndjson`. All rows are validated before anything
+    is written, then inserted in chunks within one transaction."""
+    scores = await _read_batch(request, SubmitScoreRequest, 'scores')
+    # Replays are verified in parallel on the verification pool
+    verified = iter(await score_verifier.verify_many(
+        [(s.username, s.difficulty, s.replay) for s in scores if s.replay is not None]))
+    entries, replays, errors = [], [], []
+    for index, score in enumerate(scores):
+        result = next(verified) if score.replay is not None else None
+        if isinstance(result, VerifierBusy):
+            raise HTTPException(status_code=503, detail=str(result), headers={'Retry-After': '1'})
+        if isinstance(result, ValueError):
+            errors.append({'index': index, 'errors': [{'loc': ['replay'], 'msg': str(result), 'type': 'value_error'}]})
+        elif isinstance(result, BaseException):
+            raise result
+        entries.append(result or score)
+        replays.append(result.writer if result else None)
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+    try:
+        ids = await mock_db.submit_scores(entries, db, replays=replays)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail='A seed ticket was already used')
+    return BatchScoreResponse(count=len(ids), ids=ids)
+
+@router.get('/games/{game_id}/replay')
+async def get_replay(game_id: str, speed: float = Query(1.0, ge=0, le=1000), start: int = Query(0, ge=0, alias='from'),
+                     end: Optional[int] = Query(None, ge=0, alias='to'), accept_encoding: Optional[str] = Header(None),
+                     db: AsyncSession = Depends(get_async_db)):
+    """SSE replay of a game stored with its score: a `start` event with the board at `from`
+    (ms), then its `move` events paced at `speed` times real time (0 sends them at once)
+    up to `to`, then `end`. Seeking starts from the nearest keyframe. Replays of today's
+    daily challenge open once the day is over, as they show its board."""
+    replay = await mock_db.get_replay(game_id, db)
+    if replay is None:
+        raise HTTPException(status_code=404, detail='No replay for this game')
+    if is_todays_daily(replay.seed):
+        raise HTTPException(status_code=403, detail="Replays of today's daily challenge open tomorrow")
+    return _event_stream(replay_stream(replay, speed, start, end), accept_encoding)
+
+def _game_state(session, changed: Optional[List[int]] = None, row: int = 0):
+    """`GameState` of a game: the whole board, or after a move in play only the changed cells.
+    Boards over MAX_PAYLOAD_CELLS are sent as a window of rows from `row` (`boardRow`), and so
+    is a move that changed more cells than that, from the first changed row."""
+    board = session.board
+    data = session.fields()
+    data.update(difficulty=session.difficulty, rows=board.rows, cols=board.cols,
+                moves=session.writer.moves if session.writer else len(session.pending))
+    if changed is not None and len(changed) > MAX_PAYLOAD_CELLS:
+        changed, row = None, min(changed) // board.cols
+    if changed is None or session.status != 'playing':
+        if len(board) <= MAX_PAYLOAD_CELLS:
+            data['board'] = board.to_cells()
+        else:
+            row = min(row, board.rows - 1)
+            data.update(board=board.to_cells(row, row + max(1, MAX_PAYLOAD_CELLS // board.cols)), boardRow=row)
+    else:
+        cols = board.cols
+        data['cells'] = [{**board.cell(i), 'row': i // cols, 'col': i % cols} for i in changed]
+    return data
+
+async def _own_game(game_id: str, user: User, db: AsyncSession):
+    try:
+        session = await mock_db.get_game(game_id, db)
+    except GameElsewhere as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={'Retry-After': str(math.ceil(e.retry_after))})
+    if session is None:
+        raise HTTPException(status_code=404, detail='Game not found')
+    if session.username != user.username:
+        raise HTTPException(status_code=403, detail='Not your game')
+    return session
 
-@router.get('/spectator/active', response_model=List[ActivePlayer])
-async def get_active():
+@router.post('/games', response_model=GameState, status_code=201)
+async def create_game(body: NewGameRequest, user: User = Depends(current_user),
+                      db: AsyncSession = Depends(get_async_db)):
+    """Start a game for the signed-in user. The mines are placed on the first reveal, which
+    is never a mine; the game shows up in /spectator/active right away. `daily` games are all
+    played on the day's board, one per user a day (409), unless there is no DAILY_SEED_SECRET (503).
+    At most MAX_ACTIVE_GAMES may be in play at once (429)."""
+    mock_db.start_game_flusher()
+    try:
+        session = await mock_db.create_game(user.username, body.difficulty, body.daily, db)
+    except TooManyGames as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except DailyPlayed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except DailyDisabled as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return _game_state(session)
+
+@router.post('/games/seed', response_model=SeedTicketResponse, status_code=201)
+async def issue_seed(body: SeedRequest, user: User = Depends(current_user)):
+    """Seed of a board for a game played client-side (see `engine.seeded_board`, with the first
+    reveal as the safe first click). Its clock starts now: a win submitted with the ticket as
+    `replay.ticket` is entered with the time from here to the submission."""
+    ticket, token = issue_ticket(user.username, body.difficulty)
+    preset = DIFFICULTY_PRESETS[body.difficulty]
+    return SeedTicketResponse(ticket=token, seed=ticket.seed, difficulty=body.difficulty, rows=preset.rows,
+                              cols=preset.cols, minesCount=preset.mines, issuedAt=ticket.issued_at)
+
+@router.get('/games/{game_id}', response_model=GameState)
+async def get_game(game_id: str, row: int = Query(0, ge=0), user: User = Depends(current_user),
+                   db: AsyncSession = Depends(get_async_db)):
+    """The game with its board; boards over MAX_PAYLOAD_CELLS come a window of rows at a time, from `row`."""
+    return _game_state(await _own_game(game_id, user, db), row=row)
+
+@router.post('/games/{game_id}/{action}', response_model=GameState)
+async def play_move(game_id: str, action: Literal['reveal', 'flag', 'chord'], move: MoveRequest,
+                    user: User = Depends(current_user), db: AsyncSession = Depends(get_async_db)):
+    """Apply one move, timed by the server. Moves are kept in memory and written to the
+    database in batches every GAME_FLUSH_INTERVAL seconds; a won game is entered on the
+    leaderboard with its replay by the next flush."""
+    mock_db.start_game_flusher()
+    session = await _own_game(game_id, user, db)
+    try:
+        changed = mock_db.play_move(session, action, move.row, move.col)
+    except IndexError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _game_state(session, changed)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin routes need `X-Admin-Token` to match `ADMIN_TOKEN`; they are disabled when it is unset."""
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail='Admin token required')
+
+_IMPORT_BODY = {
+    'requestBody': {
+        'required': True,
+        'content': {
+            'text/csv': {'schema': {'type': 'string', 'description': 'Header row: username,email,password[,id,createdAt]'}},
+            'application/x-ndjson': {'schema': {'type': 'string', 'description': 'One UserImportRow JSON object per line'}},
+            'application/json': {'schema': {'type': 'array', 'items': {'$ref': '#/components/schemas/UserImportRow'}}},
+        },
+    },
+}
+
+@router.post('/admin/users/import', response_model=UserImportResponse, openapi_extra=_IMPORT_BODY,
+             dependencies=[Depends(require_admin)])
+async def import_users(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Bulk-create users from CSV, NDJSON or a JSON array. Rows whose id, email or username
+    already exist are skipped (`INSERT ... ON CONFLICT DO NOTHING`) and reported in `duplicates`."""
+    rows = await _read_batch(request, UserImportRow, 'users')
+    try:
+        imported, duplicates = await mock_db.import_users(rows, db)
+    except HasherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+    return UserImportResponse(imported=imported, duplicates=[
+        UserImportDuplicate(index=i, username=rows[i].username, email=rows[i].email) for i in duplicates
+    ])
+
+@router.get('/spectator/active', response_model=List[Union[ActivePlayer, ActivePlayerSummary]])
+async def get_active(status: Optional[Literal['playing', 'won', 'lost']] = None, username: Optional[str] = None,
+                     limit: Optional[int] = Query(None, ge=1, le=1000), cursor: Optional[str] = None,
+                     fields: Literal['full', 'summary'] = 'full', if_none_match: Optional[str] = Header(None)):
+    """Active players, optionally filtered by `status` / `username`. With `limit` the list is
+    paged: pass the `X-Next-Cursor` header back as `cursor`. `fields=summary` omits the boards."""
     mock_db.start_simulation()
-    return mock_db.get_active_players()
+    try:
+        after = decode_cursor(cursor, int, int) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    page = mock_db.query_players(status, username, after, limit)
+    # Pre-encoded bytes are returned as-is, skipping response_model validation and re-encoding
+    body, etag = spectator.active_payload(page, (status, username, after, limit, fields), fields == 'summary')
+    headers = {'X-Next-Cursor': encode_cursor(*page.next_after)} if page.next_after is not None else None
+    return json_response(body, etag, if_none_match, headers)
+
+@router.get('/spectator/simulation')
+async def simulation_stats():
+    """Simulated population and tick durations (last/avg/max, in ms), plus this worker's
+    caches and worker pools, for monitoring."""
+    return {
+        **mock_db.simulation_stats(),
+        'leaderboardCache': mock_db.leaderboard_cache.stats(),
+        'sessionCache': mock_db.session_cache.stats(),
+        'passwordHasher': mock_db.password_hasher.stats(),
+        'scoreVerifier': score_verifier.stats(),
+    }
+
+def _event_stream(events, accept_encoding: Optional[str]) -> StreamingResponse:
+    """SSE response, compressed with a per-connection zlib stream when the client accepts it."""
+    encoding = negotiate(accept_encoding)
+    if encoding:
+        events = compress_stream(events, StreamCompressor(encoding))
+    return StreamingResponse(events, media_type='text/event-stream', headers=stream_headers(encoding))
 
 @router.get('/spectator/stream')
-async def stream_active():
+async def stream_active(request: Request, mode: Literal['full', 'delta'] = 'full',
+                        last_event_id: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
+    """SSE stream of active players.
+
+    `mode=full` sends the whole player list every tick. `mode=delta` sends one
+    `snapshot` event followed by sequence-numbered `patch` events, and resumes from
+    the `Last-Event-ID` header when the missed patches are still available.
+    Clients accepting gzip or deflate get one compression stream per connection.
+    """
     mock_db.start_simulation()
-    async def event_generator():
-        while True:
-            await asyncio.sleep(1)
-            players = mock_db.get_active_players()
-            data = json.dumps([p.dict() for p in players], default=str)
-            yield f"data: {data}\n\n"
-    return StreamingResponse(event_generator(), media_type='text/event-stream')
+    if mode == 'delta':
+        events = spectator.delta_stream(request, last_event_id)
+    else:
+        events = spectator.full_stream(request)
+    return _event_stream(events, accept_encoding)
 
-@router.get('/spectator/{player_id}', response_model=ActivePlayer)
-async def get_player(player_id: str):
+@router.websocket('/spectator/ws')
+async def spectator_socket(websocket: WebSocket):
+    """Multiplexed spectator socket: subscribe to any number of players and the lobby."""
+    mock_db.start_simulation()
+    await spectator_ws.gateway.serve(websocket)
+
+@router.get('/spectator/{player_id}/stream')
+async def stream_player(player_id: str, request: Request, accept_encoding: Optional[str] = Header(None)):
+    """SSE stream of one game: a `snapshot` event, then an `update` event with the
+    changed fields/cells whenever the game changes. Ends when the game is won or lost."""
+    mock_db.start_simulation()
     p = mock_db.find_player(player_id)
     if not p:
         raise HTTPException(status_code=404, detail='Player not found')
-    return p
+    return _event_stream(spectator.player_stream(request, p), accept_encoding)
+
+@router.get('/spectator/{player_id}', response_model=ActivePlayer)
+async def get_player(player_id: str, if_none_match: Optional[str] = Header(None),
+                     db: AsyncSession = Depends(get_async_db)):
+    """A player; a game held by another worker is read from its row, as of its last flush."""
+    p = mock_db.find_player(player_id) or await mock_db.find_stored_game(player_id, db)
+    if not p:
+        raise HTTPException(status_code=404, detail='Player not found')
+    return json_response(*spectator.player_payload(p), if_none_match)
@@ -1,7 +1,10 @@
 from typing import List, Literal, Optional
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, root_validator
 from datetime import datetime
 
+# Must stay in sync with `engine.DIFFICULTY_PRESETS` (the DB enum is built from it)
+Difficulty = Literal['easy', 'medium', 'hard', 'extreme', 'marathon']
+
 class User(BaseModel):
     id: str
     username: str
@@ -20,19 +23,72 @@ class SignupCredentials(BaseModel):
 class AuthResponse(BaseModel):
     success: bool
     user: Optional[User] = None
+    # Session token for `Authorization: Bearer <token>`
+    token: Optional[str] = None
     error: Optional[str] = None
 
+class UserImportRow(BaseModel):
+    username: str
+    email: EmailStr
+    # Plaintext, or an existing `scrypt$...` hash which is stored as-is
+    password: str
+    id: Optional[str] = None
+    createdAt: Optional[datetime] = None
+
+class UserImportDuplicate(BaseModel):
+    index: int
+    username: str
+    email: str
+
+class UserImportResponse(BaseModel):
+    imported: int
+    duplicates: List[UserImportDuplicate]
+
 class LeaderboardEntry(BaseModel):
     id: str
     username: str
     time: int
     date: datetime
-    difficulty: Literal['easy','medium','hard']
+    difficulty: Difficulty
+    # 'played': played on the server (POST /games); 'verified': played client-side from a seed
+    # ticket, replayed and timed by the server; 'pending': as claimed
+    status: Literal['pending', 'verified', 'played'] = 'pending'
+
+class ReplayMove(BaseModel):
+    cell: int  # row * cols + col
+    action: Literal['reveal', 'flag', 'chord']
+    t: int  # milliseconds since the game started
+
+class ReplayUpload(BaseModel):
+    # From POST /games/seed: the board is generated from the ticket's seed
+    ticket: str
+    moves: List[ReplayMove]
 
 class SubmitScoreRequest(BaseModel):
     username: str
+    # Ignored with a replay: the time is measured by the server from its seed ticket
+    time: Optional[int] = None
+    difficulty: Difficulty
+    # The game's moves; the server replays them to verify the win, and stores them
+    # as a replay under the new entry's id
+    replay: Optional[ReplayUpload] = None
+
+    @root_validator(skip_on_failure=True)
+    def time_or_replay(cls, values):
+        if values['time'] is None and values['replay'] is None:
+            raise ValueError('time is required without a replay')
+        return values
+
+class BatchScoreResponse(BaseModel):
+    count: int
+    ids: List[str]
+
+class RankResponse(BaseModel):
+    difficulty: Difficulty
     time: int
-    difficulty: Literal['easy','medium','hard']
+    rank: int
+    total: int
+    username: Optional[str] = None
 
 class Cell(BaseModel):
     isMine: bool
@@ -40,12 +96,53 @@ class Cell(BaseModel):
     isFlagged: bool
     neighborMines: int
 
-class ActivePlayer(BaseModel):
+class ActivePlayerSummary(BaseModel):
     id: str
     username: str
-    board: List[List[Cell]]
     status: Literal['playing','won','lost']
     timer: int
     flagsCount: int
     minesCount: int
     startedAt: datetime
+
+class ActivePlayer(ActivePlayerSummary):
+    # Null for boards over MAX_PAYLOAD_CELLS
+    board: Optional[List[List[Cell]]]
+
+class NewGameRequest(BaseModel):
+    difficulty: Difficulty = 'easy'
+    # Play the day's board, the same for everyone (see `games.daily_seed`)
+    daily: bool = False
+
+class SeedRequest(BaseModel):
+    difficulty: Difficulty = 'easy'
+
+class SeedTicketResponse(BaseModel):
+    # Signed; send it back as `replay.ticket` with the win
+    ticket: str
+    seed: int
+    difficulty: Difficulty
+    rows: int
+    cols: int
+    minesCount: int
+    issuedAt: datetime
+
+class MoveRequest(BaseModel):
+    row: int
+    col: int
+
+class ChangedCell(Cell):
+    row: int
+    col: int
+
+class GameState(ActivePlayerSummary):
+    difficulty: Difficulty
+    rows: int
+    cols: int
+    moves: int
+    # The whole board for a new game, a fetched one or one that just ended; otherwise
+    # only the cells the move changed are in `cells`
+    board: Optional[List[List[Cell]]] = None
+    # Boards over MAX_PAYLOAD_CELLS are sent a window of rows at a time; `board` then starts at this row
+    boardRow: Optional[int] = None
+    cells: Optional[List[ChangedCell]] = None
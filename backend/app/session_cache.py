@@ -0,0 +1,58 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .schemas import User
+
+# Lifetime of a session token issued at login/signup
+SESSION_TTL = int(os.getenv('SESSION_TTL', str(7 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+# Seconds a validated session is trusted without asking the database. A logout on another
+# worker only evicts that worker's cache, so this also bounds how long a revoked token lives.
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '60'))
+
+
+def token_hash(token: str) -> str:
+    """Tokens are stored (and cached) only as their SHA-256."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionCache:
+    """LRU of session token hash -> user, each entry valid for at most `ttl` seconds."""
+
+    def __init__(self, size: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, Tuple[User, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[User]:
+        item = self._entries.get(key)
+        if item is None or item[1] <= time.monotonic():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key: str, user: User, ttl: Optional[float] = None):
+        """Cache `user`; `ttl` may shorten the entry's life, e.g. to the session's own expiry."""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (user, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def evict(self, key: str):
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'size': self.size}
+
+
+session_cache = SessionCache()
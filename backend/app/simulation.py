@@ -0,0 +1,249 @@
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .engine import Board, PlayerState
+
+# Number of simulated games and seconds between simulation ticks
+SIM_POPULATION = int(os.getenv('SIM_POPULATION', '4'))
+SIM_TICK = float(os.getenv('SIM_TICK', '1.5'))
+
+STATUSES = ('playing', 'won', 'lost')
+PLAYING, WON, LOST = range(len(STATUSES))
+_STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+# Per-tick odds for a game in progress to be lost / won, and for a finished one to restart
+P_LOSE = 0.02
+P_WIN = 0.98 * 0.005
+P_RESTART = 0.1
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Per-game arrays, widest first so every array in a shared buffer stays aligned;
+# started_at is in seconds since the epoch, UTC
+_FIELDS = (('timer', np.int64), ('version', np.int64), ('started_at', np.float64),
+           ('flags_count', np.int32), ('mines_count', np.int32), ('status', np.int8))
+# Buffer header: tick counters (ticks, last, max, total seconds) and the 16-byte epoch
+_COUNTERS = 4
+_HEADER = _COUNTERS * 8 + 16
+
+
+def _column(name: str):
+    """Property proxying a player attribute to its slot in one of the simulation's arrays."""
+    def get(self):
+        return getattr(self._sim, name)[self._slot].item()
+
+    def set(self, value):
+        getattr(self._sim, name)[self._slot] = value
+
+    return property(get, set)
+
+
+def _counter(index: int):
+    """Property proxying a tick statistic to the simulation's counters array."""
+    def get(self):
+        return self.counters[index].item()
+
+    def set(self, value):
+        self.counters[index] = value
+
+    return property(get, set)
+
+
+class SimulatedPlayer(PlayerState):
+    """A `PlayerState` whose scalar fields live in the owning `Simulation`'s arrays.
+
+    Reads and writes go through to the arrays, so code written against `PlayerState`
+    keeps working while a tick updates every player with a few vectorized operations.
+    """
+
+    __slots__ = ('_sim', '_slot')
+
+    timer = _column('timer')
+    flags_count = _column('flags_count')
+    mines_count = _column('mines_count')
+    version = _column('version')
+
+    def __init__(self, sim: 'Simulation', slot: int, **fields):
+        self._sim = sim
+        self._slot = slot
+        super().__init__(**fields)
+
+    @property
+    def epoch(self) -> bytes:
+        return self._sim.epoch
+
+    @property
+    def status(self) -> str:
+        return STATUSES[self._sim.status[self._slot]]
+
+    @status.setter
+    def status(self, value: str):
+        self._sim.status[self._slot] = _STATUS_CODES[value]
+
+    @property
+    def started_at(self) -> datetime:
+        return _EPOCH + timedelta(seconds=float(self._sim.started_at[self._slot]))
+
+    @started_at.setter
+    def started_at(self, value: datetime):
+        self._sim.started_at[self._slot] = (value - _EPOCH).total_seconds()
+
+
+class Page(NamedTuple):
+    players: List[SimulatedPlayer]
+    next_after: Optional[int]  # slot to pass as `after` for the next page, None on the last one
+    token: bytes  # changes whenever the page's membership or any of its players change
+
+
+class Simulation:
+    """Struct-of-arrays state of up to `capacity` simulated games.
+
+    `step()` advances all of them with one random draw per game and boolean masks,
+    so the per-tick cost in Python is proportional to the games that restart (they
+    need a new board), not to the population.
+
+    It is also the player registry: players are indexed by id and by username, and
+    the `status` array doubles as the status index (one vectorized comparison).
+    Slots never change, so a slot number is a stable pagination cursor.
+
+    All arrays (and the tick counters) are views into one buffer laid out by
+    `nbytes()`. Passing an existing `buffer`, e.g. shared memory, keeps its contents,
+    so another process can attach to the same games (see `spectator_store`).
+    """
+
+    ticks = _counter(0)
+    last_tick = _counter(1)
+    max_tick = _counter(2)
+    total_tick = _counter(3)
+
+    def __init__(self, capacity: int, seed: Optional[int] = None, buffer=None):
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        fresh = buffer is None
+        if fresh:
+            buffer = bytearray(self.nbytes(capacity))
+        self.counters = np.ndarray(_COUNTERS, np.float64, buffer, 0)
+        self._epoch = np.ndarray(16, np.uint8, buffer, _COUNTERS * 8)
+        offset = _HEADER
+        for name, dtype in _FIELDS:
+            array = np.ndarray(capacity, dtype, buffer, offset)
+            setattr(self, name, array)
+            offset += array.nbytes
+        self.players: List[SimulatedPlayer] = []
+        self._by_id: Dict[str, int] = {}
+        self._by_username: Dict[str, List[int]] = {}
+        if fresh:
+            self.new_epoch()
+
+    @staticmethod
+    def nbytes(capacity: int) -> int:
+        return _HEADER + capacity * sum(np.dtype(dtype).itemsize for _, dtype in _FIELDS)
+
+    @property
+    def epoch(self) -> bytes:
+        """Distinguishes this population from earlier ones whose slots and versions look alike."""
+        return self._epoch.tobytes()
+
+    def new_epoch(self):
+        self._epoch[:] = np.frombuffer(uuid.uuid4().bytes, np.uint8)
+
+    def add(self, **fields) -> SimulatedPlayer:
+        if len(self.players) >= self.capacity:
+            raise ValueError('Simulation is full')
+        return self._register(SimulatedPlayer(self, len(self.players), **fields))
+
+    def attach(self, id: str, username: str, board: Board) -> SimulatedPlayer:
+        """Register the player in the next slot without writing its fields, which are
+        already in the buffer."""
+        player = SimulatedPlayer.__new__(SimulatedPlayer)
+        player._sim, player._slot = self, len(self.players)
+        player.id, player.username, player.board = id, username, board
+        return self._register(player)
+
+    def _register(self, player: SimulatedPlayer) -> SimulatedPlayer:
+        self.players.append(player)
+        self._by_id[player.id] = player._slot
+        self._by_username.setdefault(player.username, []).append(player._slot)
+        return player
+
+    def set_board(self, slot: int, board: Board):
+        self.players[slot].board = board
+
+    def get(self, player_id: str) -> Optional[SimulatedPlayer]:
+        slot = self._by_id.get(player_id)
+        return None if slot is None else self.players[slot]
+
+    def select(self, status: Optional[str] = None, username: Optional[str] = None, after: Optional[int] = None,
+               limit: Optional[int] = None) -> Page:
+        """Players in slot order, optionally filtered, starting after slot `after`."""
+        n = len(self.players)
+        if username is not None:
+            slots = np.array(self._by_username.get(username, []), dtype=np.int64)
+            if status is not None:
+                slots = slots[self.status[slots] == _STATUS_CODES[status]]
+        elif status is not None:
+            slots = np.flatnonzero(self.status[:n] == _STATUS_CODES[status])
+        else:
+            slots = np.arange(n)
+        if after is not None:
+            slots = slots[np.searchsorted(slots, after, side='right'):]
+        next_after = None
+        if limit is not None and len(slots) > limit:
+            slots = slots[:limit]
+            next_after = int(slots[-1])
+        players = self.players
+        token = hashlib.blake2b(self.epoch + slots.tobytes() + self.version[slots].tobytes(), digest_size=16).digest()
+        return Page([players[i] for i in slots], next_after, token)
+
+    def step(self, new_boards: Callable[[int], List[Board]]) -> np.ndarray:
+        """Advance every game one tick and return the slots of the games that changed.
+
+        Restarted games get fresh boards from `new_boards(count)`, generated as one batch.
+        """
+        start = time.perf_counter()
+        n = len(self.players)
+        status, timer, version = self.status[:n], self.timer[:n], self.version[:n]
+        roll = self.rng.random(n)
+        playing = status == PLAYING
+        restart = ~playing & (roll < P_RESTART)
+        timer[playing] += 1
+        status[playing & (roll < P_LOSE)] = LOST
+        status[playing & (roll >= 1 - P_WIN)] = WON
+        status[restart] = PLAYING
+        timer[restart] = 0
+        self.started_at[:n][restart] = time.time()
+        slots = np.flatnonzero(restart)
+        if len(slots):
+            boards = new_boards(len(slots))
+            for slot, board in zip(slots, boards):
+                self.set_board(slot, board)
+            self.flags_count[slots] = [b.flags_count for b in boards]
+            self.mines_count[slots] = [b.mines_count for b in boards]
+        changed = playing | restart
+        version[changed] += 1
+
+        elapsed = time.perf_counter() - start
+        self.ticks += 1
+        self.last_tick = elapsed
+        self.max_tick = max(self.max_tick, elapsed)
+        self.total_tick += elapsed
+        return np.flatnonzero(changed)
+
+    def stats(self) -> Dict:
+        """Population and tick durations (milliseconds) for monitoring."""
+        status = self.status[:len(self.players)]
+        return {
+            'population': len(self.players),
+            'playing': int(np.count_nonzero(status == PLAYING)),
+            'ticks': int(self.ticks),
+            'tickInterval': SIM_TICK,
+            'lastTickMs': round(self.last_tick * 1000, 3),
+            'avgTickMs': round(self.total_tick / self.ticks * 1000, 3) if self.ticks else 0.0,
+            'maxTickMs': round(self.max_tick * 1000, 3),
+        }
@@ -0,0 +1,434 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from . import mock_db
+from .broadcast import Broadcaster, sse_event
+from .http_cache import PayloadCache
+from .engine import MAX_PAYLOAD_CELLS, PlayerState
+from .simulation import STATUSES, Simulation
+
+# Seconds a stream may stay silent before a keep-alive comment is sent and the
+# client connection is re-checked.
+KEEPALIVE_INTERVAL = 15.0
+KEEPALIVE = b': keep-alive\n\n'
+
+# Number of patches kept for `Last-Event-ID` resume (~5 minutes at one patch per second).
+DELTA_HISTORY = 300
+# Players per `snapshot` event of the delta stream (and `lobby.snapshot` message)
+SNAPSHOT_PAGE = int(os.getenv('SNAPSHOT_PAGE', '1000'))
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, separators=(',', ':'))
+
+
+class Patch(NamedTuple):
+    seq: int
+    data: str     # JSON payload, reused by the WebSocket gateway
+    frame: bytes  # the same payload as an SSE `patch` event
+
+
+class Update(NamedTuple):
+    data: str
+    frame: bytes
+    finished: bool  # the game is over; this is the last update of the stream
+
+
+def snapshot_frame() -> bytes:
+    """Serialize every active player once; the same bytes go to every viewer."""
+    return sse_event(_dumps([p.to_dict() for p in mock_db.get_active_players()]))
+
+
+# Encoded `ActivePlayer` JSON per player (full and summary), keyed by the player's version
+player_payloads = PayloadCache()
+# Encoded `/spectator/active` pages, keyed by the registry page token
+active_payloads = PayloadCache(256)
+
+
+def player_payload(player: PlayerState, summary: bool = False) -> Tuple[bytes, str]:
+    """JSON bytes and ETag of one player; encoded once per version."""
+    key = (player.id, summary)
+    # Versions restart with each simulation (and a resumed game), so the epoch is part of the version
+    version = (getattr(player, 'epoch', None), player.version)
+    cached = player_payloads.get(key, version)
+    if cached is not None:
+        return cached
+    data = player.fields() if summary else player.to_dict()
+    return player_payloads.put(key, version, _dumps(data).encode())
+
+
+def active_payload(page, key: Tuple, summary: bool = False) -> Tuple[bytes, str]:
+    """JSON array of a registry page, assembled from the per-player payloads."""
+    cached = active_payloads.get(key, page.token)
+    if cached is not None:
+        return cached
+    body = b'[' + b','.join(player_payload(p, summary)[0] for p in page.players) + b']'
+    return active_payloads.put(key, page.token, body)
+
+
+def _capture(player: PlayerState) -> Tuple[int, Dict, bytes, Tuple[int, int]]:
+    board = player.board
+    # Boards too large for payloads are not copied either; their patches carry the fields only
+    cells = bytes(board.cells) if len(board) <= MAX_PAYLOAD_CELLS else b''
+    return player.version, player.fields(), cells, (board.rows, board.cols)
+
+
+def _board(board) -> Optional[List]:
+    return board.to_cells() if len(board) <= MAX_PAYLOAD_CELLS else None
+
+
+def _diff(prev, state, player: PlayerState) -> Dict:
+    """Changed scalar fields plus changed cells by flat index (or the whole board)."""
+    change = {k: v for k, v in state[1].items() if prev[1].get(k) != v}
+    board = player.board
+    if prev[3] != state[3]:
+        change['board'] = _board(board)
+    elif prev[2] != state[2]:
+        changed = np.flatnonzero(np.frombuffer(prev[2], np.uint8) != np.frombuffer(state[2], np.uint8))
+        if len(changed) * 2 > len(state[2]):
+            change['board'] = board.to_cells()
+        else:
+            change['cells'] = [[int(i), board.cell(i)] for i in changed]
+    return change
+
+
+# Simulation arrays diffed a tick at a time, and the `ActivePlayer` field each one feeds
+_SIM_COLUMNS = (('status', 'status'), ('timer', 'timer'), ('flags_count', 'flagsCount'),
+                ('mines_count', 'minesCount'), ('started_at', 'startedAt'))
+
+
+class DeltaTracker:
+    """Turns successive player states into sequence-numbered patches.
+
+    Patches carry absolute new values (changed scalar fields, changed cells by flat
+    index), so applying one twice or on top of a newer snapshot is harmless. Event ids
+    are `<epoch>-<seq>`; the epoch changes on restart so stale ids fall back to a
+    snapshot.
+
+    The players of `source` (games played through the API, a few) are compared one by
+    one. Simulated games are only looked at in the slots that ticks reported changed
+    (`on_tick`), and diffed column by column against a copy of the simulation's arrays.
+    The players present at the first `advance` are the baseline, not a patch.
+    """
+
+    def __init__(self, source: Callable[[], List[PlayerState]],
+                 simulation: Optional[Callable[[], Optional[Simulation]]] = None, history: int = DELTA_HISTORY):
+        self._source = source
+        self._simulation = simulation or (lambda: None)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.started = False
+        # player id -> (version, fields, packed cells, board shape) as of the last patch
+        self._prev: Dict[str, Tuple[int, Dict, bytes, Tuple[int, int]]] = {}
+        # The simulation's columns as of the last patch, and the slots ticks changed since
+        self._sim: Optional[Simulation] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._slots: List[np.ndarray] = []
+        self._log: Deque[Patch] = deque(maxlen=history)
+
+    def event_id(self, seq: int) -> str:
+        return f'{self.epoch}-{seq}'
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        epoch, _, seq = (value or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def on_tick(self, sim: Simulation, slots: np.ndarray):
+        """Tick listener (see `mock_db.add_tick_listener`): note the slots to diff next."""
+        if sim is self._sim:
+            self._slots.append(slots)
+
+    def players(self) -> List[PlayerState]:
+        sim = self._simulation()
+        return self._source() + (list(sim.players) if sim is not None else [])
+
+    def _pages(self, size: int) -> Iterator[Tuple[bool, str]]:
+        seq, players = self.seq, self.players()
+        for start in range(0, max(len(players), 1), size):
+            last = start + size >= len(players)
+            page = [p.to_dict() for p in players[start:start + size]]
+            yield last, _dumps({'seq': seq, 'players': page, 'last': last})
+
+    def snapshot_pages(self, size: int = SNAPSHOT_PAGE) -> Iterator[str]:
+        """Every player as of `seq`, `size` at a time, encoded one page at a time; the final
+        page has `last: true`. Players may be newer than `seq`, which patches tolerate."""
+        for _, data in self._pages(size):
+            yield data
+
+    def snapshots(self, size: int = SNAPSHOT_PAGE) -> Iterator[bytes]:
+        """`snapshot_pages` as `snapshot` events. Only the last one carries the event id, so a
+        client cut off mid-snapshot gets a whole new one when it reconnects."""
+        seq = self.seq
+        for last, data in self._pages(size):
+            yield sse_event(data, event='snapshot', id=self.event_id(seq) if last else None)
+
+    def patches_since(self, seq: int) -> Optional[List[Patch]]:
+        """Patches after `seq`, or None when they are no longer in the history."""
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self._log or self._log[0].seq > seq + 1:
+            return None
+        return [patch for patch in self._log if patch.seq > seq]
+
+    def start(self):
+        """Take the current players as the baseline for the first patch (once)."""
+        if self.started:
+            return
+        self.started = True
+        self._prev = {p.id: _capture(p) for p in self._source()}
+        self._watch(self._simulation())
+
+    def _watch(self, sim: Optional[Simulation]):
+        n = len(sim.players) if sim is not None else 0
+        self._sim = sim
+        self._columns = {name: getattr(sim, name)[:n].copy() for name, _ in _SIM_COLUMNS} if sim is not None else {}
+        self._slots = []
+
+    def _sim_changes(self, sim: Simulation) -> Dict[str, Dict]:
+        """Changed fields of the simulated games in the noted slots, a column at a time."""
+        slots = np.unique(np.concatenate(self._slots))
+        self._slots = []
+        slots = slots[slots < len(self._columns['timer'])]
+        changes: List[Dict] = [{} for _ in range(len(slots))]
+        players = sim.players
+        for name, field in _SIM_COLUMNS:
+            prev, now = self._columns[name], getattr(sim, name)[slots]
+            moved = np.flatnonzero(now != prev[slots])
+            prev[slots] = now
+            at = slots[moved].tolist()
+            if name == 'status':
+                values = [STATUSES[code] for code in now[moved].tolist()]
+            elif name == 'started_at':
+                # A game only starts again on a new board
+                values = [players[s].started_at.isoformat() for s in at]
+                for i, s in zip(moved.tolist(), at):
+                    changes[i]['board'] = _board(players[s].board)
+            else:
+                values = now[moved].tolist()
+            for i, value in zip(moved.tolist(), values):
+                changes[i][field] = value
+        return {players[s].id: change for s, change in zip(slots.tolist(), changes) if change}
+
+    def advance(self) -> Optional[Patch]:
+        """Diff the current players against the last patch; None when nothing changed."""
+        if not self.started:
+            self.start()
+            return None
+        updated: Dict[str, Dict] = {}
+        added: List[Dict] = []
+        current = {}
+        for p in self._source():
+            prev = self._prev.get(p.id)
+            if prev is not None and prev[0] == p.version:
+                current[p.id] = prev
+                continue
+            state = current[p.id] = _capture(p)
+            if prev is None:
+                added.append(p.to_dict())
+                continue
+            change = _diff(prev, state, p)
+            if change:
+                updated[p.id] = change
+        removed = [pid for pid in self._prev if pid not in current]
+        self._prev = current
+        sim = self._simulation()
+        if sim is not self._sim:
+            # A new population: the old one leaves and the new one arrives whole
+            if self._sim is not None:
+                removed += [p.id for p in self._sim.players]
+            if sim is not None:
+                added += [p.to_dict() for p in sim.players]
+            self._watch(sim)
+        elif self._slots:
+            updated.update(self._sim_changes(sim))
+        if not (updated or added or removed):
+            return None
+        self.seq += 1
+        patch: Dict = {'seq': self.seq}
+        if updated:
+            patch['updated'] = updated
+        if added:
+            patch['added'] = added
+        if removed:
+            patch['removed'] = removed
+        data = _dumps(patch)
+        entry = Patch(self.seq, data, sse_event(data, event='patch', id=self.event_id(self.seq)))
+        self._log.append(entry)
+        return entry
+
+
+# Queue marker telling a per-player stream it fell behind and must resend a snapshot
+RESYNC = object()
+
+
+class PlayerTopic:
+    """Shared subscription to one player: each change is diffed and encoded once."""
+
+    def __init__(self, player: PlayerState, queue_size: int):
+        self.queue_size = queue_size
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.player = player
+        self._prev = _capture(player)
+
+    def publish(self, player: PlayerState):
+        if player.version == self._prev[0]:
+            return
+        state = _capture(player)
+        change = _diff(self._prev, state, player)
+        self._prev = state
+        if not change:
+            return
+        data = _dumps(change)
+        item = Update(data, sse_event(data, event='update'), player.status != 'playing')
+        for queue in self.subscribers:
+            if queue.full():
+                # Updates are incremental, so a lagging viewer is resynced instead of skipping one
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+            else:
+                queue.put_nowait(item)
+
+
+class PlayerHub:
+    """Per-player topics keyed by id, created on first viewer and dropped after the last."""
+
+    def __init__(self, queue_size: int = 16):
+        self.queue_size = queue_size
+        self._topics: Dict[str, PlayerTopic] = {}
+
+    def subscribe(self, player: PlayerState) -> asyncio.Queue:
+        topic = self._topics.get(player.id)
+        if topic is None:
+            topic = self._topics[player.id] = PlayerTopic(player, self.queue_size)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        topic.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, player_id: str, queue: asyncio.Queue):
+        topic = self._topics.get(player_id)
+        if topic is None:
+            return
+        topic.subscribers.discard(queue)
+        if not topic.subscribers:
+            del self._topics[player_id]
+
+    def viewer_count(self, player_id: str) -> int:
+        topic = self._topics.get(player_id)
+        return len(topic.subscribers) if topic else 0
+
+    def on_change(self, players: Sequence[PlayerState]):
+        if len(self._topics) < len(players):
+            # Few watched games among many changes: only look at the watched ones
+            for topic in list(self._topics.values()):
+                topic.publish(topic.player)
+            return
+        for player in players:
+            topic = self._topics.get(player.id)
+            if topic is not None:
+                topic.publish(player)
+
+
+broadcaster = Broadcaster(snapshot_frame, interval=1.0)
+tracker = DeltaTracker(lambda: mock_db.game_store.visible(), mock_db.get_simulation)
+delta_broadcaster = Broadcaster(tracker.advance, interval=1.0, queue_size=8)
+player_hub = PlayerHub()
+mock_db.add_listener(player_hub.on_change)
+mock_db.add_tick_listener(tracker.on_tick)
+
+
+async def _receive(request, queue: asyncio.Queue):
+    """Yield queued items until the client disconnects; None marks an idle keep-alive."""
+    while True:
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_INTERVAL)
+        except asyncio.TimeoutError:
+            item = None
+        if await request.is_disconnected():
+            return
+        yield item
+
+
+async def full_stream(request):
+    queue = broadcaster.subscribe()
+    try:
+        async for frame in _receive(request, queue):
+            yield KEEPALIVE if frame is None else frame
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+async def delta_stream(request, last_event_id: Optional[str] = None):
+    """One snapshot (or the missed patches after `last_event_id`), then patches."""
+    queue = delta_broadcaster.subscribe()
+    try:
+        # Establish the baseline so the first patch is not a copy of the snapshot
+        tracker.start()
+        last = tracker.parse_event_id(last_event_id)
+        missed = tracker.patches_since(last) if last is not None else None
+        if missed is None:
+            # Patches made while the pages go out follow them
+            last = tracker.seq
+            for frame in tracker.snapshots():
+                yield frame
+        else:
+            for patch in missed:
+                yield patch.frame
+            last = tracker.seq
+        async for item in _receive(request, queue):
+            if item is None:
+                yield KEEPALIVE
+                continue
+            if item.seq <= last:
+                continue
+            if item.seq == last + 1:
+                yield item.frame
+                last = item.seq
+                continue
+            # Frames were dropped from our queue; refill the gap from the history
+            missed = tracker.patches_since(last)
+            if missed is None:
+                last = tracker.seq
+                for frame in tracker.snapshots():
+                    yield frame
+            else:
+                for patch in missed:
+                    yield patch.frame
+                last = tracker.seq
+    finally:
+        delta_broadcaster.unsubscribe(queue)
+
+
+async def player_stream(request, player: PlayerState):
+    """Snapshot of one player, then an `update` per change until the game ends."""
+    queue = player_hub.subscribe(player)
+    try:
+        # Decide before yielding: a change made while we are suspended arrives via the queue
+        finished = player.status != 'playing'
+        yield sse_event(_dumps(player.to_dict()), event='snapshot')
+        if finished:
+            return
+        async for item in _receive(request, queue):
+            if item is None:
+                yield KEEPALIVE
+                continue
+            if item is RESYNC:
+                yield sse_event(_dumps(player.to_dict()), event='snapshot')
+                finished = player.status != 'playing'
+            else:
+                yield item.frame
+                finished = item.finished
+            if finished:
+                return
+    finally:
+        player_hub.unsubscribe(player.id, queue)
@@ -0,0 +1,228 @@
+import json
+import mmap
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .engine import Board
+from .simulation import Simulation
+
+try:  # POSIX only; needed by the shared store for leader election
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Where the simulated games live: 'memory' (this process, one worker) or 'shared'
+# (a shared memory segment used by every `uvicorn --workers` process)
+SPECTATOR_STORE = os.getenv('SPECTATOR_STORE', 'memory')
+# The shared segment: a file on tmpfs (/dev/shm) that every worker maps
+SPECTATOR_SHM_PATH = os.getenv('SPECTATOR_SHM_PATH', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'minesweeper-spectator'))
+# Seconds between checks of the shared tick counter by workers that are not the leader
+SPECTATOR_POLL = float(os.getenv('SPECTATOR_POLL', '0.1'))
+# Seconds a worker waits for the leader to publish the segment before giving up
+SPECTATOR_ATTACH_TIMEOUT = float(os.getenv('SPECTATOR_ATTACH_TIMEOUT', '60'))
+
+_NO_CHANGES = np.empty(0, np.int64)
+
+
+class MemoryStore:
+    """Games held by this process, which also runs the simulation."""
+
+    name = 'memory'
+    leader = True
+
+    def open(self, population: int, players: Callable[[], List[Dict]]) -> Simulation:
+        sim = Simulation(population)
+        for fields in players():
+            sim.add(**fields)
+        return sim
+
+    def try_lead(self) -> bool:
+        return True
+
+    def poll(self, sim: Simulation) -> np.ndarray:
+        return _NO_CHANGES
+
+    def close(self, unlink: bool = False):
+        pass
+
+
+class SharedSimulation(Simulation):
+    """`Simulation` whose arrays and packed boards are views into shared memory.
+
+    Boards keep their identity: a restart copies the new cells into the game's slot,
+    so every process sees the new board through the `Board` it already holds.
+    """
+
+    def __init__(self, capacity: int, buffer, cells: memoryview, rows: int, cols: int):
+        super().__init__(capacity, buffer=buffer)
+        self.rows = rows
+        self.cols = cols
+        self._cells = cells
+
+    def board(self, slot: int) -> Board:
+        size = self.rows * self.cols
+        return Board(self.rows, self.cols, self._cells[slot * size:(slot + 1) * size])
+
+    def add(self, **fields):
+        player = super().add(**fields)
+        board = player.board
+        player.board = self.board(player._slot)
+        self.set_board(player._slot, board)
+        return player
+
+    def set_board(self, slot: int, board: Board):
+        if (board.rows, board.cols) != (self.rows, self.cols):
+            raise ValueError(f'shared boards are {self.rows}x{self.cols}, got {board.rows}x{board.cols}')
+        self.players[slot].board.cells[:] = board.cells
+
+
+# Segment layout: a metadata block, the simulation buffer, packed boards, then the
+# JSON roster of [id, username] per slot (which never changes after creation).
+_MAGIC = 0x4D494E4553  # written last, once the segment is complete
+_META = ('magic', 'population', 'rows', 'cols', 'roster', 'leader_pid')
+_META_BYTES = len(_META) * 8
+
+
+class SharedMemoryStore:
+    """Games in one shared memory segment that every worker maps.
+
+    The worker holding an exclusive `flock` on `<path>.lock` is the leader: it creates
+    the segment and steps the simulation in place. The others map the same arrays
+    and boards and poll the tick counter, so each notifies its own SSE and WebSocket
+    spectators of the same changed games. When the leader exits, its lock is released
+    and the next worker to poll takes over stepping the same games.
+    """
+
+    name = 'shared'
+
+    def __init__(self, path: str = SPECTATOR_SHM_PATH, attach_timeout: float = SPECTATOR_ATTACH_TIMEOUT):
+        if fcntl is None:
+            raise RuntimeError('SPECTATOR_STORE=shared needs a POSIX system')
+        self.path = path
+        self.attach_timeout = attach_timeout
+        self.leader = False
+        self._lock = open(f'{path}.lock', 'a+b')
+        self._buf: Optional[memoryview] = None
+        self._seen_tick = 0.0
+        self._seen: Optional[np.ndarray] = None
+
+    def try_lead(self) -> bool:
+        """Become the leader if no other worker is; True when this worker leads."""
+        if not self.leader:
+            try:
+                fcntl.flock(self._lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.leader = True
+            if self._buf is not None:
+                self._meta()[_META.index('leader_pid')] = os.getpid()
+        return True
+
+    def open(self, population: int, players: Callable[[], List[Dict]]) -> Simulation:
+        if self.try_lead():
+            sim = self._attach(population, wait=False)
+            # A previous leader's segment is taken over; anything else is replaced
+            return sim if sim is not None else self._create(players())
+        sim = self._attach(None, wait=True)
+        if sim is None:
+            raise RuntimeError(f'No spectator segment at {self.path} after {self.attach_timeout}s')
+        return sim
+
+    def poll(self, sim: Simulation) -> np.ndarray:
+        """Slots whose version moved since the last poll, once the leader has ticked."""
+        ticks = sim.ticks
+        if ticks == self._seen_tick:
+            return _NO_CHANGES
+        self._seen_tick = ticks
+        version = sim.version[:len(sim.players)]
+        changed = np.flatnonzero(version != self._seen)
+        self._seen = version.copy()
+        return changed
+
+    def close(self, unlink: bool = False):
+        if unlink and os.path.exists(self.path):
+            os.unlink(self.path)
+        if self.leader:
+            fcntl.flock(self._lock.fileno(), fcntl.LOCK_UN)
+            self.leader = False
+        self._lock.close()
+
+    def _meta(self) -> np.ndarray:
+        return np.ndarray(len(_META), np.int64, self._buf, 0)
+
+    def _map(self, f) -> memoryview:
+        return memoryview(mmap.mmap(f.fileno(), 0))
+
+    def _simulation(self, population: int, rows: int, cols: int) -> SharedSimulation:
+        buf = self._buf
+        start = _META_BYTES
+        end = start + Simulation.nbytes(population)
+        return SharedSimulation(population, buf[start:end], buf[end:end + population * rows * cols], rows, cols)
+
+    def _create(self, players: List[Dict]) -> SharedSimulation:
+        population = len(players)
+        rows, cols = (players[0]['board'].rows, players[0]['board'].cols) if players else (0, 0)
+        roster = json.dumps([[p['id'], p['username']] for p in players]).encode()
+        boards = _META_BYTES + Simulation.nbytes(population)
+        size = boards + population * rows * cols + len(roster)
+        # Built under a temporary name and renamed into place, so workers only ever map a
+        # complete segment; ones still mapping a replaced segment keep their own copy
+        tmp = f'{self.path}.{os.getpid()}'
+        with open(tmp, 'w+b') as f:
+            f.truncate(size)
+            self._buf = self._map(f)
+        sim = self._simulation(population, rows, cols)
+        sim.new_epoch()
+        for fields in players:
+            sim.add(**fields)
+        start = boards + population * rows * cols
+        self._buf[start:start + len(roster)] = roster
+        meta = self._meta()
+        meta[1:] = population, rows, cols, len(roster), os.getpid()
+        meta[0] = _MAGIC
+        os.replace(tmp, self.path)
+        return sim
+
+    def _attach(self, population: Optional[int], wait: bool) -> Optional[SharedSimulation]:
+        """Map the published segment; None if there is none (after `attach_timeout` when
+        waiting) or, when `population` is given, if it holds a different population."""
+        deadline = time.monotonic() + (self.attach_timeout if wait else 0)
+        while True:
+            try:
+                with open(self.path, 'r+b') as f:
+                    if os.fstat(f.fileno()).st_size >= _META_BYTES:
+                        self._buf = self._map(f)
+                        if self._meta()[0] == _MAGIC:
+                            break
+            except FileNotFoundError:
+                pass
+            self._buf = None
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.05)
+        _, count, rows, cols, roster_len, _ = self._meta().tolist()
+        if population is not None and count != population:
+            self._buf = None
+            return None
+        sim = self._simulation(count, rows, cols)
+        start = _META_BYTES + Simulation.nbytes(count) + count * rows * cols
+        for slot, (player_id, username) in enumerate(json.loads(bytes(self._buf[start:start + roster_len]))):
+            sim.attach(player_id, username, sim.board(slot))
+        if self.leader:
+            self._meta()[_META.index('leader_pid')] = os.getpid()
+        self._seen_tick = sim.ticks
+        self._seen = sim.version[:count].copy()
+        return sim
+
+
+def open_store(kind: str = SPECTATOR_STORE):
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'shared':
+        return SharedMemoryStore()
+    raise ValueError(f'Unknown SPECTATOR_STORE {kind!r}, expected memory or shared')
@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+from typing import Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from . import mock_db, spectator
+from .engine import PlayerState
+
+MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', '1000'))
+MAX_SUBSCRIPTIONS = int(os.getenv('WS_MAX_SUBSCRIPTIONS', '100'))
+# Messages queued for one socket before it is considered too slow and closed
+SEND_BUFFER = int(os.getenv('WS_SEND_BUFFER', '256'))
+PING_INTERVAL = float(os.getenv('WS_PING_INTERVAL', '20'))
+# A socket that sends nothing (not even a pong) for this long is closed
+PING_TIMEOUT = float(os.getenv('WS_PING_TIMEOUT', '60'))
+
+# Close codes (RFC 6455 / IANA registry)
+CLOSE_TRY_AGAIN_LATER = 1013
+CLOSE_POLICY_VIOLATION = 1008
+
+_OVERFLOW = object()
+
+
+def _message(type: str, data: Optional[str] = None, **fields) -> str:
+    """Build an outgoing message around an already-encoded JSON `data` payload."""
+    head = json.dumps({'type': type, **fields}, separators=(',', ':'))
+    if data is None:
+        return head
+    return head[:-1] + ',"data":' + data + '}'
+
+
+class SpectatorConnection:
+    """One multiplexed spectator socket.
+
+    Client messages are JSON objects: `{"op": "subscribe"|"unsubscribe", "player": id}`,
+    `{"op": "subscribe"|"unsubscribe", "channel": "lobby"}` and `{"op": "ping"|"pong"}`.
+    Every subscription runs as a forwarder task that writes into one bounded send buffer.
+    """
+
+    def __init__(self, websocket: WebSocket, send_buffer: int = SEND_BUFFER):
+        self.ws = websocket
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=send_buffer)
+        self.players: Dict[str, asyncio.Task] = {}
+        self.lobby: Optional[asyncio.Task] = None
+        self.last_seen = 0.0
+
+    def send(self, text: str):
+        try:
+            self.outbox.put_nowait(text)
+        except asyncio.QueueFull:
+            # The client is not reading fast enough: drop what is queued and close
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+            self.outbox.put_nowait(_OVERFLOW)
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        self.last_seen = loop.time()
+        tasks = [
+            loop.create_task(self._reader()),
+            loop.create_task(self._writer()),
+            loop.create_task(self._pinger()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks + list(self.players.values()) + ([self.lobby] if self.lobby else []):
+                task.cancel()
+
+    async def _reader(self):
+        try:
+            while True:
+                text = await self.ws.receive_text()
+                self.last_seen = asyncio.get_event_loop().time()
+                self._handle(text)
+        except WebSocketDisconnect:
+            pass
+
+    async def _writer(self):
+        while True:
+            text = await self.outbox.get()
+            if text is _OVERFLOW:
+                await self.ws.close(code=CLOSE_TRY_AGAIN_LATER)
+                return
+            await self.ws.send_text(text)
+
+    async def _pinger(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            if loop.time() - self.last_seen > PING_TIMEOUT:
+                await self.ws.close(code=CLOSE_POLICY_VIOLATION)
+                return
+            self.send(_message('ping'))
+
+    def _handle(self, text: str):
+        try:
+            msg = json.loads(text)
+            op = msg['op']
+        except (ValueError, TypeError, KeyError):
+            self.send(_message('error', error='Invalid message'))
+            return
+        if op == 'ping':
+            self.send(_message('pong'))
+        elif op == 'pong':
+            pass
+        elif op in ('subscribe', 'unsubscribe') and msg.get('channel') == 'lobby':
+            self._lobby(op == 'subscribe')
+        elif op in ('subscribe', 'unsubscribe') and isinstance(msg.get('player'), str):
+            self._player(msg['player'], op == 'subscribe')
+        else:
+            self.send(_message('error', error='Unknown operation'))
+
+    def _lobby(self, subscribe: bool):
+        if subscribe and self.lobby is None:
+            self.lobby = asyncio.get_event_loop().create_task(self._forward_lobby())
+        elif not subscribe and self.lobby is not None:
+            self.lobby.cancel()
+            self.lobby = None
+
+    def _player(self, player_id: str, subscribe: bool):
+        if not subscribe:
+            task = self.players.pop(player_id, None)
+            if task:
+                task.cancel()
+            return
+        if player_id in self.players:
+            return
+        if len(self.players) >= MAX_SUBSCRIPTIONS:
+            self.send(_message('error', error='Too many subscriptions', player=player_id))
+            return
+        player = mock_db.find_player(player_id)
+        if player is None:
+            self.send(_message('error', error='Player not found', player=player_id))
+            return
+        self.players[player_id] = asyncio.get_event_loop().create_task(self._forward_player(player))
+
+    async def _forward_player(self, player: PlayerState):
+        queue = spectator.player_hub.subscribe(player)
+        try:
+            finished = player.status != 'playing'
+            self.send(_message('snapshot', json.dumps(player.to_dict(), separators=(',', ':')), player=player.id))
+            while not finished:
+                item = await queue.get()
+                if item is spectator.RESYNC:
+                    finished = player.status != 'playing'
+                    self.send(_message('snapshot', json.dumps(player.to_dict(), separators=(',', ':')),
+                                       player=player.id))
+                else:
+                    finished = item.finished
+                    self.send(_message('update', item.data, player=player.id))
+            self.send(_message('end', player=player.id))
+            self.players.pop(player.id, None)
+        finally:
+            spectator.player_hub.unsubscribe(player.id, queue)
+
+    async def _forward_lobby(self):
+        tracker = spectator.tracker
+        queue = spectator.delta_broadcaster.subscribe()
+        try:
+            tracker.start()
+            last = tracker.seq
+            await self._send_snapshot(tracker)
+            while True:
+                patch = await queue.get()
+                if patch.seq <= last:
+                    continue
+                missed = [patch] if patch.seq == last + 1 else tracker.patches_since(last)
+                if missed is None:
+                    last = tracker.seq
+                    await self._send_snapshot(tracker)
+                else:
+                    for p in missed:
+                        self.send(_message('lobby.patch', p.data))
+                    last = max(last, missed[-1].seq)
+        finally:
+            spectator.delta_broadcaster.unsubscribe(queue)
+
+    async def _send_snapshot(self, tracker: spectator.DeltaTracker):
+        # Pages wait for room in the send buffer rather than overflowing it
+        for data in tracker.snapshot_pages():
+            await self.outbox.put(_message('lobby.snapshot', data))
+
+
+class SpectatorGateway:
+    """Accepts spectator sockets up to a global connection cap."""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS):
+        self.max_connections = max_connections
+        self.connections = 0
+
+    async def serve(self, websocket: WebSocket):
+        await websocket.accept()
+        if self.connections >= self.max_connections:
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+            return
+        self.connections += 1
+        try:
+            await SpectatorConnection(websocket).run()
+        finally:
+            self.connections -= 1
+
+
+gateway = SpectatorGateway()
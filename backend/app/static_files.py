@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Response
+from fastapi.responses import FileResponse
+
+from .compression import compressible
+from .http_cache import accepted_encodings, encoded_etag, etag_matches
+
+try:  # optional: brotli variants are also picked up from `.br` files written by the build
+    import brotli
+except ImportError:
+    brotli = None
+
+FRONTEND_DIST = os.getenv('FRONTEND_DIST', '/app/frontend_dist')
+# Files up to this size (bytes) are held in memory, larger ones are streamed from disk
+STATIC_MEMORY_MAX = int(os.getenv('STATIC_MEMORY_MAX', str(512 * 1024)))
+
+# Vite emits content-hashed names such as `assets/index-B3xK9a_Q.js`; those never change
+_HASHED = re.compile(r'(^|/)assets/.+-[A-Za-z0-9_-]{8}\.\w+$')
+_MIN_COMPRESS = 256
+_IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class Variant(NamedTuple):
+    size: int
+    body: Optional[bytes]  # None: served from `path`
+    path: Optional[str]
+
+
+class StaticFile(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    etag: str  # of the identity variant; see `encoded_etag` for the others
+    content_type: str
+    immutable: bool
+    variants: Dict[str, Variant]  # content-coding ('identity', 'br', 'gzip') -> body
+
+
+def _load(name: str, full: str) -> StaticFile:
+    stat = os.stat(full)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    with open(full, 'rb') as f:
+        raw = f.read()
+    small = len(raw) <= STATIC_MEMORY_MAX
+    variants = {'identity': Variant(len(raw), raw if small else None, None if small else full)}
+    if compressible(content_type) and len(raw) >= _MIN_COMPRESS:
+        encoders = {'br': brotli.compress if brotli else None, 'gzip': lambda b: gzip.compress(b, 9, mtime=0)}
+        for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.isfile(full + suffix):
+                # Precompressed by the build; held in memory on the same terms as the original
+                size = os.path.getsize(full + suffix)
+                body = None
+                if size <= STATIC_MEMORY_MAX:
+                    with open(full + suffix, 'rb') as f:
+                        body = f.read()
+                variants[coding] = Variant(size, body, None if body is not None else full + suffix)
+            elif encoders[coding] and small:
+                body = encoders[coding](raw)
+                if len(body) < len(raw):
+                    variants[coding] = Variant(len(body), body, None)
+    etag = '"' + hashlib.blake2b(raw, digest_size=16).hexdigest() + '"'
+    return StaticFile(name, len(raw), stat.st_mtime, etag, content_type, bool(_HASHED.search(name)), variants)
+
+
+class StaticSite:
+    """In-memory manifest of a built frontend, scanned once.
+
+    Every file is looked up by its path in a dict, so serving does no filesystem
+    checks; small files and their gzip/brotli variants are kept in memory and
+    unknown paths fall back to `index.html` for client-side routing.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.files: Dict[str, StaticFile] = {}
+        for directory, _, names in os.walk(root):
+            for filename in names:
+                full = os.path.join(directory, filename)
+                name = os.path.relpath(full, root).replace(os.sep, '/')
+                if name.endswith(('.br', '.gz')) and os.path.isfile(full[:-3]):
+                    continue  # a precompressed variant, attached to its original
+                self.files[name] = _load(name, full)
+        self.index = self.files.get('index.html')
+
+    def stats(self) -> Dict:
+        variants = [v for f in self.files.values() for v in f.variants.values()]
+        return {'files': len(self.files),
+                'memoryBytes': sum(v.size for v in variants if v.body is not None),
+                'compressed': sum(len(f.variants) > 1 for f in self.files.values())}
+
+    def lookup(self, path: str) -> Optional[StaticFile]:
+        return self.files.get(path.lstrip('/')) or self.index
+
+    def serve(self, path: str, accept_encoding: Optional[str] = None,
+              if_none_match: Optional[str] = None) -> Response:
+        entry = self.lookup(path)
+        if entry is None:
+            return Response(status_code=404)
+        accepted = accepted_encodings(accept_encoding)
+        coding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in entry.variants and accepted.get(candidate, accepted.get('*', 0)) > 0:
+                coding = candidate
+                break
+        headers = {
+            'ETag': encoded_etag(entry.etag, coding),
+            'Last-Modified': formatdate(entry.mtime, usegmt=True),
+            'Cache-Control': _IMMUTABLE if entry.immutable else 'no-cache',
+        }
+        if len(entry.variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if etag_matches(if_none_match, entry.etag):
+            return Response(status_code=304, headers=headers)
+
+        variant = entry.variants[coding]
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        if variant.body is not None:
+            return Response(variant.body, media_type=entry.content_type, headers=headers)
+        return FileResponse(variant.path, media_type=entry.content_type, headers=headers)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .engine import DIFFICULTY_PRESETS, MINE, generate_preset
+from .pagination import decode_cursor, encode_cursor
+from .replay import ACTIONS, FLAG, REVEAL, ReplayWriter
+
+# Processes replaying submitted games; a replay is pure Python, so threads would share one GIL
+SCORE_VERIFY_WORKERS = int(os.getenv('SCORE_VERIFY_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Verifications allowed to wait for a worker before new ones are rejected
+SCORE_VERIFY_QUEUE = int(os.getenv('SCORE_VERIFY_QUEUE', '256'))
+# Signs seed tickets; give every worker the same value, or each process signs with its own random key
+SEED_TICKET_SECRET = os.getenv('SEED_TICKET_SECRET') or secrets.token_hex(32)
+
+
+def score_time(ms: int) -> int:
+    """Leaderboard time of a game lasting `ms`: whole seconds, rounded up."""
+    return -(-ms // 1000)
+
+
+class SeedTicket(NamedTuple):
+    """A board seed the server issued for a game played client-side."""
+    id: str              # leaderboard entry id the win is entered under, so a ticket is used once
+    username: str
+    difficulty: str
+    seed: int
+    issued_at: datetime  # the game's start, by the server's clock
+
+
+def _sign(payload: str) -> str:
+    return hashlib.blake2b(payload.encode(), key=SEED_TICKET_SECRET.encode(), digest_size=16).hexdigest()
+
+
+def issue_ticket(username: str, difficulty: str, now: Optional[datetime] = None) -> Tuple[SeedTicket, str]:
+    """A new seed ticket and its signed token, for `replay.ticket` when the game is submitted."""
+    ticket = SeedTicket(str(uuid.uuid4()), username, difficulty, secrets.randbits(63), now or datetime.utcnow())
+    payload = encode_cursor(*ticket)
+    return ticket, f'{payload}.{_sign(payload)}'
+
+
+def open_ticket(token: str) -> SeedTicket:
+    """The ticket of a token from `issue_ticket`; ValueError if this server did not sign it."""
+    payload, _, signature = token.partition('.')
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError('the seed ticket was not issued by this server')
+    return SeedTicket(*decode_cursor(payload, str, str, str, int, datetime))
+
+
+def replay_game(difficulty: str, seed: int, moves: Sequence[Tuple[int, int, int]]) -> ReplayWriter:
+    """Replay a submitted game and return its encoded log if it is a win on the `difficulty`
+    board of `seed` (with the first reveal as the safe first click).
+
+    `moves` are `(cell, action, t)`. Raises ValueError when the moves do not win.
+    CPU-bound: run it in the pool.
+    """
+    preset = DIFFICULTY_PRESETS[difficulty]
+    first = next((cell for cell, action, _ in moves if action == REVEAL), None)
+    if first is None or not 0 <= first < preset.rows * preset.cols:
+        raise ValueError('the game has no reveal on the board')
+    writer = ReplayWriter(generate_preset(difficulty, divmod(first, preset.cols), seed), seed=seed)
+    safe_left = preset.rows * preset.cols - preset.mines
+    for cell, action, t in moves:
+        if safe_left == 0:
+            raise ValueError(f'move {writer.moves}: the game was already won')
+        changed = writer.append(cell, action, t)
+        if action == FLAG:
+            continue
+        if any(writer.board.cells[i] & MINE for i in changed):
+            raise ValueError(f'move {writer.moves - 1}: a mine was revealed')
+        safe_left -= len(changed)
+    if safe_left:
+        raise ValueError(f'the game is not won ({safe_left} safe cells left)')
+    return writer
+
+
+class VerifiedScore(NamedTuple):
+    """A verified win, ready for `mock_db.submit_score(s)`."""
+    id: str
+    username: str
+    difficulty: str
+    time: int            # seconds from the ticket's issue to the submission, by the server's clock
+    writer: ReplayWriter
+
+
+class VerifierBusy(Exception):
+    """More verifications are waiting than `SCORE_VERIFY_QUEUE` allows."""
+
+
+class ScoreVerifier:
+    """Replays submitted games on a bounded process pool, off the event loop.
+
+    Like `passwords.PasswordHasher`: at most `workers` replays run at once and
+    `max_queue` more may wait; beyond that calls fail fast with `VerifierBusy`.
+    """
+
+    def __init__(self, workers: int = SCORE_VERIFY_WORKERS, max_queue: int = SCORE_VERIFY_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight = 0
+        self.verified = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def verify(self, username: str, difficulty: str, upload) -> VerifiedScore:
+        """Check a `schemas.ReplayUpload` against its seed ticket and replay it.
+
+        The ticket must be this server's, for `username` and `difficulty`. The moves must win
+        (see `replay_game`) within the time since the ticket was issued, and that time, not
+        the moves', is the score. Raises ValueError otherwise.
+        """
+        finished = datetime.utcnow()
+        if self.in_flight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise VerifierBusy('Too many scores being verified, try again shortly')
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        moves = [(m.cell, ACTIONS.index(m.action), m.t) for m in upload.moves]
+        self.in_flight += 1
+        try:
+            ticket = open_ticket(upload.ticket)
+            if (ticket.username, ticket.difficulty) != (username, difficulty):
+                raise ValueError('the seed ticket was issued for another player or difficulty')
+            elapsed = int((finished - ticket.issued_at).total_seconds() * 1000)
+            writer = await asyncio.get_event_loop().run_in_executor(
+                self._executor, replay_game, difficulty, ticket.seed, moves)
+            if writer.t > elapsed:
+                raise ValueError('the moves take longer than the time since the seed was issued')
+        except ValueError:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.verified += 1
+        return VerifiedScore(ticket.id, username, difficulty, score_time(elapsed), writer)
+
+    async def verify_many(self, items: Sequence[Tuple[str, str, object]], concurrency: Optional[int] = None) -> List:
+        """Verify `(username, difficulty, upload)` triples on at most `concurrency` workers, by
+        default half the pool, so single submissions keep the rest of it. Each result is the
+        `VerifiedScore` or the exception its verification raised."""
+        limit = asyncio.Semaphore(concurrency or max(1, self.workers // 2))
+
+        async def one(username: str, difficulty: str, upload) -> VerifiedScore:
+            async with limit:
+                return await self.verify(username, difficulty, upload)
+
+        return list(await asyncio.gather(*(one(*item) for item in items), return_exceptions=True))
+
+    def stats(self) -> Dict:
+        return {'workers': self.workers, 'in_flight': self.in_flight, 'verified': self.verified,
+                'failed': self.failed, 'rejected': self.rejected}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+score_verifier = ScoreVerifier()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+# Ensure project root is on sys.path so `import backend` works even if pytest cwd differs
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from backend.app.database import Base
+
+
+@pytest_asyncio.fixture
+async def engine():
+    """A fresh in-memory database with the tables created; its sessions all share one connection."""
+    engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture
+async def db(session_factory):
+    session = session_factory()
+    yield session
+    await session.close()
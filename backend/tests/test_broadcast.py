@@ -0,0 +1,42 @@
+import pytest
+
+from backend.app.broadcast import Broadcaster, sse_event
+
+
+def test_sse_event_encoding():
+    assert sse_event('x') == b'data: x\n\n'
+    assert sse_event(b'{}', event='patch', id=3) == b'id: 3\nevent: patch\ndata: {}\n\n'
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_serializes_once_per_tick():
+    calls = []
+
+    def produce():
+        calls.append(1)
+        return sse_event(str(len(calls)))
+
+    b = Broadcaster(produce, interval=0.01)
+    queues = [b.subscribe() for _ in range(50)]
+    frames = [await q.get() for q in queues]
+    b.stop()
+
+    # Every subscriber received the very same bytes object from a single produce call
+    assert all(f is frames[0] for f in frames)
+    assert len(calls) <= 2
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_coalesces_to_latest():
+    b = Broadcaster(lambda: b'', queue_size=2)
+    q = b.subscribe()
+    b.stop()
+    for i in range(5):
+        b.publish(sse_event(str(i)))
+
+    assert q.qsize() == 2
+    assert b.frames_dropped == 3
+    assert [q.get_nowait(), q.get_nowait()] == [sse_event('3'), sse_event('4')]
+
+    b.unsubscribe(q)
+    assert b.subscriber_count == 0
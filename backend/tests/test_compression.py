@@ -0,0 +1,92 @@
+import json
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+from backend.app import mock_db
+from backend.app.broadcast import sse_event
+from backend.app.compression import CompressionMiddleware, StreamCompressor, negotiate
+from backend.app.engine import generate_boards
+from backend.app.http_cache import etag_matches
+from backend.app.simulation import Simulation
+
+
+def _frame(players):
+    return sse_event(json.dumps(players))
+
+
+def test_negotiate():
+    assert negotiate('gzip, deflate, br') == 'gzip'
+    assert negotiate('deflate, gzip;q=0') == 'deflate'
+    assert negotiate('*') == 'gzip'
+    assert negotiate('identity') is None and negotiate(None) is None
+
+
+def test_frames_compress_against_earlier_ones():
+    boards = generate_boards(4, 9, 9, 10, seed=1)
+    compressor = StreamCompressor('gzip')
+    decoder = zlib.decompressobj(31)
+    for tick in range(5):
+        frame = _frame([{'id': f'p{i}', 'timer': tick, 'board': b.to_cells()} for i, b in enumerate(boards)])
+        out = compressor.compress(frame)
+        # Every frame is decodable on its own arrival
+        assert decoder.decompress(out) == frame
+    # The last tick costs less than the same frame compressed on its own
+    assert len(out) < len(zlib.compress(frame, 6))
+    assert compressor.bytes_out < compressor.bytes_in / 20
+    decoder.decompress(compressor.finish())
+    assert decoder.eof
+
+
+@pytest.mark.asyncio
+async def test_middleware_skips_event_streams_and_small_bodies():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get('/big')
+    async def big(request: Request):
+        if etag_matches(request.headers.get('if-none-match'), '"v1"'):
+            return Response(status_code=304, headers={'ETag': '"v1"'})
+        return JSONResponse([{'isMine': False, 'isRevealed': False}] * 100, headers={'ETag': '"v1"'})
+
+    @app.get('/small')
+    async def small():
+        return PlainTextResponse('ok')
+
+    @app.get('/events')
+    async def events():
+        async def frames():
+            yield b'data: ' + b'x' * 500 + b'\n\n'
+        return StreamingResponse(frames(), media_type='text/event-stream')
+
+    async with httpx.AsyncClient(app=app, base_url='http://test', headers={'Accept-Encoding': 'gzip'}) as client:
+        r = await client.get('/big')
+        assert r.headers['content-encoding'] == 'gzip' and len(r.json()) == 100
+        # The gzipped bytes get their own ETag, kept on a 304 that revalidates them
+        assert r.headers['etag'] == '"v1-gzip"' and r.headers['vary'] == 'Accept-Encoding'
+        assert (await client.get('/big', headers={'Accept-Encoding': 'identity'})).headers['etag'] == '"v1"'
+        r = await client.get('/big', headers={'If-None-Match': '"v1-gzip"'})
+        assert r.status_code == 304 and r.headers['etag'] == '"v1-gzip"'
+        assert 'content-encoding' not in (await client.get('/small')).headers
+        r = await client.get('/events')
+        assert 'content-encoding' not in r.headers and r.text.startswith('data: xxx')
+
+
+@pytest.mark.asyncio
+async def test_player_stream_is_compressed_when_accepted(monkeypatch):
+    from backend.app.main import app
+
+    sim = Simulation(1)
+    sim.add(id='p0', username='u0', board=generate_boards(1, 9, 9, 10, seed=0)[0], status='won')
+    monkeypatch.setattr(mock_db, '_simulation', sim)
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        # A finished game: the stream is one snapshot and ends
+        r = await client.get('/api/spectator/p0/stream', headers={'Accept-Encoding': 'gzip'})
+        assert r.headers['content-encoding'] == 'gzip' and r.headers['vary'] == 'Accept-Encoding'
+        assert r.text.startswith('event: snapshot\ndata: {"id":"p0"')
+        r = await client.get('/api/spectator/p0/stream', headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in r.headers and r.text.startswith('event: snapshot')
+    mock_db.stop_simulation()
@@ -0,0 +1,166 @@
+import pytest
+
+from backend.app.engine import Board, PlayerState
+
+
+def test_board_packs_cell_state():
+    board = Board(2, 3)
+    board.set_cell(0, 1, mine=True, flagged=True)
+    board.set_cell(1, 2, revealed=True, neighbor_mines=8)
+
+    assert len(board.cells) == 6
+    assert board.is_mine(0, 1) and board.is_flagged(0, 1)
+    assert board.is_revealed(1, 2) and board.neighbor_mines(1, 2) == 8
+    assert board.mines_count == 1
+    assert board.flags_count == 1
+
+
+def test_board_round_trips_cell_shape():
+    board = Board(2, 2)
+    board.set_cell(1, 0, revealed=True, neighbor_mines=3)
+    cells = board.to_cells()
+
+    assert cells[1][0] == {'isMine': False, 'isRevealed': True, 'isFlagged': False, 'neighborMines': 3}
+    assert len(cells) == 2 and len(cells[0]) == 2
+    assert Board.from_cells(cells) == board
+
+    # to_cells hands out fresh dicts, so callers may mutate them freely
+    cells[1][0]['isMine'] = True
+    assert board.to_cells()[1][0]['isMine'] is False
+
+
+def test_player_state_to_dict_matches_active_player():
+    from backend.app.schemas import ActivePlayer
+
+    player = PlayerState(id='p1', username='alice', board=Board(9, 9), mines_count=10)
+    parsed = ActivePlayer(**player.to_dict())
+
+    assert parsed.username == 'alice'
+    assert len(parsed.board) == 9 and len(parsed.board[0]) == 9
+
+
+def _brute_counts(board):
+    counts = []
+    for r in range(board.rows):
+        for c in range(board.cols):
+            counts.append(sum(
+                board.is_mine(rr, cc)
+                for rr in range(max(r - 1, 0), min(r + 2, board.rows))
+                for cc in range(max(c - 1, 0), min(c + 2, board.cols))
+                if (rr, cc) != (r, c)
+            ))
+    return counts
+
+
+def test_generate_board_counts_and_first_click():
+    from backend.app.engine import generate_board
+
+    board = generate_board(12, 17, 60, first_click=(5, 7), seed=42)
+    assert board.mines_count == 60
+    assert not board.is_mine(5, 7)
+    assert [board.neighbor_mines(r, c) for r in range(12) for c in range(17)] == _brute_counts(board)
+    # Same seed reproduces the same board
+    assert generate_board(12, 17, 60, first_click=(5, 7), seed=42) == board
+
+
+def test_seeded_boards_travel_as_seeds():
+    import random
+
+    from backend.app.engine import generate_board, seeded_board, seeded_mines
+
+    mines = seeded_mines(99, 16, 30, 99, first_click=(3, 4))
+    assert len(set(mines)) == 99 and 3 * 30 + 4 not in mines
+    # One sample over the cell indices; the first click only ever moves the mine under it
+    layout = random.Random(99).sample(range(480), 99)
+    assert seeded_mines(99, 16, 30, 99) == layout
+    clicked = layout[0]
+    moved = seeded_mines(99, 16, 30, 99, first_click=divmod(clicked, 30))
+    assert moved[1:] == layout[1:] and moved[0] == min(set(range(480)) - set(layout))
+
+    board = seeded_board(99, 16, 30, 99, (3, 4))
+    assert sorted(i for i in range(len(board)) if board.cells[i] & 1) == sorted(mines)
+    assert generate_board(16, 30, 99, first_click=(3, 4), seed=99) == board
+    other = seeded_board(99, 16, 30, 99, divmod(clicked, 30))
+    assert not other.is_mine(*divmod(clicked, 30))
+    assert [other.neighbor_mines(r, c) for r in range(16) for c in range(30)] == _brute_counts(other)
+    # Boards come from the cache as copies
+    board.reveal(3, 4)
+    assert seeded_board(99, 16, 30, 99, (3, 4)) != board
+    assert seeded_board(100, 16, 30, 99, (3, 4)) != seeded_board(99, 16, 30, 99, (3, 4))
+
+
+def test_generate_boards_batch():
+    from backend.app.engine import generate_boards
+
+    boards = generate_boards(25, 8, 11, 20, seed=3, chunk=10)
+    assert len(boards) == 25 and len({bytes(b.cells) for b in boards}) == 25
+    for board in boards:
+        assert board.mines_count == 20
+        assert [board.neighbor_mines(r, c) for r in range(8) for c in range(11)] == _brute_counts(board)
+    assert all(b.mines_count == 0 for b in generate_boards(2, 3, 3, 0))
+
+
+def test_generate_board_rejects_bad_sizes():
+    from backend.app.engine import generate_board, MAX_ROWS
+
+    with pytest.raises(ValueError):
+        generate_board(MAX_ROWS + 1, 10, 5)
+    with pytest.raises(ValueError):
+        generate_board(3, 3, 9)
+
+
+def test_reveal_flood_fill_opens_region_only():
+    from backend.app.engine import generate_board
+
+    board = generate_board(30, 40, 120, first_click=(0, 0), seed=7)
+    board.toggle_flag(29, 39)
+    opened = set(board.reveal(0, 0))
+
+    # Reference: a naive BFS over the same board
+    expected, frontier = set(), [(0, 0)]
+    while frontier:
+        r, c = frontier.pop()
+        i = r * board.cols + c
+        if i in expected or board.is_mine(r, c) or (r, c) == (29, 39):
+            continue
+        expected.add(i)
+        if board.neighbor_mines(r, c) == 0:
+            frontier.extend(
+                (rr, cc)
+                for rr in range(max(r - 1, 0), min(r + 2, board.rows))
+                for cc in range(max(c - 1, 0), min(c + 2, board.cols))
+            )
+    assert opened == expected
+    assert all(board.cells[i] & 0x02 for i in opened)
+    assert board.reveal(0, 0) == []
+
+
+def test_chord_reveals_around_satisfied_number():
+    from backend.app.engine import board_from_mines
+
+    # Mines at (0, 0) and (2, 2) on a 3x4 board; (1, 1) touches both
+    board = board_from_mines(3, 4, [0, 10])
+    assert board.neighbor_mines(1, 1) == 2 and board.is_mine(2, 2)
+    assert board.chord(1, 1) == []  # not revealed yet
+    board.reveal(1, 1)
+    board.toggle_flag(0, 0)
+    assert board.chord(1, 1) == []  # one flag for two mines
+    board.toggle_flag(2, 2)
+    opened = set(board.chord(1, 1))
+    assert {1, 2, 4, 6, 8, 9} <= opened and not opened & {0, 10}
+    assert not board.is_revealed(0, 0) and not board.is_revealed(2, 2)
+
+
+def test_reveal_huge_empty_board_does_not_recurse():
+    from backend.app.engine import generate_board
+
+    board = generate_board(400, 400, 0)
+    assert len(board.reveal(200, 200)) == 400 * 400
+
+
+def test_difficulty_presets_match_schema():
+    from typing import get_args
+    from backend.app.engine import DIFFICULTY_PRESETS
+    from backend.app.schemas import Difficulty
+
+    assert get_args(Difficulty) == tuple(DIFFICULTY_PRESETS)
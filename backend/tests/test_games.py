@@ -0,0 +1,301 @@
+import json
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import update
+
+from backend.app import games, mock_db, spectator
+from backend.app.database import Game as DBGame, GameReplay as DBReplay, LeaderboardEntry as DBEntry, get_async_db
+from backend.app.engine import FLAGGED, MINE, REVEALED
+from backend.app.games import DailyDisabled, DailyPlayed, GameElsewhere, GameSession, GameStore, daily_seed
+from backend.app.leaderboard_cache import LeaderboardCache
+from backend.app.rank_index import RankIndex
+from backend.app.replay import CHORD, FLAG, REVEAL
+
+
+def _safe_cells(session):
+    return [i for i, b in enumerate(session.writer.board.cells) if not b & (MINE | REVEALED)]
+
+
+def test_session_hides_mines_and_plays_to_a_win():
+    session = GameSession('g1', 'ann', 'easy')
+    # Flags before the first reveal only change the view and are recorded afterwards
+    assert session.play(FLAG, 8, 8) == [80] and session.flags_count == 1
+    assert session.play(CHORD, 0, 0) == [] and session.writer is None
+    session.play(REVEAL, 4, 4)
+    board = session.writer.board
+    assert not board.is_mine(4, 4) and board.is_flagged(8, 8) and session.writer.moves == 2
+    # Unrevealed cells never show their mine or count
+    assert all(b & REVEALED or b in (0, FLAGGED) for b in session.board.cells)
+    session.play(FLAG, 8, 8)
+    assert session.flags_count == 0 and not session.board.is_flagged(8, 8)
+
+    version = session.version
+    for cell in _safe_cells(session):
+        if session.status == 'playing' and not session.writer.board.cells[cell] & REVEALED:
+            session.play(REVEAL, *divmod(cell, 9))
+    assert session.status == 'won' and session.version > version
+    assert session.board == session.writer.board
+    with pytest.raises(ValueError):
+        session.play(REVEAL, 0, 0)
+
+
+def test_daily_games_share_a_board(monkeypatch):
+    # Without a secret anyone could work out the day's board, so there is none
+    monkeypatch.setattr(games, 'DAILY_SEED_SECRET', '')
+    with pytest.raises(DailyDisabled):
+        daily_seed()
+    monkeypatch.setattr(games, 'DAILY_SEED_SECRET', 'secret')
+    seed = daily_seed(date(2026, 10, 17))
+    assert seed == daily_seed(date(2026, 10, 17)) != daily_seed(date(2026, 10, 18))
+    a, b = GameSession('g1', 'ann', 'easy', seed=seed), GameSession('g2', 'bob', 'easy', seed=seed)
+    a.play(REVEAL, 0, 0)
+    b.play(REVEAL, 0, 0)
+    assert a.writer.board == b.writer.board and a.writer.seed == seed
+    # Different first clicks still get the same mines, bar one moved from under a click
+    c, d = GameSession('g3', 'cat', 'easy', seed=seed), GameSession('g4', 'dan', 'easy', seed=seed)
+    c.play(REVEAL, 0, 0)
+    d.play(REVEAL, 8, 8)
+    mines = [{i for i, v in enumerate(s.writer.initial) if v & MINE} for s in (c, d)]
+    assert len(mines[0] & mines[1]) >= 9
+    assert GameSession('g5', 'eve', 'easy').seed != seed
+
+
+@pytest.fixture
+def db(db, monkeypatch):
+    monkeypatch.setattr(mock_db, 'game_store', GameStore())
+    monkeypatch.setattr(mock_db, 'leaderboard_cache', LeaderboardCache(size=5, ttl=60))
+    monkeypatch.setattr(mock_db, 'rank_index', RankIndex(max_time=15, ttl=60))
+    return db
+
+
+@pytest.mark.asyncio
+async def test_store_pages_and_evicts_idle_written_games(db):
+    store = mock_db.game_store
+    store.idle_timeout = 60
+    games = [await mock_db.create_game(f'u{i % 2}', 'easy', db=db) for i in range(5)]
+    page = store.select(limit=2)
+    assert page.players == games[:2] and page.next_after == games[1].seq
+    assert store.select(username='u1', after=page.next_after).players == [games[3]]
+    games[0].play(REVEAL, 0, 0)
+    assert store.select(limit=2).token != page.token
+
+    store.mark_dirty(games[0])
+    assert store.evict_idle(now=games[0].last_active + 120) == 4
+    assert store.get(games[0].id) is games[0]
+    assert store.take_dirty() == [games[0]] and not store.dirty
+    assert store.evict_idle(now=games[0].last_active + 120) == 1 and len(store) == 0
+
+
+async def _signup(client, username):
+    r = await client.post('/api/auth/signup', json={'username': username, 'email': f'{username}@example.com',
+                                                     'password': 'secret123'})
+    return {'Authorization': f'Bearer {r.json()["token"]}'}
+
+
+@pytest.mark.asyncio
+async def test_game_api_writes_behind_and_resumes(db):
+    from backend.app.main import app
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            ann, bob = await _signup(client, 'ann'), await _signup(client, 'bob')
+            r = await client.post('/api/games', json={'difficulty': 'easy'}, headers=ann)
+            assert r.status_code == 201
+            game = r.json()
+            game_id = game['id']
+            assert (game['rows'], game['minesCount'], game['status']) == (9, 10, 'playing')
+
+            r = await client.post(f'/api/games/{game_id}/reveal', json={'row': 0, 'col': 0}, headers=ann)
+            cells = r.json()['cells']
+            assert cells and cells[0]['row'] == 0 and all(c['isRevealed'] and not c['isMine'] for c in cells)
+            assert (await client.post(f'/api/games/{game_id}/flag', json={'row': 0, 'col': 0}, headers=bob)).status_code == 403
+            r = await client.post(f'/api/games/{game_id}/reveal', json={'row': 9, 'col': 0}, headers=ann)
+            assert r.status_code == 422
+
+            # The real game is listed before the simulated ones
+            r = await client.get('/api/spectator/active', params={'limit': 1, 'fields': 'summary'})
+            assert [p['id'] for p in r.json()] == [game_id]
+            r = await client.get('/api/spectator/active', params={'limit': 1, 'cursor': r.headers['x-next-cursor']})
+            assert r.json()[0]['id'] != game_id
+
+            # The row is inserted with the game, leased to this worker; moves reach it at the flush
+            row = await db.get(DBGame, game_id)
+            assert (row.moves, row.revision, row.owner) == (0, 1, mock_db.game_store.worker_id)
+            assert await mock_db.flush_games(db) == 1
+            await db.refresh(row)
+            assert (row.status, row.moves, row.revision) == ('playing', 1, 2)
+            # The board is stored as its seed
+            assert row.initial is None and row.seed == mock_db.game_store.get(game_id).seed
+
+            # Evicted once idle, then resumed from the stored row
+            session = mock_db.game_store.get(game_id)
+            cached = spectator.player_payload(session)
+            assert mock_db.game_store.evict_idle(now=session.last_active + 3600) == 1
+            r = await client.get(f'/api/games/{game_id}', headers=ann)
+            assert r.json()['board'] == session.board.to_cells()
+            resumed = mock_db.game_store.get(game_id)
+            # Its version carries on from the stored one, and spectator caches start afresh
+            assert resumed.version == session.version + 1 and resumed.epoch != session.epoch
+            closed = divmod(next(i for i, b in enumerate(resumed.board.cells) if not b & REVEALED), 9)
+            mock_db.play_move(resumed, 'flag', *closed)
+            assert spectator.player_payload(resumed) != cached
+            mock_db.play_move(resumed, 'flag', *closed)
+            session = resumed
+            for cell in _safe_cells(session):
+                if session.status == 'playing' and not session.writer.board.cells[cell] & REVEALED:
+                    await client.post(f'/api/games/{game_id}/reveal', json=dict(zip(('row', 'col'), divmod(cell, 9))),
+                                      headers=ann)
+            assert session.status == 'won'
+            assert (await client.post(f'/api/games/{game_id}/reveal', json={'row': 0, 'col': 0}, headers=ann)).status_code == 409
+
+            # The win is entered on the leaderboard by the flush, under the game's id; the row
+            # only had the new moves appended
+            await mock_db.flush_games(db)
+            await db.refresh(row)
+            assert (row.log, row.keyframes) == (bytes(session.writer.log), bytes(session.writer.keyframes))
+            entry = await db.get(DBEntry, game_id)
+            assert (entry.username, entry.time, entry.status) == ('ann', session.time, 'played')
+            assert (await db.get(DBReplay, game_id)).moves == session.writer.moves
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+        mock_db.stop_game_flusher()
+        mock_db.stop_simulation()
+
+
+@pytest.mark.asyncio
+async def test_todays_daily_games_stay_hidden(db, monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(games, 'DAILY_SEED_SECRET', 'secret')
+    daily = await mock_db.create_game('ann', 'easy', daily=True, db=db)
+    other = await mock_db.create_game('bob', 'easy', db=db)
+    assert daily.seed == daily_seed()
+    assert mock_db.game_store.visible() == [other] and mock_db.find_player(daily.id) is None
+    for session in (daily, other):
+        session.play(REVEAL, 4, 4)
+        db.add(DBReplay(**mock_db.replay_row(session.id, session.writer)))
+    await db.commit()
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            r = await client.get(f'/api/games/{daily.id}/replay', params={'speed': 0})
+            assert r.status_code == 403
+            r = await client.get(f'/api/games/{other.id}/replay', params={'speed': 0})
+            assert r.status_code == 200
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+
+
+@pytest.mark.asyncio
+async def test_one_daily_game_a_day_keeps_its_mines_hidden(db, monkeypatch):
+    monkeypatch.setattr(games, 'DAILY_SEED_SECRET', '')
+    with pytest.raises(DailyDisabled):
+        await mock_db.create_game('ann', 'easy', daily=True, db=db)
+    monkeypatch.setattr(games, 'DAILY_SEED_SECRET', 'secret')
+    daily = await mock_db.create_game('ann', 'easy', daily=True, db=db)
+    with pytest.raises(DailyPlayed):
+        await mock_db.create_game('ann', 'hard', daily=True, db=db)
+    other = await mock_db.create_game('ann', 'easy', db=db)
+    for session in (daily, other):
+        mock_db.play_move(session, 'reveal', 4, 4)
+        mine = next(i for i, b in enumerate(session.writer.board.cells) if b & MINE)
+        mock_db.play_move(session, 'reveal', *divmod(mine, 9))
+        assert session.status == 'lost'
+    # Only the mine clicked shows on today's board; another board is shown whole
+    assert sum(1 for b in daily.board.cells if b & MINE) == 1
+    assert other.board == other.writer.board
+    await mock_db.flush_games(db)
+    assert GameSession.restore(await db.get(DBGame, daily.id)).board == daily.board
+
+
+@pytest.mark.asyncio
+async def test_a_failing_game_does_not_hold_up_the_flush(db):
+    games = [await mock_db.create_game(f'u{i}', 'easy', db=db) for i in range(3)]
+    for session in games:
+        mock_db.play_move(session, 'reveal', 4, 4)
+    # Not a string: the driver refuses it, failing its chunk
+    games[1].status = ['playing']
+    assert await mock_db.flush_games(db) == 2
+    assert [(await db.get(DBGame, s.id, populate_existing=True)).moves for s in games] == [1, 0, 1]
+    assert mock_db.game_store.dirty == {games[1].id} and mock_db.game_store.flush_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_games_are_leased_to_one_worker(db, monkeypatch):
+    a, b = mock_db.game_store, GameStore()
+    session = await mock_db.create_game('ann', 'easy', db=db)
+    mock_db.play_move(session, 'reveal', 4, 4)
+    await mock_db.flush_games(db)
+
+    # Another worker finds the game but may not play it while the lease lasts
+    monkeypatch.setattr(mock_db, 'game_store', b)
+    with pytest.raises(GameElsewhere):
+        await mock_db.get_game(session.id, db)
+    # Once it lapses the game moves over, resumed from its row
+    await db.execute(update(DBGame).values(lease_until=datetime.utcnow() - timedelta(seconds=1)))
+    session.lease_until = datetime.min
+    moved = await mock_db.get_game(session.id, db)
+    assert moved is not session and moved.board == session.board and moved.revision == session.revision + 1
+    mock_db.play_move(moved, 'flag', 0, 0)
+    assert await mock_db.flush_games(db) == 1
+
+    # The first worker's copy is behind: it can't take the game back or write over it
+    monkeypatch.setattr(mock_db, 'game_store', a)
+    with pytest.raises(GameElsewhere):
+        await mock_db.get_game(session.id, db)
+    mock_db.play_move(session, 'flag', 8, 8)
+    assert await mock_db.flush_games(db) == 0 and a.get(session.id) is None
+    row = await db.get(DBGame, session.id, populate_existing=True)
+    assert (row.moves, row.owner) == (2, b.worker_id)
+
+
+@pytest.mark.asyncio
+async def test_other_workers_show_a_game_from_its_row(db, monkeypatch):
+    from backend.app.main import app
+
+    session = await mock_db.create_game('ann', 'easy', db=db)
+    mock_db.play_move(session, 'reveal', 4, 4)
+    await mock_db.flush_games(db)
+    monkeypatch.setattr(mock_db, 'game_store', GameStore())
+    assert mock_db.find_player(session.id) is None
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            r = await client.get(f'/api/spectator/{session.id}')
+            assert r.status_code == 200
+            assert r.json()['board'] == session.board.to_cells() and mock_db.game_store.get(session.id) is None
+            assert (await client.get('/api/spectator/nope')).status_code == 404
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+
+
+@pytest.mark.asyncio
+async def test_active_games_are_capped_and_large_boards_are_windowed(db):
+    from backend.app.main import app
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    try:
+        async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+            ann = await _signup(client, 'ann')
+            r = await client.post('/api/games', json={'difficulty': 'marathon'}, headers=ann)
+            game = r.json()
+            assert (game['boardRow'], len(game['board']), len(game['board'][0])) == (0, 2, 1000)
+            r = await client.get(f'/api/games/{game["id"]}', params={'row': 5000}, headers=ann)
+            assert (r.json()['boardRow'], len(r.json()['board'])) == (999, 1)
+            session = mock_db.game_store.get(game['id'])
+            assert json.loads(spectator.player_payload(session)[0])['board'] is None
+
+            for _ in range(mock_db.MAX_ACTIVE_GAMES - 1):
+                assert (await client.post('/api/games', json={}, headers=ann)).status_code == 201
+            assert (await client.post('/api/games', json={}, headers=ann)).status_code == 429
+            # Games left idle no longer count
+            await db.execute(update(DBGame).values(updated_at=datetime.utcnow() - timedelta(days=1)))
+            await db.commit()
+            assert (await client.post('/api/games', json={}, headers=ann)).status_code == 201
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select, text
+
+from backend.app import mock_db
+from backend.app.database import LeaderboardEntry as DBEntry, get_async_db
+from backend.app.leaderboard_cache import LeaderboardCache, sort_key
+from backend.app.pagination import InvalidCursor, decode_cursor, encode_cursor
+from backend.app.rank_index import FenwickTree, RankIndex
+
+
+@pytest_asyncio.fixture
+async def db(db, session_factory, monkeypatch):
+    base = datetime(2024, 1, 1)
+    # Equal times on purpose so the (date, id) tie-breakers are exercised
+    for i in range(25):
+        db.add(DBEntry(id=f'e{i:02d}', username=f'u{i}', time=10 + i // 3,
+                       difficulty='easy' if i % 5 else 'hard', date=base + timedelta(minutes=i % 4)))
+    await db.commit()
+    monkeypatch.setattr(mock_db, 'leaderboard_cache', LeaderboardCache(size=5, ttl=60))
+    monkeypatch.setattr(mock_db, 'rank_index', RankIndex(max_time=15, ttl=60))
+    monkeypatch.setattr(mock_db, 'AsyncSessionLocal', session_factory)
+    return db
+
+
+async def _all(db, difficulty=None):
+    query = select(DBEntry)
+    if difficulty:
+        query = query.where(DBEntry.difficulty == difficulty)
+    return [e.id for e in sorted((await db.scalars(query)).all(), key=sort_key)]
+
+
+async def _count(db):
+    return await db.scalar(select(func.count()).select_from(DBEntry))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('difficulty', [None, 'easy'])
+async def test_keyset_pages_cover_everything_in_order(db, difficulty):
+    seen, after = [], None
+    while True:
+        page = await mock_db.get_leaderboard(4, db, difficulty, after=after)
+        seen += [e.id for e in page]
+        if len(page) < 4:
+            break
+        after = sort_key(page[-1])
+    assert seen == await _all(db, difficulty)
+
+    # Walking back from the end with `before` yields the same pages
+    last = sort_key(await db.get(DBEntry, seen[-1]))
+    back = await mock_db.get_leaderboard(4, db, difficulty, before=last)
+    assert [e.id for e in back] == seen[-5:-1]
+
+
+@pytest.mark.asyncio
+async def test_first_page_comes_from_cache(db):
+    first = await mock_db.get_leaderboard(3, db, 'hard')
+    assert [e.id for e in first] == (await _all(db, 'hard'))[:3]
+    cache = mock_db.leaderboard_cache
+    assert (cache.hits, cache.misses) == (0, 1)  # a miss, served by the database while it loads
+    await cache.refresh(mock_db.AsyncSessionLocal)
+    await mock_db.get_leaderboard(3, db, 'hard')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_difficulty_page_uses_composite_index(db):
+    plan = (await db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM leaderboard_entries "
+        "WHERE difficulty = 'easy' AND (time, date, id) > (11, '2024-01-01', 'e00') ORDER BY time, date, id LIMIT 10"
+    ))).fetchall()
+    assert any('ix_leaderboard_difficulty_time_date' in row[-1] for row in plan)
+
+
+def test_cursor_round_trip_and_validation():
+    key = (12, datetime(2024, 1, 1, 10, 30), 'abc')
+    assert decode_cursor(encode_cursor(*key), int, datetime, str) == key
+    with pytest.raises(InvalidCursor):
+        decode_cursor('not-a-cursor', int, datetime, str)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(1, 2), int, datetime, str)
+
+
+def test_fenwick_prefix_sums():
+    import random
+
+    rng = random.Random(1)
+    counts = [0] * 50
+    tree = FenwickTree(50)
+    for _ in range(300):
+        i, d = rng.randrange(50), rng.randint(1, 3)
+        counts[i] += d
+        tree.add(i, d)
+    assert all(tree.prefix(i) == sum(counts[:i]) for i in range(52))
+
+
+@pytest.mark.asyncio
+async def test_rank_matches_count_and_tracks_submissions(db):
+    times = sorted((await db.scalars(select(DBEntry.time).where(DBEntry.difficulty == 'easy'))).all())
+    # A cold index is not loaded on the request: the database answers while it reloads, once
+    reload = mock_db.rank_index.refresh(mock_db.AsyncSessionLocal)
+    assert mock_db.rank_index.refresh(mock_db.AsyncSessionLocal) is reload
+    assert not mock_db.rank_index.fresh and mock_db.rank_index.faster_than('easy', 12) is None
+    assert (await mock_db.get_rank(12, 'easy', db))['rank'] == 1 + sum(x < 12 for x in times)
+    await reload
+    assert mock_db.rank_index.fresh
+    for t in (0, 10, 12, 14, 18):
+        result = await mock_db.get_rank(t, 'easy', db)
+        assert result['rank'] == 1 + sum(x < t for x in times)
+        assert result['total'] == len(times)
+
+    # Above RANK_MAX_TIME (15 here) the database answers
+    assert (await mock_db.get_rank(99, 'easy', db))['rank'] == len(times) + 1
+
+    await mock_db.submit_score('fast', 1, 'easy', db)
+    assert (await mock_db.get_rank(12, 'easy', db))['rank'] == 2 + sum(x < 12 for x in times)
+    assert (await mock_db.get_user_rank('fast', 'easy', db))['rank'] == 1
+    assert await mock_db.get_user_rank('fast', 'hard', db) is None
+
+
+@pytest_asyncio.fixture
+async def client(db):
+    from backend.app.main import app
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    async with httpx.AsyncClient(app=app, base_url='http://test') as c:
+        yield c
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+@pytest.mark.asyncio
+async def test_batch_insert_json_and_ndjson(client, db):
+    before = await _count(db)
+    scores = [{'username': f'b{i}', 'time': 100 + i, 'difficulty': 'medium'} for i in range(1200)]
+    r = await client.post('/api/leaderboard/batch', json=scores)
+    assert r.status_code == 201
+    body = r.json()
+    assert body['count'] == 1200 and len(set(body['ids'])) == 1200
+
+    ndjson = '\n'.join('{"username": "n%d", "time": %d, "difficulty": "hard"}' % (i, i) for i in range(3)) + '\n'
+    r = await client.post('/api/leaderboard/batch', content=ndjson, headers={'content-type': 'application/x-ndjson'})
+    assert r.status_code == 201 and r.json()['count'] == 3
+    assert await _count(db) == before + 1203
+    assert (await mock_db.get_rank(1, 'hard', db))['rank'] == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_is_all_or_nothing(client, db):
+    before = await _count(db)
+    scores = [{'username': 'ok', 'time': 1, 'difficulty': 'easy'}, {'username': 'bad', 'time': 'x', 'difficulty': 'nope'}]
+    r = await client.post('/api/leaderboard/batch', json=scores)
+    assert r.status_code == 422
+    assert r.json()['detail'][0]['index'] == 1
+    assert (await client.post('/api/leaderboard/batch', content=b'{oops')).status_code == 400
+    assert await _count(db) == before
+
+
+@pytest.mark.asyncio
+async def test_first_page_is_encoded_once_per_cache_version(client, db):
+    await mock_db.leaderboard_cache.warm(db)
+    r = await client.get('/api/leaderboard', params={'limit': 3})
+    etag = r.headers['etag']
+    assert [e['id'] for e in r.json()] == (await _all(db))[:3]
+    r = await client.get('/api/leaderboard', params={'limit': 3}, headers={'If-None-Match': etag})
+    assert r.status_code == 304 and 'x-next-cursor' in r.headers
+    assert mock_db.leaderboard_cache.payloads.hits == 1
+
+    # A faster score changes the page, so the old ETag no longer matches
+    await client.post('/api/leaderboard/batch', json=[{'username': 'fast', 'time': 1, 'difficulty': 'easy'}])
+    r = await client.get('/api/leaderboard', params={'limit': 3}, headers={'If-None-Match': etag})
+    assert r.status_code == 200 and r.json()[0]['username'] == 'fast'
+
+    deep = {'limit': 3, 'after': r.headers['x-next-cursor']}
+    etag = (await client.get('/api/leaderboard', params=deep)).headers['etag']
+    assert (await client.get('/api/leaderboard', params=deep, headers={'If-None-Match': etag})).status_code == 304
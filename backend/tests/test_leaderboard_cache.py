@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+
+from backend.app.database import LeaderboardEntry as DBEntry
+from backend.app.leaderboard_cache import LeaderboardCache
+from backend.app.schemas import LeaderboardEntry
+
+
+@pytest_asyncio.fixture
+async def db(db):
+    base = datetime(2024, 1, 1)
+    for i, (time, difficulty) in enumerate([(50, 'easy'), (20, 'easy'), (35, 'medium'), (10, 'hard'), (80, 'easy')]):
+        db.add(DBEntry(id=f'e{i}', username=f'u{i}', time=time, difficulty=difficulty,
+                       date=base + timedelta(minutes=i)))
+    await db.commit()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_cache_serves_top_k_and_counts(db):
+    cache = LeaderboardCache(size=2, ttl=60)
+    assert cache.get(2) is None
+    await cache.warm(db)
+
+    assert [e.time for e in cache.get(2)] == [10, 20]
+    assert [e.time for e in cache.get(2, 'easy')] == [20, 50]
+    # Beyond K we must go to the database
+    assert cache.get(3) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_cache_write_through_keeps_order_and_bound(db):
+    cache = LeaderboardCache(size=2, ttl=60)
+    await cache.warm(db)
+    now = datetime(2024, 2, 1)
+    cache.add(LeaderboardEntry(id='n1', username='x', time=30, date=now, difficulty='easy'))
+    cache.add(LeaderboardEntry(id='n2', username='y', time=99, date=now, difficulty='easy'))
+
+    assert [e.id for e in cache.get(2, 'easy')] == ['e1', 'n1']
+    assert [e.difficulty for e in cache.get(2, 'extreme')] == []
+
+
+@pytest.mark.asyncio
+async def test_stale_cache_answers_while_one_reload_runs(db, session_factory):
+    cache = LeaderboardCache(size=5, ttl=0)
+    await cache.warm(db)
+    assert not cache.fresh
+    assert [e.time for e in cache.get(1)] == [10]
+    db.add(DBEntry(id='n', username='x', time=5, difficulty='easy', date=datetime(2024, 2, 1)))
+    await db.commit()
+    task = cache.refresh(session_factory)
+    assert cache.refresh(session_factory) is task
+    assert [e.time for e in cache.get(1)] == [10]
+    await task
+    assert [e.time for e in cache.get(1)] == [5]
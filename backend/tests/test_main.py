@@ -45,8 +45,8 @@ async def test_auth_signup_login_me():
         body2 = r2.json()
         assert body2['success'] is True
 
-        # me - use header x-user-id for mock auth
-        r3 = await ac.get('/auth/me', headers={'x-user-id': uid})
+        # me - with the session token from login
+        r3 = await ac.get('/auth/me', headers={'Authorization': f"Bearer {body2['token']}"})
         assert r3.status_code == 200
         me = r3.json()
         assert me['email'] == 'u1@example.com'
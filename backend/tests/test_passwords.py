@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from backend.app import mock_db
+from backend.app.database import User as DBUser
+from backend.app.passwords import (HasherBusy, PasswordHasher, hash_password, is_hashed, needs_rehash,
+                                   verify_password)
+
+
+def test_hash_and_verify():
+    stored = hash_password('hunter2')
+    assert is_hashed(stored) and 'hunter2' not in stored
+    assert stored != hash_password('hunter2')  # salted
+    assert verify_password('hunter2', stored)
+    assert not verify_password('hunter3', stored)
+    assert not needs_rehash(stored)
+    assert needs_rehash(hash_password('hunter2', n=2 ** 10))
+
+
+def test_legacy_plaintext_still_verifies():
+    assert verify_password('secret', 'secret')
+    assert not verify_password('Secret', 'secret')
+    assert needs_rehash('secret')
+
+
+@pytest.mark.asyncio
+async def test_pool_rejects_beyond_queue_limit():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    results = await asyncio.gather(*(hasher.hash('pw') for _ in range(4)), return_exceptions=True)
+    assert sum(isinstance(r, HasherBusy) for r in results) == 2
+    assert hasher.stats()['rejected'] == 2 and hasher.in_flight == 0
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_signup_hashes_and_login_upgrades_plaintext(db):
+    user, err = await mock_db.signup('alice', 'a@example.com', 'pw1', db)
+    assert err is None
+    assert is_hashed((await db.get(DBUser, user['id'])).password)
+
+    db.add(DBUser(id='legacy', username='bob', email='b@example.com', password='pw2'))
+    await db.commit()
+    assert (await mock_db.login('b@example.com', 'nope', db)) == (None, 'Invalid password')
+    assert (await db.get(DBUser, 'legacy')).password == 'pw2'
+    user, err = await mock_db.login('b@example.com', 'pw2', db)
+    assert err is None and user['id'] == 'legacy'
+    assert verify_password('pw2', (await db.get(DBUser, 'legacy')).password)
+    assert is_hashed((await db.get(DBUser, 'legacy')).password)
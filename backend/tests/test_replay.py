@@ -0,0 +1,155 @@
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from backend.app import mock_db
+from backend.app.database import get_async_db
+from backend.app.engine import Board, board_from_mines, generate_board
+from backend.app.leaderboard_cache import LeaderboardCache
+from backend.app.rank_index import RankIndex
+from backend.app.replay import (
+    ACTIONS, CHORD, FLAG, REVEAL, ReplayWriter, apply_move, board_at, read_keyframes, read_moves, read_varint, write_varint,
+)
+
+
+def test_varints_round_trip():
+    out = bytearray()
+    values = [0, 1, 127, 128, 300, 16383, 16384, 2 ** 40]
+    for v in values:
+        write_varint(out, v)
+    assert len(out) == 1 + 1 + 1 + 2 + 2 + 2 + 3 + 6
+    pos, decoded = 0, []
+    while pos < len(out):
+        v, pos = read_varint(out, pos)
+        decoded.append(v)
+    assert decoded == values
+
+
+def _game(moves=300, seed=3):
+    board = generate_board(16, 30, 99, seed=seed)
+    writer = ReplayWriter(board, keyframe_interval=32)
+    t = 0
+    for i in range(moves):
+        cell = (i * 37) % len(board)
+        t += 150 + (i * 13) % 900
+        writer.append(cell, (REVEAL, FLAG, REVEAL, CHORD)[i % 4], t)
+    return board, writer
+
+
+def test_log_is_compact_and_decodes():
+    board, writer = _game()
+    moves = list(read_moves(writer.log))
+    assert len(moves) == writer.moves == 300 and moves[-1].t == writer.t
+    # Under 4 bytes a move, against 480 bytes for a snapshot of this board
+    assert len(writer.log) < 4 * writer.moves
+
+    replayed = Board(board.rows, board.cols, bytearray(board.cells))
+    for move in moves:
+        apply_move(replayed, move.cell, move.action)
+    assert replayed == writer.board
+    assert len(read_keyframes(writer.keyframes)) == 300 // 32
+
+
+def test_seeking_from_keyframes_matches_a_full_replay():
+    board, writer = _game()
+    log, index = bytes(writer.log), bytes(writer.keyframes)
+    for t in (0, 999, writer.t // 2, writer.t - 1, writer.t):
+        reference = Board(board.rows, board.cols, bytearray(board.cells))
+        following = None
+        for move in read_moves(log):
+            if move.t > t:
+                following = move
+                break
+            apply_move(reference, move.cell, move.action)
+        at, move, _ = board_at(board.rows, board.cols, bytes(board.cells), log, index, t)
+        assert at == reference and move == following
+
+
+def test_keyframes_on_a_large_board_record_only_changes():
+    board = generate_board(300, 300, 100, first_click=(0, 0), seed=5)
+    writer = ReplayWriter(board, keyframe_interval=64)
+    for i in range(641):
+        writer.append((i * 7919) % len(board), FLAG, i * 10)
+    # Ten keyframes of a few hundred flags, against 900 KB for ten snapshots
+    assert len(read_keyframes(writer.keyframes)) == 10 and len(writer.keyframes) < 20 * 641
+
+    # A restored writer carries on with the same log and index
+    half = ReplayWriter(board, keyframe_interval=64)
+    for i in range(300):
+        half.append((i * 7919) % len(board), FLAG, i * 10)
+    resumed = ReplayWriter.restore(300, 300, half.initial, half.board.cells, half.log, half.keyframes, half.moves,
+                                   half.t, keyframe_interval=64)
+    for i in range(300, 641):
+        resumed.append((i * 7919) % len(board), FLAG, i * 10)
+    assert (resumed.log, resumed.keyframes) == (writer.log, writer.keyframes)
+    at, _, _ = board_at(300, 300, writer.initial, bytes(writer.log), bytes(writer.keyframes), writer.t)
+    assert at == writer.board
+
+
+def test_writer_rejects_bad_moves():
+    writer = ReplayWriter(board_from_mines(3, 3, [4]))
+    writer.append(0, REVEAL, 100)
+    with pytest.raises(ValueError):
+        writer.append(9, REVEAL, 200)
+    with pytest.raises(ValueError):
+        writer.append(1, FLAG, 50)
+
+
+@pytest_asyncio.fixture
+async def client(db, session_factory, monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(mock_db, 'leaderboard_cache', LeaderboardCache(size=5, ttl=60))
+    monkeypatch.setattr(mock_db, 'rank_index', RankIndex(max_time=15, ttl=60))
+    monkeypatch.setattr(mock_db, 'AsyncSessionLocal', session_factory)
+    app.dependency_overrides[get_async_db] = lambda: db
+    async with httpx.AsyncClient(app=app, base_url='http://test') as c:
+        yield c
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+def _events(text):
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stored_replay_streams_and_seeks(client):
+    from backend.app.main import app
+
+    # Mines fill row 4 and the bottom-right corner: open the top, flag the corner, chord a
+    # zero (a no-op), then open the bottom half to win
+    mines = list(range(36, 45)) + [80]
+    moves = [{'cell': 0, 'action': 'reveal', 't': 400}, {'cell': 80, 'action': 'flag', 't': 900},
+             {'cell': 0, 'action': 'chord', 't': 1000}, {'cell': 72, 'action': 'reveal', 't': 1500}]
+    writer = ReplayWriter(board_from_mines(9, 9, mines))
+    for m in moves:
+        writer.append(m['cell'], ACTIONS.index(m['action']), m['t'])
+    db = app.dependency_overrides[get_async_db]()
+    game_id = (await mock_db.submit_score('ann', 2, 'easy', db, writer)).id
+    r = await client.get(f'/api/games/{game_id}/replay', params={'speed': 0})
+    events = _events(r.text)
+    assert [e for e, _ in events] == ['start', 'move', 'move', 'move', 'move', 'end']
+    start = events[0][1]
+    assert (start['moves'], start['durationMs']) == (4, 1500)
+    assert not any(c['isRevealed'] for row in start['board'] for c in row)
+    assert events[2][1] == {'n': 2, 't': 900, 'cell': 80, 'action': 'flag'}
+
+    r = await client.get(f'/api/games/{game_id}/replay', params={'speed': 0, 'from': 950, 'to': 1200})
+    events = _events(r.text)
+    assert [e for e, _ in events] == ['start', 'move', 'end']
+    assert events[0][1]['board'][8][8]['isFlagged'] and events[0][1]['board'][0][0]['isRevealed']
+
+    assert (await client.get('/api/games/nope/replay')).status_code == 404
+    # Replays with their own mines are not accepted, only boards from a seed ticket
+    bad = {'rows': 9, 'cols': 9, 'mines': mines, 'moves': moves}
+    r = await client.post('/api/leaderboard', json={'username': 'ann', 'time': 2, 'difficulty': 'easy', 'replay': bad})
+    assert r.status_code == 422
+    r = await client.post('/api/leaderboard/batch', json=[{'username': 'b', 'time': 3, 'difficulty': 'easy'},
+                                                          {'username': 'c', 'time': 3, 'difficulty': 'easy', 'replay': bad}])
+    assert r.status_code == 422 and r.json()['detail'][0]['index'] == 1
@@ -0,0 +1,60 @@
+import httpx
+import pytest
+import pytest_asyncio
+
+from backend.app import mock_db
+from backend.app.database import get_async_db
+from backend.app.schemas import User
+from backend.app.session_cache import SessionCache
+
+
+def _user(i):
+    return User(id=f'u{i}', username=f'user{i}', email=f'u{i}@example.com', createdAt='2024-01-01T00:00:00')
+
+
+def test_cache_is_lru_with_ttl():
+    cache = SessionCache(size=2, ttl=60)
+    cache.put('a', _user(1))
+    cache.put('b', _user(2))
+    assert cache.get('a').id == 'u1'  # 'a' is now most recent
+    cache.put('c', _user(3))
+    assert cache.get('b') is None and cache.get('c').id == 'u3'
+
+    cache.put('d', _user(4), ttl=0)
+    assert cache.get('d') is None
+    cache.evict('a')
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 2
+
+
+@pytest_asyncio.fixture
+async def client(db, monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(mock_db, 'session_cache', SessionCache(size=10, ttl=60))
+    app.dependency_overrides[get_async_db] = lambda: db
+    async with httpx.AsyncClient(app=app, base_url='http://test') as c:
+        yield c
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+@pytest.mark.asyncio
+async def test_token_session_lifecycle(client):
+    r = await client.post('/api/auth/signup', json={'username': 'sam', 'email': 's@example.com', 'password': 'pw'})
+    token = r.json()['token']
+    auth = {'Authorization': f'Bearer {token}'}
+
+    r = await client.get('/api/auth/me', headers=auth)
+    assert r.status_code == 200 and r.json()['username'] == 'sam'
+    assert (await client.get('/api/users', headers=auth)).status_code == 200
+    cache = mock_db.session_cache
+    assert (cache.hits, cache.misses) == (1, 1)  # only the first check reached the database
+
+    r = await client.post('/api/auth/login', json={'email': 's@example.com', 'password': 'pw'})
+    other = r.json()['token']
+    assert other != token
+
+    assert (await client.post('/api/auth/logout', headers=auth)).status_code == 204
+    assert (await client.get('/api/auth/me', headers=auth)).status_code == 401
+    assert (await client.get('/api/auth/me', headers={'Authorization': f'Bearer {other}'})).status_code == 200
+    assert (await client.get('/api/auth/me', headers={'Authorization': 'Bearer nope'})).status_code == 401
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import httpx
+import numpy as np
+import pytest
+
+from backend.app import mock_db
+from backend.app.engine import generate_boards
+from backend.app.simulation import LOST, PLAYING, WON, Simulation
+
+
+def _simulation(n, seed=0, capacity=None):
+    sim = Simulation(capacity or n, seed=seed)
+    for i, board in enumerate(generate_boards(n, 9, 9, 10, seed=seed)):
+        sim.add(id=f'p{i}', username=f'u{i}', board=board, timer=5, flags_count=0,
+                mines_count=board.mines_count, started_at=datetime(2024, 1, 1, 12))
+    return sim
+
+
+def test_player_fields_live_in_arrays():
+    sim = _simulation(3)
+    p = sim.players[1]
+    assert (p.status, p.timer, p.mines_count, p.version) == ('playing', 5, 10, 0)
+    assert p.started_at == datetime(2024, 1, 1, 12)
+    p.status = 'won'
+    p.timer += 2
+    p.touch()
+    assert sim.status[1] == WON and sim.timer[1] == 7 and sim.version[1] == 1
+    assert p.fields()['status'] == 'won' and p.to_dict()['timer'] == 7
+
+
+def test_step_advances_games_vectorized():
+    sim = _simulation(5000)
+    changed = sim.step(lambda n: generate_boards(n, 9, 9, 10))
+    assert len(changed) == 5000  # every game was in progress
+    assert set(np.unique(sim.timer[:5000])) == {6}
+    lost = np.count_nonzero(sim.status == LOST)
+    assert 50 < lost < 160  # ~2% per tick
+
+    finished = np.flatnonzero(sim.status[:5000] != PLAYING)
+    old_boards = {i: sim.players[i].board for i in finished}
+    changed = sim.step(lambda n: generate_boards(n, 9, 9, 10))
+    restarted = [i for i in finished if sim.status[i] == PLAYING]
+    assert restarted and all(sim.players[i].board is not old_boards[i] for i in restarted)
+    assert all(sim.players[i].timer == 0 for i in restarted)
+    # Finished games that did not restart are unchanged
+    idle = [i for i in finished if sim.status[i] != PLAYING]
+    assert not set(idle) & set(changed.tolist())
+    stats = sim.stats()
+    assert stats['ticks'] == 2 and stats['population'] == 5000 and stats['maxTickMs'] > 0
+
+
+def test_registry_lookups_and_pages():
+    sim = _simulation(10, capacity=11)
+    for i in (2, 5, 7):
+        sim.players[i].status = 'lost'
+    sim.add(id='dup', username='u5', board=generate_boards(1, 9, 9, 10)[0])
+    assert sim.get('p7') is sim.players[7] and sim.get('nope') is None
+
+    page, after, _ = sim.select(status='playing', limit=4)
+    assert [p.id for p in page] == ['p0', 'p1', 'p3', 'p4'] and after == 4
+    page, after, _ = sim.select(status='playing', after=after, limit=4)
+    assert [p.id for p in page] == ['p6', 'p8', 'p9', 'dup'] and after is None
+    assert [p.id for p in sim.select(username='u5').players] == ['p5', 'dup']
+    assert [p.id for p in sim.select(username='u5', status='lost').players] == ['p5']
+
+    token = sim.select(limit=3).token
+    sim.version[7] += 1
+    assert sim.select(limit=3).token == token
+    sim.version[1] += 1
+    assert sim.select(limit=3).token != token
+
+
+@pytest.mark.asyncio
+async def test_active_endpoint_filters_pages_and_projects(monkeypatch):
+    from backend.app.main import app
+
+    sim = _simulation(7)
+    sim.players[3].status = 'won'
+    monkeypatch.setattr(mock_db, '_simulation', sim)
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.get('/api/spectator/active', params={'fields': 'summary', 'limit': 4})
+        assert [p['id'] for p in r.json()] == ['p0', 'p1', 'p2', 'p3']
+        assert 'board' not in r.json()[0]
+        r = await client.get('/api/spectator/active', params={'cursor': r.headers['x-next-cursor'], 'limit': 4})
+        assert [p['id'] for p in r.json()] == ['p4', 'p5', 'p6'] and 'x-next-cursor' not in r.headers
+        assert len(r.json()[0]['board']) == 9
+        r = await client.get('/api/spectator/active', params={'status': 'won'})
+        assert [p['id'] for p in r.json()] == ['p3']
+        assert (await client.get('/api/spectator/active', params={'cursor': '!'})).status_code == 400
+    mock_db.stop_simulation()
+
+
+@pytest.mark.asyncio
+async def test_spectator_responses_revalidate_with_etags(monkeypatch):
+    from backend.app import spectator
+    from backend.app.main import app
+
+    sim = _simulation(3)
+    monkeypatch.setattr(mock_db, '_simulation', sim)
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        r = await client.get('/api/spectator/p1')
+        etag = r.headers['etag']
+        assert r.json()['id'] == 'p1' and r.headers['cache-control'] == 'no-cache'
+        r = await client.get('/api/spectator/p1', headers={'If-None-Match': etag})
+        assert r.status_code == 304 and not r.content
+        sim.players[1].timer += 1
+        sim.players[1].version += 1
+        r = await client.get('/api/spectator/p1', headers={'If-None-Match': etag})
+        assert r.status_code == 200 and r.headers['etag'] != etag
+
+        r = await client.get('/api/spectator/active', params={'limit': 2})
+        etag, body = r.headers['etag'], r.content
+        r = await client.get('/api/spectator/active', params={'limit': 2}, headers={'If-None-Match': f'W/{etag}'})
+        assert r.status_code == 304 and 'x-next-cursor' in r.headers
+        assert (await client.get('/api/spectator/active', params={'limit': 2})).content == body
+        sim.players[0].timer += 1
+        sim.players[0].version += 1
+        r = await client.get('/api/spectator/active', params={'limit': 2}, headers={'If-None-Match': etag})
+        assert r.status_code == 200
+    assert spectator.active_payloads.hits >= 1
+    mock_db.stop_simulation()
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint_reports_caches_and_pools(monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(mock_db, '_simulation', _simulation(3))
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        stats = (await client.get('/api/spectator/simulation')).json()
+    assert stats['population'] == 3
+    assert {'hits', 'misses'} <= set(stats['leaderboardCache']) and {'hits', 'misses'} <= set(stats['sessionCache'])
+    assert {'workers', 'rejected'} <= set(stats['passwordHasher']) and {'verified', 'failed'} <= set(stats['scoreVerifier'])
@@ -0,0 +1,164 @@
+import json
+
+import numpy as np
+import pytest
+
+from backend.app.engine import Board, PlayerState, generate_boards
+from backend.app.simulation import PLAYING, Simulation
+from backend.app.spectator import DeltaTracker, PlayerHub, RESYNC, player_stream
+
+
+def _payload(frame: bytes):
+    lines = frame.decode().strip().split('\n')
+    fields = dict(line.split(': ', 1) for line in lines)
+    return fields, json.loads(fields['data'])
+
+
+def _players():
+    return [
+        PlayerState(id='a', username='alice', board=Board(9, 9), mines_count=10),
+        PlayerState(id='b', username='bob', board=Board(9, 9), mines_count=10),
+    ]
+
+
+def test_delta_tracker_sends_only_changes():
+    players = _players()
+    tracker = DeltaTracker(lambda: players)
+    # The players already there are the baseline, not a patch
+    assert tracker.advance() is None and tracker.seq == 0
+    players.append(PlayerState(id='c', username='carol', board=Board(9, 9), mines_count=10))
+    patch = tracker.advance()
+    assert patch.seq == 1 and [p['id'] for p in _payload(patch.frame)[1]['added']] == ['c']
+    assert json.loads(patch.data) == _payload(patch.frame)[1]
+
+    # Nothing touched: no patch at all
+    assert tracker.advance() is None
+
+    players[0].timer = 5
+    players[0].board.set_cell(4, 4, revealed=True, neighbor_mines=2)
+    players[0].touch()
+    frame = tracker.advance().frame
+    fields, patch = _payload(frame)
+
+    assert fields['event'] == 'patch'
+    assert fields['id'] == tracker.event_id(2)
+    assert set(patch['updated']) == {'a'}
+    change = patch['updated']['a']
+    assert change['timer'] == 5
+    assert change['cells'] == [[40, {'isMine': False, 'isRevealed': True, 'isFlagged': False, 'neighborMines': 2}]]
+    assert 'board' not in change and 'username' not in change
+    assert len(frame) < len(next(tracker.snapshots())) / 5
+
+    players.pop(1)
+    _, patch = _payload(tracker.advance().frame)
+    assert patch['removed'] == ['b']
+
+
+def test_delta_tracker_resume_from_history():
+    players = _players()
+    tracker = DeltaTracker(lambda: players, history=3)
+    tracker.advance()
+    for t in range(5):
+        players[1].timer = t + 1
+        players[1].touch()
+        tracker.advance()
+
+    assert tracker.seq == 5
+    assert tracker.patches_since(5) == []
+    assert [p.seq for p in tracker.patches_since(3)] == [4, 5]
+    # Older than the retained history, or from another epoch: caller must resnapshot
+    assert tracker.patches_since(1) is None
+    assert tracker.parse_event_id(tracker.event_id(4)) == 4
+    assert tracker.parse_event_id('deadbeef-4') is None
+    assert tracker.parse_event_id(None) is None
+
+    fields, snap = _payload(next(tracker.snapshots()))
+    assert fields['event'] == 'snapshot' and fields['id'] == tracker.event_id(5)
+    assert snap['seq'] == 5 and len(snap['players']) == 2 and snap['last']
+
+    # Large populations go out a page at a time; only the last page carries the event id
+    pages = [_payload(frame) for frame in tracker.snapshots(size=1)]
+    assert [len(snap['players']) for _, snap in pages] == [1, 1]
+    assert [snap['last'] for _, snap in pages] == [False, True]
+    assert 'id' not in pages[0][0] and pages[1][0]['id'] == tracker.event_id(5)
+
+
+def test_delta_tracker_diffs_simulated_games_by_changed_slots():
+    sim = Simulation(50, seed=3)
+    for i, board in enumerate(generate_boards(50, 9, 9, 10, seed=3)):
+        sim.add(id=f'p{i}', username=f'u{i}', board=board, mines_count=board.mines_count)
+    tracker = DeltaTracker(lambda: [], lambda: sim)
+    assert tracker.advance() is None
+
+    def tick():
+        changed = sim.step(lambda n: generate_boards(n, 9, 9, 10))
+        tracker.on_tick(sim, changed)
+        return changed
+
+    before = {p.id: p.to_dict() for p in sim.players}
+    changed = tick()
+    # Until some game has finished and another started over, on a new board
+    while not (np.any(sim.status[:50] != PLAYING) and np.any(sim.timer[:50] == 0)):
+        changed = np.union1d(changed, tick())
+    updated = json.loads(tracker.advance().data)['updated']
+    assert any('board' in change for change in updated.values())
+    assert set(updated) == {sim.players[i].id for i in changed}
+    for pid, change in updated.items():
+        now = sim.get(pid).to_dict()
+        assert change == {k: v for k, v in now.items() if before[pid][k] != v}
+
+    # Slots no tick reported are not looked at
+    sim.timer[0] += 100
+    assert tracker.advance() is None
+
+
+def test_player_hub_shares_one_topic_per_player():
+    alice, bob = _players()
+    hub = PlayerHub(queue_size=2)
+    q1, q2 = hub.subscribe(alice), hub.subscribe(alice)
+    assert hub.viewer_count('a') == 2
+
+    hub.on_change([bob])  # nobody watches bob: no work
+    alice.timer = 9
+    alice.touch()
+    hub.on_change([alice])
+    u1, u2 = q1.get_nowait(), q2.get_nowait()
+    assert u1 is u2
+    assert _payload(u1.frame)[1] == {'timer': 9}
+    assert not u1.finished
+
+    # A viewer that falls behind is told to resync rather than silently missing updates
+    for t in range(3):
+        alice.timer = 10 + t
+        alice.touch()
+        hub.on_change([alice])
+    assert q1.get_nowait() is RESYNC and q1.empty()
+
+    hub.unsubscribe('a', q1)
+    hub.unsubscribe('a', q2)
+    assert hub.viewer_count('a') == 0
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_player_stream_ends_when_game_finishes():
+    from backend.app import spectator
+
+    player = _players()[0]
+    stream = player_stream(_Request(), player)
+    fields, snap = _payload(await stream.__anext__())
+    assert fields['event'] == 'snapshot' and snap['id'] == 'a'
+
+    player.status = 'won'
+    player.touch()
+    spectator.player_hub.on_change([player])
+    fields, update = _payload(await stream.__anext__())
+    assert fields['event'] == 'update' and update == {'status': 'won'}
+
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+    assert spectator.player_hub.viewer_count('a') == 0
@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+from backend.app.engine import generate_boards
+from backend.app.spectator_store import MemoryStore, SharedMemoryStore
+
+# The project root, put on the worker subprocess's sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def _players(n=6, seed=0):
+    return [dict(id=f'p{i}', username=f'u{i % 3}', board=board, timer=5, mines_count=board.mines_count,
+                 started_at=datetime(2024, 1, 1, 12))
+            for i, board in enumerate(generate_boards(n, 9, 9, 10, seed=seed))]
+
+
+def _new_boards(count):
+    return generate_boards(count, 9, 9, 10)
+
+
+def test_memory_store_always_leads():
+    store = MemoryStore()
+    sim = store.open(6, _players)
+    assert store.try_lead() and len(sim.players) == 6 and not len(store.poll(sim))
+
+
+def test_shared_store_follower_sees_leader_ticks(tmp_path):
+    path = str(tmp_path / 'spectator')
+    leader, follower = SharedMemoryStore(path), SharedMemoryStore(path, attach_timeout=1)
+    sim = leader.open(6, _players)
+    view = follower.open(6, lambda: [])
+    assert leader.leader and not follower.try_lead()
+    assert [p.id for p in view.players] == [p.id for p in sim.players] and view.epoch == sim.epoch
+    assert [p.id for p in view.select(username='u1').players] == ['p1', 'p4']
+
+    for _ in range(40):
+        changed = sim.step(_new_boards)
+        assert follower.poll(view).tolist() == changed.tolist()
+    assert not len(follower.poll(view))  # nothing new until the next tick
+    assert [p.to_dict() for p in view.players] == [p.to_dict() for p in sim.players]
+
+    # The leader goes away: the follower takes over the same games
+    leader.close()
+    assert follower.try_lead()
+    view.step(_new_boards)
+    assert view.stats()['ticks'] == 41
+    follower.close(unlink=True)
+
+
+def test_workers_in_other_processes_attach(tmp_path):
+    path = str(tmp_path / 'spectator')
+    leader = SharedMemoryStore(path)
+    sim = leader.open(6, _players)
+    sim.players[2].timer = 99
+    code = (
+        'import sys; sys.path.insert(0, sys.argv[1])\n'
+        'from backend.app.spectator_store import SharedMemoryStore\n'
+        'store = SharedMemoryStore(sys.argv[2], attach_timeout=5)\n'
+        'sim = store.open(6, list)\n'
+        'print(store.try_lead(), sim.get("p2").timer, sim.get("p2").board.mines_count)\n'
+    )
+    out = subprocess.run([sys.executable, '-c', code, ROOT, path], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ['False', '99', '10']
+    leader.close(unlink=True)
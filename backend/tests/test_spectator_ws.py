@@ -0,0 +1,51 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.app import mock_db, spectator_ws
+from backend.app.main import app
+
+
+def test_ws_multiplexes_players_and_lobby():
+    player = mock_db.get_active_players()[0]
+    client = TestClient(app)
+    with client.websocket_connect('/api/spectator/ws') as ws:
+        ws.send_json({'op': 'ping'})
+        assert ws.receive_json() == {'type': 'pong'}
+
+        ws.send_json({'op': 'subscribe', 'player': 'missing'})
+        assert ws.receive_json()['error'] == 'Player not found'
+
+        ws.send_json({'op': 'subscribe', 'player': player.id})
+        msg = ws.receive_json()
+        assert msg['type'] == 'snapshot' and msg['player'] == player.id
+        assert msg['data']['id'] == player.id and len(msg['data']['board']) == player.board.rows
+
+        ws.send_json({'op': 'subscribe', 'channel': 'lobby'})
+        msg = ws.receive_json()
+        assert msg['type'] == 'lobby.snapshot'
+        assert {p['id'] for p in msg['data']['players']} >= {player.id}
+
+        ws.send_json({'op': 'dance'})
+        assert ws.receive_json()['error'] == 'Unknown operation'
+
+
+def test_ws_enforces_connection_cap(monkeypatch):
+    monkeypatch.setattr(spectator_ws.gateway, 'max_connections', 1)
+    client = TestClient(app)
+    with client.websocket_connect('/api/spectator/ws') as first:
+        first.send_json({'op': 'ping'})
+        assert first.receive_json() == {'type': 'pong'}
+        with client.websocket_connect('/api/spectator/ws') as second:
+            with pytest.raises(WebSocketDisconnect) as exc:
+                second.receive_json()
+            assert exc.value.code == spectator_ws.CLOSE_TRY_AGAIN_LATER
+
+
+@pytest.mark.asyncio
+async def test_ws_slow_consumer_overflows_to_close():
+    conn = spectator_ws.SpectatorConnection(websocket=None, send_buffer=2)
+    for i in range(3):
+        conn.send(f'"{i}"')
+    assert conn.outbox.qsize() == 1
+    assert conn.outbox.get_nowait() is spectator_ws._OVERFLOW
@@ -0,0 +1,55 @@
+import gzip
+
+from backend.app import static_files
+from backend.app.static_files import StaticSite
+
+SCRIPT = b'console.log("minesweeper");\n' * 200
+
+
+def _site(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_bytes(b'<!doctype html><div id="root"></div>' * 20)
+    (tmp_path / 'assets' / 'index-B3xK9a_Q.js').write_bytes(SCRIPT)
+    (tmp_path / 'assets' / 'logo.png').write_bytes(b'\x89PNG' + bytes(2000))
+    (tmp_path / 'robots.txt').write_bytes(b'User-agent: *\n')
+    return StaticSite(str(tmp_path))
+
+
+def test_manifest_and_encoding_negotiation(tmp_path):
+    site = _site(tmp_path)
+    assert set(site.files) == {'index.html', 'assets/index-B3xK9a_Q.js', 'assets/logo.png', 'robots.txt'}
+
+    r = site.serve('assets/index-B3xK9a_Q.js', 'gzip, deflate')
+    assert r.headers['content-encoding'] == 'gzip' and gzip.decompress(r.body) == SCRIPT
+    assert r.headers['cache-control'] == 'public, max-age=31536000, immutable'
+    assert r.headers['vary'] == 'Accept-Encoding'
+    assert 'content-encoding' not in site.serve('assets/index-B3xK9a_Q.js', 'gzip;q=0').headers
+    assert site.serve('assets/index-B3xK9a_Q.js').body == SCRIPT
+    # Each coding has its own ETag; any of them revalidates the file
+    etag = site.serve('assets/index-B3xK9a_Q.js').headers['etag']
+    assert r.headers['etag'] == etag[:-1] + '-gzip"'
+    r = site.serve('assets/index-B3xK9a_Q.js', 'gzip', if_none_match=r.headers['etag'])
+    assert r.status_code == 304 and r.headers['etag'].endswith('-gzip"')
+
+    # Binary and tiny files are never compressed
+    assert 'content-encoding' not in site.serve('assets/logo.png', 'gzip').headers
+    assert 'content-encoding' not in site.serve('robots.txt', 'gzip').headers
+
+    r = site.serve('games/42', 'gzip')
+    assert r.headers['cache-control'] == 'no-cache' and r.media_type == 'text/html'
+    assert site.serve('index.html', if_none_match=r.headers['etag']).status_code == 304
+
+
+def test_precompressed_files_and_large_files_stay_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(static_files, 'STATIC_MEMORY_MAX', 1024)
+    (tmp_path / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'app.js.br').write_bytes(b'brotli bytes')
+    site = StaticSite(str(tmp_path))
+    assert set(site.files) == {'app.js'}
+
+    r = site.serve('app.js', 'gzip, br')
+    assert r.headers['content-encoding'] == 'br' and r.body == b'brotli bytes'
+    # Over STATIC_MEMORY_MAX: streamed from disk and not compressed in memory
+    r = site.serve('app.js', 'gzip')
+    assert r.path == str(tmp_path / 'app.js') and 'content-encoding' not in r.headers
+    assert site.stats()['memoryBytes'] == len(b'brotli bytes')
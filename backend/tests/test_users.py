@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, text
+
+from backend.app.database import User as DBUser, get_async_db
+
+
+@pytest_asyncio.fixture
+async def db(db):
+    base = datetime(2024, 1, 1)
+    # Pairs of users share a created_at so the id tie-breaker is exercised
+    await db.execute(insert(DBUser), [
+        {'id': f'u{i:02d}', 'username': f'user{i}', 'email': f'u{i}@example.com', 'password': 'x',
+         'created_at': base + timedelta(minutes=i // 2)}
+        for i in range(23)
+    ])
+    await db.commit()
+    return db
+
+
+@pytest_asyncio.fixture
+async def client(db):
+    from backend.app import mock_db
+    from backend.app.main import app
+
+    app.dependency_overrides[get_async_db] = lambda: db
+    token = await mock_db.create_session('u00', db)
+    async with httpx.AsyncClient(app=app, base_url='http://test', headers={'Authorization': f'Bearer {token}'}) as c:
+        yield c
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+EXPECTED = [f'u{i:02d}' for i in reversed(range(23))]
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_newest_first(client):
+    seen, params = [], {'limit': 5}
+    while True:
+        r = await client.get('/api/users', params=params)
+        assert r.status_code == 200
+        seen += [u['id'] for u in r.json()]
+        cursor = r.headers.get('x-next-cursor')
+        if not cursor:
+            break
+        params['after'] = cursor
+    assert seen == EXPECTED
+    assert (await client.get('/api/users', params={'after': 'junk'})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_export_streams_all_rows(client):
+    r = await client.get('/api/users', params={'format': 'ndjson'})
+    assert r.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [u['id'] for u in rows] == EXPECTED
+    assert set(rows[0]) == {'id', 'username', 'email', 'createdAt'} and 'password' not in r.text
+
+    r = await client.get('/api/users', params={'format': 'csv'})
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [u['id'] for u in rows] == EXPECTED
+    assert rows[-1]['createdAt'] == '2024-01-01T00:00:00'
+
+
+@pytest.mark.asyncio
+async def test_users_page_uses_created_at_index(db):
+    plan = (await db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM users WHERE (created_at, id) < ('2024-01-01 00:05:00', 'u10') "
+        "ORDER BY created_at DESC, id DESC LIMIT 10"
+    ))).fetchall()
+    assert any('ix_users_created_at_id' in row[-1] for row in plan)
+
+
+@pytest.mark.asyncio
+async def test_signup_maps_unique_violations(db):
+    from backend.app import mock_db
+
+    user, err = await mock_db.signup('fresh', 'fresh@example.com', 'pw', db)
+    assert err is None and user['createdAt'] is not None
+    assert await mock_db.signup('other', 'fresh@example.com', 'pw', db) == (None, 'Email already registered')
+    assert await mock_db.signup('fresh', 'new@example.com', 'pw', db) == (None, 'Username already taken')
+
+
+@pytest.mark.asyncio
+async def test_admin_import_skips_and_reports_duplicates(client, db, monkeypatch):
+    from backend.app import routes
+    from backend.app.passwords import hash_password, verify_password
+
+    body = ('username,email,password,id\n'
+            'imp1,imp1@example.com,pw1,\n'
+            'user3,clash@example.com,pw2,\n'           # username taken
+            f'imp2,imp2@example.com,{hash_password("pw3")},legacy-7\n'
+            'imp3,imp1@example.com,pw4,\n')            # email repeated within the file
+    headers = {'content-type': 'text/csv'}
+    assert (await client.post('/api/admin/users/import', content=body, headers=headers)).status_code == 403
+
+    monkeypatch.setattr(routes, 'ADMIN_TOKEN', 'secret')
+    headers['X-Admin-Token'] = 'secret'
+    r = await client.post('/api/admin/users/import', content=body, headers=headers)
+    assert r.status_code == 200
+    assert r.json()['imported'] == 2
+    assert [(d['index'], d['username']) for d in r.json()['duplicates']] == [(1, 'user3'), (3, 'imp3')]
+
+    legacy = await db.get(DBUser, 'legacy-7')
+    assert legacy.username == 'imp2' and verify_password('pw3', legacy.password)
+    r = await client.post('/api/admin/users/import', headers={**headers, 'content-type': 'application/x-ndjson'},
+                          content='{"username": "x", "email": "not-an-email", "password": "p"}\n')
+    assert r.status_code == 422 and r.json()['detail'][0]['index'] == 0
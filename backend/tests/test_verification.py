@@ -0,0 +1,143 @@
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from backend.app import mock_db
+from backend.app.database import get_async_db
+from backend.app.engine import MINE, REVEALED, Board, generate_preset, seeded_board
+from backend.app.leaderboard_cache import LeaderboardCache
+from backend.app.rank_index import RankIndex
+from backend.app.replay import REVEAL, apply_move
+from backend.app.schemas import ReplayUpload
+from backend.app.verification import ScoreVerifier, VerifierBusy, issue_ticket, open_ticket, replay_game
+
+
+def _winning_moves(seed, first=40):
+    """Reveal every safe cell of the seeded easy board, one second apart."""
+    board = generate_preset('easy', divmod(first, 9), seed)
+    moves, t = [], 0
+    for cell in [first] + list(range(81)):
+        if not board.cells[cell] & (MINE | REVEALED):
+            t += 1000
+            apply_move(board, cell, REVEAL)
+            moves.append({'cell': cell, 'action': 'reveal', 't': t})
+    return moves
+
+
+def _upload(username='ann', ago=timedelta(minutes=5), moves=None):
+    """A winning replay on a seed ticket issued `ago`."""
+    ticket, token = issue_ticket(username, 'easy', now=datetime.utcnow() - ago)
+    return ticket, ReplayUpload(ticket=token, moves=_winning_moves(ticket.seed) if moves is None else moves)
+
+
+def test_replay_game_checks_the_win():
+    moves = _winning_moves(seed=7)
+    as_tuples = [(m['cell'], REVEAL, m['t']) for m in moves]
+    writer = replay_game('easy', 7, as_tuples)
+    assert writer.moves == len(moves) and writer.t == moves[-1]['t'] and writer.seed == 7
+
+    with pytest.raises(ValueError, match='not won'):
+        replay_game('easy', 7, as_tuples[:-1])
+    with pytest.raises(ValueError, match='already won'):
+        replay_game('easy', 7, as_tuples + as_tuples[-1:])
+    # The same moves on another seed's board hit a mine or leave cells closed
+    with pytest.raises(ValueError):
+        replay_game('easy', 8, as_tuples)
+
+
+def test_seed_tickets_are_signed():
+    ticket, token = issue_ticket('ann', 'easy')
+    assert open_ticket(token) == ticket
+    payload, signature = token.split('.')
+    forged = issue_ticket('ann', 'easy', now=datetime(2020, 1, 1))[1].split('.')[0]
+    for bad in (f'{forged}.{signature}', payload, f'{payload}.{"0" * len(signature)}'):
+        with pytest.raises(ValueError):
+            open_ticket(bad)
+
+
+@pytest.mark.asyncio
+async def test_verifier_checks_tickets_and_times():
+    verifier = ScoreVerifier(workers=2, max_queue=0)
+    try:
+        ticket, good = _upload()
+        _, bad = _upload(moves=good.moves[:1])
+        _, early = _upload(ago=timedelta(0))
+        results = await verifier.verify_many([('ann', 'easy', good), ('ann', 'easy', bad), ('ann', 'easy', early),
+                                              ('bob', 'easy', good), ('ann', 'medium', good)], concurrency=2)
+        # The time runs from the ticket's issue, whatever the moves claim
+        assert results[0].id == ticket.id and 300 <= results[0].time <= 302
+        assert results[0].writer.moves == len(good.moves)
+        assert 'not won' in str(results[1])
+        assert [str(r) for r in results[2:]] == [
+            'the moves take longer than the time since the seed was issued',
+            'the seed ticket was issued for another player or difficulty',
+            'the seed ticket was issued for another player or difficulty',
+        ]
+        assert verifier.stats()['verified'] == 1 and verifier.stats()['failed'] == 4
+
+        verifier.in_flight = 2
+        with pytest.raises(VerifierBusy):
+            await verifier.verify('ann', 'easy', good)
+    finally:
+        verifier.shutdown()
+
+
+@pytest_asyncio.fixture
+async def client(db, session_factory, monkeypatch):
+    from backend.app.main import app
+
+    monkeypatch.setattr(mock_db, 'leaderboard_cache', LeaderboardCache(size=5, ttl=60))
+    monkeypatch.setattr(mock_db, 'rank_index', RankIndex(max_time=15, ttl=60))
+    monkeypatch.setattr(mock_db, 'AsyncSessionLocal', session_factory)
+    app.dependency_overrides[get_async_db] = lambda: db
+    async with httpx.AsyncClient(app=app, base_url='http://test') as c:
+        yield c
+    app.dependency_overrides.pop(get_async_db, None)
+
+
+@pytest.mark.asyncio
+async def test_verified_and_pending_scores(client):
+    r = await client.post('/api/auth/signup', json={'username': 'ann', 'email': 'ann@example.com',
+                                                     'password': 'secret123'})
+    r = await client.post('/api/games/seed', json={'difficulty': 'easy'},
+                          headers={'Authorization': f'Bearer {r.json()["token"]}'})
+    assert r.status_code == 201
+    issued = r.json()
+    assert open_ticket(issued['ticket']).seed == issued['seed'] and issued['minesCount'] == 10
+
+    ticket, upload = _upload()
+    replay = json.loads(upload.json())
+    r = await client.post('/api/leaderboard/batch', json=[
+        {'username': 'ann', 'difficulty': 'easy', 'replay': replay},
+        {'username': 'bob', 'time': 1, 'difficulty': 'easy'},
+    ])
+    assert r.status_code == 201
+    # Entered under the ticket's id, and a ticket is used once
+    assert r.json()['ids'][0] == ticket.id
+    r = await client.post('/api/leaderboard', json={'username': 'ann', 'difficulty': 'easy', 'replay': replay})
+    assert r.status_code == 409
+    # A seeded replay is stored as its seed and the board is regenerated to stream it
+    r = await client.get(f'/api/games/{ticket.id}/replay', params={'speed': 0})
+    start = json.loads(r.text.split('\n')[1].removeprefix('data: '))
+    first = upload.moves[0].cell
+    assert Board.from_cells(start['board']) == seeded_board(ticket.seed, 9, 9, 10, divmod(first, 9))
+
+    entries = (await client.get('/api/leaderboard', params={'difficulty': 'easy'})).json()
+    assert [(e['username'], e['status']) for e in entries] == [('bob', 'pending'), ('ann', 'verified')]
+    assert 300 <= entries[1]['time'] <= 302
+    r = await client.get('/api/leaderboard', params={'difficulty': 'easy', 'verified': 'true'})
+    assert [e['username'] for e in r.json()] == ['ann']
+    # Seed-ticket wins are not counted with games played on the server
+    r = await client.get('/api/leaderboard', params={'difficulty': 'easy', 'played': 'true'})
+    assert r.json() == []
+
+    # Boards only come from seed tickets: a replay with its own mines is a validation error,
+    # as is a score with neither a time nor a replay
+    r = await client.post('/api/leaderboard', json={'username': 'c', 'difficulty': 'easy'})
+    assert r.status_code == 422
+    r = await client.post('/api/leaderboard', json={'username': 'c', 'difficulty': 'easy', 'replay': {
+        'rows': 9, 'cols': 9, 'mines': list(range(10)), 'moves': replay['moves']}})
+    assert r.status_code == 422
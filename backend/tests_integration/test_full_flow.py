@@ -2,8 +2,7 @@ import pytest
 import os
 import sys
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.pool import StaticPool
 
 # Ensure project root is on sys.path so `import app` works
@@ -15,27 +14,23 @@ if ROOT not in sys.path:
 os.environ["DATABASE_URL"] = "sqlite:///./test_minesweeper.db"
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_async_db
 
 # Test database setup (same as conftest.py)
-TEST_DATABASE_URL = "sqlite:///./test_minesweeper.db"
+TEST_DATABASE_URL = "sqlite+aiosqlite:///./test_minesweeper.db"
 
-engine = create_engine(
+engine = create_async_engine(
     TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
 
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = async_sessionmaker(autoflush=False, bind=engine, expire_on_commit=False)
 
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
+async def override_get_db():
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_db
 
 @pytest.fixture(scope="function")
 def test_client():
@@ -65,7 +60,8 @@ def registered_user(test_client):
 
     return {
         "user_data": user_data,
-        "user_id": response_data["user"]["id"]
+        "user_id": response_data["user"]["id"],
+        "token": response_data["token"]
     }
 
 class TestUserAuthentication:
@@ -168,7 +164,7 @@ class TestUserAuthentication:
 
     def test_get_user_profile(self, test_client, registered_user):
         """Test retrieving user profile with authentication header"""
-        headers = {"X-User-Id": registered_user["user_id"]}
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
 
         response = test_client.get("/auth/me", headers=headers)
         assert response.status_code == 200
@@ -185,7 +181,7 @@ class TestUserAuthentication:
 
     def test_get_all_users(self, test_client, registered_user):
         """Test getting all registered users (requires authentication)"""
-        headers = {"X-User-Id": registered_user["user_id"]}
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
 
         response = test_client.get("/users", headers=headers)
         assert response.status_code == 200
@@ -360,7 +356,6 @@ class TestFullGameFlow:
 
         response = test_client.post("/auth/signup", json=user_data)
         assert response.status_code == 200
-        user_id = response.json()["user"]["id"]
 
         # 2. Login user
         login_data = {
@@ -372,7 +367,7 @@ class TestFullGameFlow:
         assert response.status_code == 200
 
         # 3. Get user profile
-        headers = {"X-User-Id": user_id}
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
         response = test_client.get("/auth/me", headers=headers)
         assert response.status_code == 200
 